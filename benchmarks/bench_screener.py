@@ -0,0 +1,253 @@
+"""选股流程基准测试
+
+在合成行情上分阶段计时 screen_stocks 的各个步骤，以及图表生成和 Excel 导出，
+并记录各阶段的峰值内存，结果保存为 JSON，便于不同版本之间对比。
+
+用法：
+    python benchmarks/bench_screener.py --sizes 300 1000 5000
+    python benchmarks/bench_screener.py --compare benchmarks/results/old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from astock_assistant.panel_pool import ScoringPool
+from astock_assistant.providers import ReplayProvider, SyntheticProvider
+from astock_assistant.scoring import OHLCVPanel, predict_panel, score_panel
+from astock_assistant.spot import normalize_spot
+from astock_assistant.stock_screener import StockScreener
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+
+def measure(func, repeat):
+    """返回 (多次运行的耗时列表, 单独一次运行的峰值内存, 最后一次的返回值)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak, result
+
+
+def summarize(timings, peak, items):
+    best = min(timings)
+    return {
+        'min_s': best,
+        'median_s': statistics.median(timings),
+        'peak_mem_bytes': peak,
+        'items': items,
+        'items_per_s': items / best if best > 0 else None,
+    }
+
+
+def run_size(size, repeat, provider=None, workers=1):
+    """在 size 只股票的行情上分阶段计时
+
+    深度分析阶段（K线获取、评分、预测）不受 300 只的上限约束，
+    对全部 size 只股票运行，用来观察各阶段随规模的变化。
+    """
+    from astock_assistant.export import export_results
+    from astock_assistant.results import ScreenResults
+    from astock_assistant.stock_detail import create_stock_charts
+
+    provider = provider or SyntheticProvider(n_symbols=size, seed=0)
+    screener = StockScreener(provider=provider)
+    stages = {}
+
+    def record(name, func, items):
+        timings, peak, result = measure(func, repeat)
+        stages[name] = summarize(timings, peak, items)
+        return result
+
+    spot = record('get_spot', provider.get_spot, size)
+    spot = record('normalize_spot', lambda: normalize_spot(spot.head(size)), size)
+    filtered = record('filter_spot', lambda: screener._filter_stocks(spot), len(spot))
+    ranked = record(
+        'rank_spot', lambda: screener._rank_stocks(filtered.copy()), len(filtered)
+    )
+
+    candidates = screener._rank_stocks(spot.copy()).reset_index(drop=True)
+    histories = record(
+        'fetch_histories',
+        lambda: screener._fetch_histories(candidates),
+        len(candidates),
+    )
+
+    panel = record(
+        'build_panel', lambda: OHLCVPanel.from_frames(histories), len(histories)
+    )
+    scores = record('calculate_score', lambda: score_panel(panel), len(histories))
+    predictions = record(
+        'predict_next_day_price', lambda: predict_panel(panel), len(histories)
+    )
+
+    # 多进程评分，先运行一次让工作进程启动完成，只计评分本身的耗时
+    if workers > 1:
+        pool = ScoringPool(workers)
+        try:
+            pool.evaluate(panel)
+            record(
+                'score_process_pool', lambda: pool.evaluate(panel), len(histories)
+            )
+        finally:
+            pool.close()
+
+    # 逐只股票的旧实现，只在较小规模上运行，作为批量实现的对照
+    sample = [df for df in histories if df is not None][: min(size, 300)]
+    record(
+        'calculate_score_per_stock',
+        lambda: [screener._calculate_score(df) for df in sample],
+        len(sample),
+    )
+    record(
+        'predict_next_day_price_per_stock',
+        lambda: [screener._predict_next_day_price(df) for df in sample],
+        len(sample),
+    )
+
+    results = record(
+        'collect_results',
+        lambda: screener._collect_results(candidates, scores, predictions),
+        len(candidates),
+    )
+    record('sort_results', lambda: screener._sort_results(results), len(results))
+
+    chart_source = next(df for df in histories if df is not None and len(df) > 60)
+    record('create_stock_charts', lambda: create_stock_charts(chart_source.copy()), 1)
+    # 同一只股票再次查看时直接命中图表缓存
+    create_stock_charts(chart_source, symbol='bench')
+    record(
+        'create_stock_charts_cached',
+        lambda: create_stock_charts(chart_source, symbol='bench'),
+        1,
+    )
+
+    # 完整选股流程，不限候选数量，记录各阶段每秒处理的股票数
+    full = StockScreener(provider=provider, candidate_limit=0)
+    record('screen_full_universe', full.screen_stocks, len(filtered))
+    throughput = {k: round(v, 1) for k, v in full.throughput().items()}
+
+    results_df = ScreenResults(results[:300]).frame
+    for fmt in ('Excel', 'CSV', 'Parquet', 'JSON'):
+        record(
+            f'export_{fmt.lower()}',
+            lambda fmt=fmt: export_results(results_df, fmt),
+            len(results_df),
+        )
+
+    return {
+        'size': size,
+        'filtered': len(filtered),
+        'ranked': len(ranked),
+        'scored_positive': int(np.count_nonzero(scores > 0)),
+        'stages': stages,
+        'full_universe_throughput': throughput,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline_path, threshold):
+    """打印与基线结果的对比，返回是否存在超过阈值的退化"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    old_runs = {run['size']: run for run in baseline['runs']}
+    regressed = False
+    print(f'\n对比基线 {baseline_path} ({baseline.get("revision")})')
+    for run in current['runs']:
+        old = old_runs.get(run['size'])
+        if not old:
+            continue
+        for name, stage in run['stages'].items():
+            old_stage = old['stages'].get(name)
+            if not old_stage or not old_stage['min_s']:
+                continue
+            ratio = stage['min_s'] / old_stage['min_s']
+            flag = ''
+            if ratio > 1 + threshold:
+                flag = '  <-- 退化'
+                regressed = True
+            print(
+                f'  [{run["size"]:>5}] {name:<34} '
+                f'{old_stage["min_s"] * 1000:>10.2f}ms -> '
+                f'{stage["min_s"] * 1000:>10.2f}ms  x{ratio:.2f}{flag}'
+            )
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='选股流程基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[300, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--replay', help='使用录制的行情目录代替合成数据')
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count(), help='多进程评分的进程数'
+    )
+    parser.add_argument('--output', help='结果 JSON 路径，默认写入 benchmarks/results')
+    parser.add_argument('--compare', help='与之前保存的结果 JSON 对比')
+    parser.add_argument(
+        '--threshold', type=float, default=0.2, help='判定退化的耗时增长比例'
+    )
+    args = parser.parse_args(argv)
+
+    provider = ReplayProvider(args.replay) if args.replay else None
+    runs = []
+    for size in args.sizes:
+        print(f'== {size} 只股票 ==')
+        run = run_size(size, args.repeat, provider, args.workers)
+        for name, stage in run['stages'].items():
+            print(
+                f'  {name:<34} {stage["min_s"] * 1000:>10.2f}ms '
+                f'peak {stage["peak_mem_bytes"] / 2**20:>8.1f}MiB'
+            )
+        runs.append(run)
+
+    report = {
+        'created_at': pd.Timestamp.now().isoformat(),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'repeat': args.repeat,
+        'workers': args.workers,
+        'runs': runs,
+    }
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f'screener-{pd.Timestamp.now():%Y%m%d-%H%M%S}.json'
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f'结果已保存到 {output}')
+
+    if args.compare and compare(report, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
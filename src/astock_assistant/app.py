@@ -1,40 +1,131 @@
-import io
+import time
 
-import akshare as ak
 import pandas as pd
 import streamlit as st
+from astock_assistant.config.logging_config import setup_logging
+from astock_assistant.config.settings import settings
+from astock_assistant.export import EXPORT_FORMATS, export_results
+from astock_assistant.fetcher import AsyncFetcher
+from astock_assistant.metrics import metrics, start_http_server
+from astock_assistant.periods import PERIOD_TITLES, PERIODS
+from astock_assistant.profiler import profile
+from astock_assistant.providers import create_provider
+from astock_assistant.results import ScreenResults
+from astock_assistant.scheduler import ResultStore, ScreenScheduler, is_fresh
+from astock_assistant.shared_cache import SharedCache
 from astock_assistant.stock_detail import create_stock_charts
 from astock_assistant.stock_screener import StockScreener
 
-index_titles = [
-    '股票代码',
-    '股票名称',
-    '推荐指数',
-    '当前价格',
-    '涨跌幅(%)',
-    '预测最高价',
-    '预测最低价',
-    '预测波动(%)',
-    '量比',
-    '今开',
-    '昨收',
-    '涨速',
-    '5分钟涨跌',
-    '60日涨跌幅',
-    '年初至今涨跌幅',
-    '换手率',
-    '总市值',
-    '流通市值',
-    '振幅',
-]
+# 推荐列表中显示的列
+list_titles = ['股票代码', '股票名称', '推荐指数', '当前价格', '涨跌幅(%)']
+
+
+@st.cache_resource
+def get_fetcher():
+    # 所有会话共用一个请求层，限流对整个进程生效
+    return AsyncFetcher()
+
+
+@st.cache_resource
+def get_provider():
+    # 数据源由 DATA_PROVIDER 配置，默认是带本地缓存的 akshare
+    return create_provider(fetcher=get_fetcher())
+
+
+@st.cache_resource
+def start_instrumentation():
+    # 日志配置和指标端口在整个进程中只初始化一次
+    setup_logging()
+    if settings.METRICS_PORT:
+        return start_http_server()
+    return None
+
+
+@st.cache_resource
+def get_shared_cache():
+    # 行情快照和选股结果在所有会话之间共享，过期时间为 AUTO_UPDATE_INTERVAL
+    return SharedCache()
+
+
+@st.cache_resource
+def get_scheduler():
+    # 后台预计算与各会话共用数据源和共享缓存
+    screener = StockScreener(
+        provider=get_provider(), fetcher=get_fetcher(), cache=get_shared_cache()
+    )
+    scheduler = ScreenScheduler(screener=screener, store=ResultStore())
+    if settings.PRECOMPUTE:
+        scheduler.start()
+    return scheduler
+
+
+def load_precomputed():
+    """读取最新一次仍然有效的预计算结果，没有时返回 None"""
+    scheduler = get_scheduler()
+    record = scheduler.store.latest()
+    now = scheduler.provider.now()
+    if is_fresh(record, scheduler.calendar, now, scheduler.interval):
+        return record
+    return None
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def cached_export(version, fmt, _df):
+    # 按结果版本和格式缓存，同一份结果在各会话和重新运行之间只生成一次
+    return export_results(_df, fmt)
+
+
+def show_export(df):
+    """选择格式并点击生成后才导出，结果未变时直接复用已生成的文件"""
+    fmt = st.selectbox('导出格式', list(EXPORT_FORMATS), key='export_format')
+    version = st.session_state.results.digest
+    if st.button('生成导出文件'):
+        st.session_state.export_request = (version, fmt)
+    if st.session_state.get('export_request') != (version, fmt):
+        return
+
+    extension, mime = EXPORT_FORMATS[fmt]
+    st.download_button(
+        label=f'下载选股结果({fmt})',
+        data=cached_export(version, fmt, df),
+        file_name=f'stock_recommendations.{extension}',
+        mime=mime,
+    )
+
+
+def show_live_results(placeholder, top_results, found):
+    """选股进行中，在占位区域显示当前排名靠前的股票"""
+    df = ScreenResults(top_results).frame
+    with placeholder.container():
+        st.caption(f'已找到 {found} 支推荐股票，当前前 {len(df)} 名：')
+        st.dataframe(
+            style_results(df[list_titles]),
+            hide_index=True,
+        )
+
+
+def score_color(score):
+    return 'color: red' if score >= 80 else 'color: orange' if score >= 70 else ''
+
+
+def change_color(change):
+    return 'color: red' if change > 0 else 'color: green' if change < 0 else ''
+
+
+def style_results(df):
+    """推荐指数和涨跌幅按数值着色"""
+    return (
+        df.style.map(score_color, subset=['推荐指数'])
+        .map(change_color, subset=['涨跌幅(%)'])
+        .format({'推荐指数': '{:.0f}', '当前价格': '{:.2f}', '涨跌幅(%)': '{:.2f}%'})
+    )
 
 
 def show_results():
     if st.session_state.results:
-        # 创建DataFrame并设置正确的列名
-        df = pd.DataFrame(st.session_state.results)
-
-        df.columns = index_titles
+        # 同一次选股的 DataFrame 只生成一次，各会话共用
+        results = st.session_state.results
+        df = results.frame
 
         # 创建两列布局
         left_col, right_col = st.columns([0.3, 0.7])
@@ -42,87 +133,35 @@ def show_results():
         with left_col:
             st.subheader('推荐股票列表')
 
-            # 创建表头
-            cols = st.columns([1, 1.2, 0.8, 0.8, 0.8])
-            cols[0].write('**股票代码**')
-            cols[1].write('**股票名称**')
-            cols[2].write('**推荐指数**')
-            cols[3].write('**当前价格**')
-            cols[4].write('**涨跌幅(%)**')
-
-            # 显示每行数据，每个股票代码都是一个按钮
-            for _, row in df.iterrows():
-                cols = st.columns([1, 1.2, 0.8, 0.8, 0.8])
-
-                # 股票代码作为按钮
-                if cols[0].button(row['股票代码'], key=f"btn_{row['股票代码']}"):
-                    st.session_state.selected_stock = row['股票代码']
-
-                # 其他列正常显示
-                cols[1].write(row['股票名称'])
-
-                # 推荐指数带颜色
-                score = row['推荐指数']
-                color = 'red' if score >= 80 else 'orange' if score >= 70 else 'black'
-                cols[2].markdown(
-                    f"<span style='color: {color}'>{score:.0f}</span>",
-                    unsafe_allow_html=True,
-                )
-
-                cols[3].write(f"{row['当前价格']:.2f}")
-
-                # 涨跌幅带颜色
-                change = row['涨跌幅(%)']
-                color = 'red' if change > 0 else 'green' if change < 0 else 'black'
-                cols[4].markdown(
-                    f"<span style='color: {color}'>{change:.2f}%</span>",
-                    unsafe_allow_html=True,
-                )
-
-            # 创建Excel二进制数据
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name='选股结果')
-                # 获取工作表
-                worksheet = writer.sheets['选股结果']
-                # 调整列宽
-                for column in worksheet.columns:
-                    max_length = 0
-                    column = [cell for cell in column]
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except Exception as e:
-                            print(e)
-                            pass
-                    adjusted_width = max_length + 2
-                    worksheet.column_dimensions[
-                        column[0].column_letter
-                    ].width = adjusted_width
-
-            # 重置指针位置
-            output.seek(0)
-
-            # 添加下载按钮
-            st.download_button(
-                label='下载选股结果(Excel)',
-                data=output.getvalue(),
-                file_name='stock_recommendations.xlsx',
-                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            # 整个列表是一个表格组件，支持排序和单行选择，选中的行即为查看的股票
+            event = st.dataframe(
+                style_results(df[list_titles]),
+                key='results_table',
+                on_select='rerun',
+                selection_mode='single-row',
+                hide_index=True,
+                use_container_width=True,
+                height=600,
             )
+            selected_rows = event.selection.rows
+            if selected_rows:
+                st.session_state.selected_stock = results[selected_rows[0]].code
+
+            show_export(df)
 
         with right_col:
             if st.session_state.selected_stock:
-                show_stock_details(st.session_state.selected_stock)
+                with profile('show_stock_details', st.session_state.profiling):
+                    show_stock_details(st.session_state.selected_stock)
 
 
+@metrics.timer('show_stock_details')
 def show_stock_details(stock_code):
     try:
-        # 获取股票数据
-        df = pd.DataFrame(st.session_state.results)
-        df.columns = index_titles
-        stock_info = df[df['股票代码'] == stock_code].iloc[0]
+        # 按股票代码直接取出选股结果
+        stock_info = st.session_state.results.get(stock_code)
+        if stock_info is None:
+            return
 
         st.write(f"### {stock_code} - {stock_info['股票名称']}")
 
@@ -192,18 +231,24 @@ def show_stock_details(stock_code):
         with col5:
             st.metric('流通市值', format_market_value(stock_info['流通市值']))
 
-        # 获取分时数据并显示图表
-        hist_data = ak.stock_zh_a_hist(
+        # 显示K线图表，优先使用本次选股时已经获取的K线；周线和月线由日K线汇总
+        period = st.radio(
+            'K线周期',
+            PERIODS,
+            format_func=lambda p: f'{PERIOD_TITLES[p]}线',
+            horizontal=True,
+            key='chart_period',
+        )
+        charts = create_stock_charts(
             symbol=stock_code,
-            period='daily',  # 改为日级别
-            start_date=(pd.Timestamp.now() - pd.Timedelta(days=120)).strftime('%Y%m%d'),
-            end_date=pd.Timestamp.now().strftime('%Y%m%d'),
-            adjust='qfq',
+            provider=get_provider(),
+            run=st.session_state.results_run,
+            period=period,
         )
-
-        if not hist_data.empty:
-            charts = create_stock_charts(hist_data)
+        if charts is not None:
             st.plotly_chart(charts, use_container_width=True)
+        else:
+            st.info(f'{PERIOD_TITLES[period]}K线数量不足，无法计算 MACD 和 KDJ')
 
     except Exception as e:
         st.error(f'获取股票数据失败: {str(e)}')
@@ -223,6 +268,9 @@ def format_market_value(value_float):
 
 if __name__ == '__main__':
     st.set_page_config(page_title='stock analysis', layout='wide')
+    start_instrumentation()
+    # 打开后下一次选股和每次股票详情渲染都会采样，结果写入 LOG_DIR
+    st.sidebar.toggle('性能分析', value=settings.PROFILE, key='profiling')
 
     # 初始化 session state
     if 'selected_stock' not in st.session_state:
@@ -231,6 +279,27 @@ if __name__ == '__main__':
         st.session_state.results = None
     if 'progress' not in st.session_state:
         st.session_state.progress = None
+    if 'results_version' not in st.session_state:
+        st.session_state.results_version = None
+    if 'results_run' not in st.session_state:
+        st.session_state.results_run = None
+
+    # 有有效的预计算结果时直接展示，不必等待点击选股
+    if st.session_state.results is None:
+        record = load_precomputed()
+        if record is not None:
+            # 同一份预计算结果在各会话之间只转换一次
+            st.session_state.results = get_shared_cache().get_or_compute(
+                ('precomputed', record['version']),
+                ScreenResults.from_rows,
+                record['results'],
+            )
+            st.session_state.results_version = record['market_time']
+            # 股票详情复用这次预计算时获取的K线
+            st.session_state.results_run = get_scheduler().run_key(record)
+
+    if st.session_state.results_version:
+        st.caption(f'预计算结果，行情时间 {st.session_state.results_version}')
 
     if st.button('开始选股') or st.session_state.results is not None:
         if st.session_state.results is None:  # 只在第一次点击时执行选股
@@ -242,12 +311,39 @@ if __name__ == '__main__':
                 progress_bar.progress(progress)
                 status_text.text(f'{message} ({progress}%)')
 
+            live_table = st.empty()
+
+            def run_screen(screener):
+                results = []
+                last_render = 0.0
+                for result, top_results in screener.iter_screen_stocks(
+                    progress_callback=update_progress
+                ):
+                    results.append(result)
+                    # 限制刷新频率，避免每出一行就重绘一次表格
+                    if time.monotonic() - last_render > 0.5:
+                        show_live_results(live_table, top_results, len(results))
+                        last_render = time.monotonic()
+
+                # 按推荐指数排序；没有结果时不写入共享缓存，下次点击重新选股
+                return ScreenResults(screener._sort_results(results)) or None
+
             with st.spinner('正在分析市场活跃股票，请稍候...'):
-                screener = StockScreener()
-                results = screener.screen_stocks(progress_callback=update_progress)
-                st.session_state.results = results
+                cache = get_shared_cache()
+                screener = StockScreener(
+                    provider=get_provider(), fetcher=get_fetcher(), cache=cache
+                )
+                key = screener.results_key()
+                if cache.in_flight(key):
+                    status_text.text('其他会话正在选股，等待结果...')
+                # 相同行情时间窗口内已有结果时直接复用，并发点击共用一次计算
+                with profile('screen_stocks', st.session_state.profiling):
+                    results = cache.get_or_compute(key, run_screen, screener)
+                st.session_state.results = results or ScreenResults()
+                st.session_state.results_run = key
 
             progress_bar.empty()
             status_text.empty()
+            live_table.empty()
 
         show_results()
@@ -0,0 +1,285 @@
+"""推荐指数与价格预测的历史回测
+
+用 scoring 模块在整段历史面板上一次性计算每只股票每个交易日的推荐指数
+和次日价格区间：滑动均线只依赖当日及之前的K线，对整段序列计算一次与
+逐日截断后计算的结果相同。面板按股票分片，多个进程并行计算，每个分片
+只返回可以直接相加的汇总量。
+
+    python -m astock_assistant.backtest --start 20200101 --workers 8
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from astock_assistant.fetcher import AsyncFetcher
+from astock_assistant.providers import create_provider
+from astock_assistant.rules import active_rules, load_rules
+from astock_assistant.scoring import OHLCVPanel, predict_panel, score_panel
+
+HORIZONS = (1, 5, 10)
+# 推荐指数分组：0 分单独一组，其余每 20 分一组
+SCORE_EDGES = [0, 20, 40, 60, 80, 100]
+SCORE_LABELS = ['0', '(0,20]', '(20,40]', '(40,60]', '(60,80]', '(80,100]']
+# 与选股时打印信号的门槛一致
+RECOMMEND_THRESHOLD = 60
+
+
+def load_panel(provider, symbols, start_date, end_date, adjust='qfq', fetcher=None):
+    """并发读取多只股票的历史K线，组成面板，没有数据的股票被跳过"""
+    fetcher = fetcher or AsyncFetcher()
+
+    def fetch(symbol):
+        df = provider.get_history(
+            symbol, start_date=start_date, end_date=end_date, adjust=adjust
+        )
+        return None if df is None or df.empty else df
+
+    frames = asyncio.run(fetcher.gather(fetch, list(symbols)))
+    keep = [i for i, df in enumerate(frames) if df is not None]
+    return OHLCVPanel.from_frames(
+        [frames[i] for i in keep], symbols=[symbols[i] for i in keep]
+    )
+
+
+def _forward(values, as_of, lag):
+    """as_of 之后第 lag 根K线的值，超出范围为 NaN"""
+    n_days = values.shape[1]
+    target = as_of + lag
+    out = np.full((values.shape[0], len(as_of)), np.nan)
+    inside = target < n_days
+    out[:, inside] = values[:, target[inside]]
+    return out
+
+
+def _accumulate(groups, forward_returns):
+    """按分组累加样本数、收益和与上涨次数，各分片的结果可以直接相加"""
+    rows = {}
+    for name, mask in groups.items():
+        row = {'samples': int(mask.sum())}
+        for h, returns in forward_returns.items():
+            selected = returns[mask]
+            selected = selected[~np.isnan(selected)]
+            row[f'n_{h}'] = selected.size
+            row[f'sum_{h}'] = float(selected.sum())
+            row[f'hits_{h}'] = int((selected > 0).sum())
+        rows[name] = row
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def summarize_panel(
+    panel, horizons=HORIZONS, threshold=RECOMMEND_THRESHOLD, rules=None
+):
+    """对面板中每只股票的每个交易日评分，返回可相加的汇总表"""
+    rules = rules or active_rules()
+    # 面板靠右对齐，去掉分片内全部为空的左侧列
+    n_days = int(panel.lengths.max(initial=0))
+    if n_days < 2:
+        return None
+    panel = OHLCVPanel(
+        *(
+            values[:, -n_days:]
+            for values in (panel.open, panel.high, panel.low, panel.close, panel.volume)
+        ),
+        lengths=panel.lengths,
+    )
+
+    # 最后一天没有次日数据，不参与评估
+    as_of = np.arange(n_days - 1)
+    scores, positive, negative = score_panel(
+        panel, as_of, with_signals=True, rules=rules
+    )
+    predictions = predict_panel(panel, as_of)
+
+    n_bars = panel.lengths[:, None] - (n_days - 1 - as_of)[None, :]
+    valid = (n_bars >= rules.scoring['min_bars']) & ~np.isnan(scores)
+    close = panel.close[:, as_of]
+    forward_returns = {
+        h: _forward(panel.close, as_of, h) / close - 1 for h in horizons
+    }
+
+    bucket = np.digitize(scores, SCORE_EDGES[1:-1], right=True) + (scores > 0)
+    bucket = np.minimum(bucket, len(SCORE_LABELS) - 1)
+    buckets = {label: valid & (bucket == i) for i, label in enumerate(SCORE_LABELS)}
+    buckets['全部'] = valid
+    buckets[f'推荐(>={threshold})'] = valid & (scores >= threshold)
+
+    signals = {f'+{k}': valid & (v > 0) for k, v in positive.items()}
+    signals.update({f'-{k}': valid & (v > 0) for k, v in negative.items()})
+
+    # 次日实际最高/最低价是否落在预测区间内，只统计有推荐指数的样本
+    next_high = _forward(panel.high, as_of, 1)
+    next_low = _forward(panel.low, as_of, 1)
+    scored = valid & (scores > 0) & ~np.isnan(next_high)
+    high_hit = next_high <= predictions['预测最高价']
+    low_hit = next_low >= predictions['预测最低价']
+    actual_range = (next_high - next_low) / close * 100
+    coverage = {}
+    for label, mask in buckets.items():
+        if label == SCORE_LABELS[0]:
+            continue
+        mask = mask & scored
+        coverage[label] = {
+            'samples': int(mask.sum()),
+            'high_hits': int((high_hit & mask).sum()),
+            'low_hits': int((low_hit & mask).sum()),
+            'both_hits': int((high_hit & low_hit & mask).sum()),
+            'sum_pred_range': float(predictions['预测幅度'][mask].sum()),
+            'sum_actual_range': float(actual_range[mask].sum()),
+        }
+
+    return {
+        'buckets': _accumulate(buckets, forward_returns),
+        'signals': _accumulate(signals, forward_returns),
+        'coverage': pd.DataFrame.from_dict(coverage, orient='index'),
+        'symbols': int((panel.lengths > 0).sum()),
+    }
+
+
+def _summarize_shard(args):
+    return summarize_panel(*args)
+
+
+def _combine(parts):
+    parts = [part for part in parts if part is not None]
+    combined = {'symbols': sum(part['symbols'] for part in parts)}
+    for name in ('buckets', 'signals', 'coverage'):
+        tables = [part[name] for part in parts]
+        order = list(dict.fromkeys(label for table in tables for label in table.index))
+        combined[name] = (
+            pd.concat(tables).groupby(level=0, sort=False).sum().reindex(order)
+        )
+    return combined
+
+
+def _finalize(combined, horizons):
+    """把累加量换算成平均收益、胜率和覆盖率（百分比）"""
+
+    def returns_table(table):
+        out = pd.DataFrame({'样本数': table['samples']})
+        for h in horizons:
+            n = table[f'n_{h}'].replace(0, np.nan)
+            out[f'{h}日平均收益(%)'] = (table[f'sum_{h}'] / n * 100).round(3)
+            out[f'{h}日胜率(%)'] = (table[f'hits_{h}'] / n * 100).round(2)
+        return out
+
+    coverage = combined['coverage']
+    n = coverage['samples'].replace(0, np.nan)
+    return {
+        'buckets': returns_table(combined['buckets']),
+        'signals': returns_table(combined['signals']),
+        'coverage': pd.DataFrame(
+            {
+                '样本数': coverage['samples'],
+                '最高价覆盖率(%)': (coverage['high_hits'] / n * 100).round(2),
+                '最低价覆盖率(%)': (coverage['low_hits'] / n * 100).round(2),
+                '区间覆盖率(%)': (coverage['both_hits'] / n * 100).round(2),
+                '平均预测幅度(%)': (coverage['sum_pred_range'] / n).round(2),
+                '平均实际幅度(%)': (coverage['sum_actual_range'] / n).round(2),
+            }
+        ),
+        'symbols': combined['symbols'],
+    }
+
+
+def run_backtest(
+    panel,
+    horizons=HORIZONS,
+    threshold=RECOMMEND_THRESHOLD,
+    workers=None,
+    shard_size=None,
+    rules=None,
+):
+    """按股票分片并行回测，返回 buckets / signals / coverage 三张报表"""
+    rules = rules or active_rules()
+    n_stocks = panel.shape[0]
+    workers = workers or os.cpu_count() or 1
+    # 每个进程分到几个分片，分片之间K线长度不同时负载更均衡
+    shard_size = shard_size or max(50, -(-n_stocks // (workers * 4)))
+
+    # 按K线数量排序后再分片，同一分片内的股票长度接近，裁掉的空列更多
+    order = np.argsort(panel.lengths, kind='stable')
+    shards = []
+    for start in range(0, n_stocks, shard_size):
+        rows = order[start : start + shard_size]
+        shard = OHLCVPanel(
+            panel.open[rows],
+            panel.high[rows],
+            panel.low[rows],
+            panel.close[rows],
+            panel.volume[rows],
+            lengths=panel.lengths[rows],
+        )
+        shards.append((shard, horizons, threshold, rules))
+
+    started = time.perf_counter()
+    if workers == 1 or len(shards) <= 1:
+        parts = [_summarize_shard(shard) for shard in shards]
+    else:
+        # 读取K线时请求线程池已经启动，用 spawn 避免 fork 复制锁的状态
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(shards)),
+            mp_context=multiprocessing.get_context('spawn'),
+        ) as pool:
+            parts = list(pool.map(_summarize_shard, shards))
+
+    report = _finalize(_combine(parts), horizons)
+    report['elapsed_s'] = time.perf_counter() - started
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='推荐指数与价格预测的历史回测')
+    parser.add_argument('--start', default='20200101', help='开始日期 YYYYmmdd')
+    parser.add_argument('--end', help='结束日期 YYYYmmdd，默认为数据源当前日期')
+    parser.add_argument('--symbols', nargs='+', help='股票代码，默认全市场')
+    parser.add_argument('--horizons', type=int, nargs='+', default=list(HORIZONS))
+    parser.add_argument('--threshold', type=float, default=RECOMMEND_THRESHOLD)
+    parser.add_argument('--workers', type=int, help='进程数，默认为 CPU 核数')
+    parser.add_argument('--output', help='报表 CSV 的输出目录')
+    parser.add_argument('--rules', help='选股规则 JSON 文件，默认为 SCREEN_RULES')
+    args = parser.parse_args(argv)
+    rules = load_rules(args.rules) if args.rules else active_rules()
+
+    # 全市场K线请求经过同一个请求层限流、超时和重试
+    fetcher = AsyncFetcher()
+    provider = create_provider(fetcher=fetcher)
+    end = args.end or provider.now().strftime('%Y%m%d')
+    symbols = args.symbols or provider.get_spot()['代码'].astype(str).tolist()
+
+    started = time.perf_counter()
+    panel = load_panel(provider, symbols, args.start, end, fetcher=fetcher)
+    print(
+        f'读取 {panel.shape[0]} 支股票、最多 {panel.shape[1]} 根K线，'
+        f'耗时 {time.perf_counter() - started:.1f}s'
+    )
+
+    report = run_backtest(
+        panel, args.horizons, args.threshold, args.workers, rules=rules
+    )
+    print(f"回测 {report['symbols']} 支股票，耗时 {report['elapsed_s']:.1f}s")
+    titles = {
+        'buckets': '按推荐指数分组的未来收益',
+        'signals': '各信号出现后的未来收益',
+        'coverage': '次日价格区间覆盖率',
+    }
+    for name, title in titles.items():
+        print(f'\n== {title} ==')
+        print(report[name].to_string())
+
+    if args.output:
+        output = Path(args.output)
+        output.mkdir(parents=True, exist_ok=True)
+        for name in titles:
+            report[name].to_csv(output / f'{name}.csv', encoding='utf-8-sig')
+        print(f'\n报表已保存到 {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""命令行选股
+
+不启动 Streamlit，直接运行 StockScreener 并把结果写成 JSON 或 Parquet，
+适合定时任务调用。模块本身只导入标准库，选股相关的模块在参数解析之后
+才加载，绘图用的 plotly 和导出 Excel 用的 openpyxl 不会被加载。
+
+    astock-screen --provider synthetic --output results.json
+    astock-screen --limit 0 --time-budget 120 --format parquet -o results.parquet
+"""
+
+import argparse
+import contextlib
+import sys
+import time
+from pathlib import Path
+
+# 命令行格式名: export.EXPORT_FORMATS 中的格式名
+FORMATS = {'json': 'JSON', 'parquet': 'Parquet', 'csv': 'CSV', 'excel': 'Excel'}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='命令行选股，结果写为 JSON 或 Parquet')
+    parser.add_argument(
+        '--provider',
+        choices=['akshare', 'replay', 'synthetic'],
+        help='数据源，默认按 DATA_PROVIDER 配置',
+    )
+    parser.add_argument('--format', choices=list(FORMATS), default='json')
+    parser.add_argument('-o', '--output', help='输出文件，默认写到标准输出')
+    parser.add_argument('--rules', help='选股规则文件（JSON），默认按 SCREEN_RULES')
+    parser.add_argument(
+        '--limit', type=int, help='候选股票数量，0 表示全市场，默认按 CANDIDATE_LIMIT'
+    )
+    parser.add_argument(
+        '--time-budget', type=float, help='获取K线的时间预算（秒），默认按配置'
+    )
+    parser.add_argument(
+        '--period',
+        choices=['daily', 'weekly', 'monthly'],
+        default='daily',
+        help='评分使用的K线周期，周线和月线由日K线汇总',
+    )
+    parser.add_argument('--top', type=int, help='只输出推荐指数最高的前几名')
+    parser.add_argument(
+        '--timings', action='store_true', help='在标准错误输出各阶段耗时'
+    )
+    args = parser.parse_args(argv)
+    if args.output in (None, '-') and args.format not in ('json', 'csv'):
+        parser.error(f'{args.format} 格式需要用 --output 指定输出文件')
+
+    timings = {}
+    started = time.perf_counter()
+    # 选股过程中的打印和控制台日志都写到标准错误，标准输出只留给结果；
+    # 日志配置在这里完成，控制台 handler 才会绑定到标准错误
+    with contextlib.redirect_stdout(sys.stderr):
+        from astock_assistant.config.logging_config import setup_logging
+        from astock_assistant.export import export_results
+        from astock_assistant.fetcher import AsyncFetcher
+        from astock_assistant.metrics import log_event
+        from astock_assistant.providers import create_provider
+        from astock_assistant.rules import load_rules
+        from astock_assistant.stock_screener import StockScreener
+
+        timings['import'] = time.perf_counter() - started
+        setup_logging()
+
+        # 数据源和选股共用一个请求层，上游请求经过限流、超时和重试
+        fetcher = AsyncFetcher()
+        screener = StockScreener(
+            provider=create_provider(args.provider, fetcher=fetcher),
+            fetcher=fetcher,
+            rules=load_rules(args.rules) if args.rules else None,
+            candidate_limit=args.limit,
+            time_budget=args.time_budget,
+            period=args.period,
+        )
+        mark = time.perf_counter()
+        results = screener.screen_stocks()
+        timings['screen'] = time.perf_counter() - mark
+
+    # 选股出错或没有候选股票时不写结果，以非零状态退出，便于定时任务发现问题
+    if screener.error is not None or not screener.stage_items.get('screen'):
+        reason = '选股出错' if screener.error is not None else '没有候选股票'
+        print(f'{reason}，未写出结果', file=sys.stderr)
+        log_event('cli_screen', results=0, format=args.format, failed=reason)
+        return 1
+
+    mark = time.perf_counter()
+    frame = results.frame if args.top is None else results.frame.head(args.top)
+    data = export_results(frame, FORMATS[args.format])
+    if args.output in (None, '-'):
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+    else:
+        Path(args.output).write_bytes(data)
+    timings['write'] = time.perf_counter() - mark
+    timings['total'] = time.perf_counter() - started
+
+    log_event(
+        'cli_screen',
+        results=len(results),
+        format=args.format,
+        seconds={k: round(v, 4) for k, v in timings.items()},
+    )
+    if args.timings:
+        for stage, seconds in {**timings, **screener.stage_times}.items():
+            print(f'{stage:<20} {seconds * 1000:>10.1f}ms', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,13 +16,45 @@ class Settings(BaseSettings):
     # API 设置
     API_TIMEOUT: int = int(os.getenv("API_TIMEOUT", "30"))
     MAX_RETRIES: int = int(os.getenv("MAX_RETRIES", "3"))
+    FETCH_CONCURRENCY: int = int(os.getenv("FETCH_CONCURRENCY", "10"))
+    # 每秒请求数，0 表示不限流
+    FETCH_RATE_LIMIT: float = float(os.getenv("FETCH_RATE_LIMIT", "20"))
+    FETCH_BACKOFF: float = float(os.getenv("FETCH_BACKOFF", "0.5"))  # 重试退避（秒）
+    # 评分进程数，0 表示在当前进程内评分
+    SCORING_WORKERS: int = int(os.getenv("SCORING_WORKERS", "0"))
+    # 选股规则文件（JSON），为空时使用 rules.DEFAULT_RULES
+    SCREEN_RULES: str = os.getenv("SCREEN_RULES", "")
+    # 进入深度分析的候选股票数量，0 表示分析过滤后的全部股票
+    CANDIDATE_LIMIT: int = int(os.getenv("CANDIDATE_LIMIT", "300"))
+    # 获取K线的时间预算（秒），超时后排名靠后的股票不再获取，0 表示不限
+    SCREEN_TIME_BUDGET: float = float(os.getenv("SCREEN_TIME_BUDGET", "0"))
+    # 是否从 DATA_DIR/panel 下内存映射的全市场面板读取K线（需先构建面板）
+    PANEL_STORE: bool = os.getenv("PANEL_STORE", "false").lower() == "true"
+    # 构建全市场面板时保存的自然日数
+    PANEL_STORE_DAYS: int = int(os.getenv("PANEL_STORE_DAYS", "365"))
+    
+    # 行情数据源: akshare（实时）、replay（回放本地录制数据）、synthetic（合成数据）
+    DATA_PROVIDER: str = os.getenv("DATA_PROVIDER", "akshare")
+    REPLAY_DIR: Path = Path(os.getenv("REPLAY_DIR", "data/replay"))
+    SYNTHETIC_SYMBOLS: int = int(os.getenv("SYNTHETIC_SYMBOLS", "5000"))
+    SYNTHETIC_SEED: int = int(os.getenv("SYNTHETIC_SEED", "0"))
     
     # 数据更新设置
     AUTO_UPDATE_INTERVAL: int = int(os.getenv("AUTO_UPDATE_INTERVAL", "3600"))  # 秒
+    # 个股图表缓存的内存上限（MB）
+    FIGURE_CACHE_MB: int = int(os.getenv("FIGURE_CACHE_MB", "64"))
+    # 是否在应用进程内启动后台预计算线程
+    # （也可以单独运行 python -m astock_assistant.scheduler）
+    PRECOMPUTE: bool = os.getenv("PRECOMPUTE", "false").lower() == "true"
     
     # 日志设置
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_DIR: Path = Path("logs")
+    # Prometheus 文本格式指标的本地端口，0 表示不启动
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "0"))
+    # 采样分析：开启后每次选股和股票详情渲染的火焰图和热点摘要写入 LOG_DIR
+    PROFILE: bool = os.getenv("PROFILE", "false").lower() == "true"
+    PROFILE_INTERVAL: float = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # 秒
     
     class Config:
         env_file = ".env"
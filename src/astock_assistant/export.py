@@ -0,0 +1,71 @@
+import hashlib
+import io
+import pickle
+
+SHEET_NAME = '选股结果'
+
+# 格式名称: (文件扩展名, MIME 类型)
+EXPORT_FORMATS = {
+    'Excel': (
+        'xlsx',
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    ),
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'JSON': ('json', 'application/json'),
+}
+
+
+def results_digest(results):
+    """选股结果的版本号，内容相同的结果共用同一份导出文件"""
+    return hashlib.sha1(pickle.dumps(results)).hexdigest()[:16]
+
+
+def column_widths(df):
+    """各列宽度：表头和单元格文本的最大长度加 2"""
+    return [
+        max(len(str(col)), int(df[col].astype(str).str.len().max() or 0)) + 2
+        for col in df.columns
+    ]
+
+
+def results_to_excel(df):
+    """把选股结果导出为 Excel 二进制数据
+
+    使用 openpyxl 的只写模式逐行写入，内存占用不随行数增长；列宽由
+    整列的字符串长度一次算出，不再逐个单元格遍历。
+    """
+    # openpyxl 导入较慢，只在导出 Excel 时加载
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(SHEET_NAME)
+    # 只写模式下列宽必须在写入数据之前设置
+    for i, width in enumerate(column_widths(df), 1):
+        worksheet.column_dimensions[get_column_letter(i)].width = width
+
+    worksheet.append(list(df.columns))
+    values = df.astype(object).where(df.notna(), None)
+    for row in values.itertuples(index=False, name=None):
+        worksheet.append(row)
+
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def export_results(df, fmt):
+    """按格式导出选股结果，返回二进制数据"""
+    if fmt == 'Excel':
+        return results_to_excel(df)
+    if fmt == 'CSV':
+        # 带 BOM，Excel 直接打开时中文不乱码
+        return df.to_csv(index=False).encode('utf-8-sig')
+    if fmt == 'Parquet':
+        output = io.BytesIO()
+        df.to_parquet(output, index=False)
+        return output.getvalue()
+    if fmt == 'JSON':
+        return df.to_json(orient='records', force_ascii=False).encode('utf-8')
+    raise ValueError(f'不支持的导出格式: {fmt}')
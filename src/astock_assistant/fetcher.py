@@ -0,0 +1,181 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import partial
+
+from astock_assistant.config.settings import settings
+from astock_assistant.metrics import metrics
+
+
+class TokenBucket:
+    """线程安全的令牌桶限流器，rate 为每秒请求数，<=0 表示不限流"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """预留一个令牌，返回拿到令牌前需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class AsyncFetcher:
+    """行情接口请求层：并发上限、令牌桶限流、单次请求超时和抖动退避重试
+
+    上游接口（akshare）都是同步阻塞调用，这里放到线程池中执行。fetch 供
+    协程使用，call 是可以在任意线程调用的同步版本，两者共用同一个限流器。
+    """
+
+    def __init__(
+        self,
+        concurrency=None,
+        rate_limit=None,
+        timeout=None,
+        max_retries=None,
+        backoff=None,
+    ):
+        self.concurrency = concurrency or settings.FETCH_CONCURRENCY
+        self.timeout = timeout or settings.API_TIMEOUT
+        self.max_retries = (
+            settings.MAX_RETRIES if max_retries is None else max_retries
+        )
+        self.backoff = settings.FETCH_BACKOFF if backoff is None else backoff
+        self.limiter = TokenBucket(
+            settings.FETCH_RATE_LIMIT if rate_limit is None else rate_limit
+        )
+        # 超时的请求无法被中断，只能放弃等待，所以请求线程多留一些余量
+        self._io_executor = ThreadPoolExecutor(
+            max_workers=self.concurrency * 2, thread_name_prefix='fetch-io'
+        )
+        self._job_executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix='fetch-job'
+        )
+
+    def _backoff_delay(self, attempt):
+        return self.backoff * (2**attempt) * random.uniform(0.5, 1.5)
+
+    def _record_attempt(self, name, started, error=None, attempt=0):
+        """记录一次请求尝试的耗时，失败时按是否还会重试分别计数"""
+        metrics.observe(
+            'astock_fetch_seconds', time.perf_counter() - started, func=name
+        )
+        if error is None:
+            return
+        if attempt >= self.max_retries:
+            metrics.inc('astock_fetch_errors_total', func=name)
+        else:
+            metrics.inc('astock_fetch_retries_total', func=name)
+
+    async def fetch(self, func, *args, **kwargs):
+        """限流、超时并自动重试地执行一次上游请求"""
+        loop = asyncio.get_running_loop()
+        name = getattr(func, '__name__', str(func))
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire_async()
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(
+                        self._io_executor, partial(func, *args, **kwargs)
+                    ),
+                    self.timeout,
+                )
+                self._record_attempt(name, started)
+                return result
+            except Exception as e:
+                self._record_attempt(name, started, e, attempt)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                print(
+                    f'请求 {getattr(func, "__name__", func)} 失败: '
+                    f'{str(e) or type(e).__name__}，{delay:.1f}秒后重试'
+                )
+                await asyncio.sleep(delay)
+
+    def call(self, func, *args, **kwargs):
+        """fetch 的同步版本，供线程池任务和 Streamlit 回调使用"""
+        name = getattr(func, '__name__', str(func))
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            started = time.perf_counter()
+            future = self._io_executor.submit(func, *args, **kwargs)
+            try:
+                result = future.result(timeout=self.timeout)
+                self._record_attempt(name, started)
+                return result
+            except Exception as e:
+                self._record_attempt(name, started, e, attempt)
+                future.cancel()
+                if attempt >= self.max_retries:
+                    if isinstance(e, FutureTimeoutError):
+                        raise TimeoutError(
+                            f'请求超时（{self.timeout}秒）: '
+                            f'{getattr(func, "__name__", func)}'
+                        ) from e
+                    raise
+                delay = self._backoff_delay(attempt)
+                print(
+                    f'请求 {getattr(func, "__name__", func)} 失败: '
+                    f'{str(e) or type(e).__name__}，{delay:.1f}秒后重试'
+                )
+                time.sleep(delay)
+
+    async def gather(self, func, items, on_result=None):
+        """并发执行 func(item)，最多同时运行 concurrency 个
+
+        func 本身负责通过 call/fetch 发起上游请求，命中本地缓存的任务不占用
+        限流令牌。返回与 items 一一对应的结果，失败的位置为 None；on_result
+        按完成顺序回调 (已完成数量, 下标, 结果)。
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = [None] * len(items)
+
+        async def run(i, item):
+            async with semaphore:
+                try:
+                    return i, await loop.run_in_executor(
+                        self._job_executor, func, item
+                    )
+                except Exception as e:
+                    metrics.inc('astock_job_errors_total')
+                    print(f'处理 {item} 时出错: {str(e)}')
+                    return i, None
+
+        tasks = [run(i, item) for i, item in enumerate(items)]
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            i, result = await task
+            results[i] = result
+            if on_result:
+                on_result(done, i, result)
+        return results
+
+    def close(self):
+        self._job_executor.shutdown(wait=False)
+        self._io_executor.shutdown(wait=False)
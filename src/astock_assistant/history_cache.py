@@ -0,0 +1,218 @@
+import os
+import threading
+from collections import defaultdict
+from datetime import time
+from pathlib import Path
+
+import pandas as pd
+from astock_assistant.config.settings import settings
+from astock_assistant.metrics import metrics
+
+MARKET_TZ = 'Asia/Shanghai'
+MARKET_OPEN = time(9, 15)
+# 收盘后留出一段时间等待行情源落地最终数据，之后当天的K线才写入缓存
+MARKET_SETTLE = time(15, 30)
+
+
+def load_akshare():
+    """导入 akshare，它本身的导入需要约 0.3 秒，只在真正请求上游时加载"""
+    import akshare
+
+    return akshare
+
+
+def market_now():
+    """返回北京时间的当前时刻（不带时区）"""
+    return pd.Timestamp.now(tz=MARKET_TZ).tz_localize(None)
+
+
+class TradeCalendar:
+    """A股交易日历，缓存在本地，只有当前日期超出已知范围时才刷新"""
+
+    def __init__(self, cache_dir=None, dates=None, fetch_func=None):
+        self.path = Path(cache_dir or settings.CACHE_DIR) / 'trade_calendar.parquet'
+        self.fetch_func = fetch_func or (
+            lambda: load_akshare().tool_trade_date_hist_sina()['trade_date']
+        )
+        self._lock = threading.Lock()
+        self._dates = (
+            pd.DatetimeIndex(pd.to_datetime(dates)).normalize().sort_values()
+            if dates is not None
+            else None
+        )
+
+    def _fetch(self):
+        df = pd.DataFrame({'trade_date': pd.to_datetime(list(self.fetch_func()))})
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(self.path, index=False)
+        return pd.DatetimeIndex(df['trade_date'])
+
+    def trade_dates(self, today=None):
+        today = (today or market_now()).normalize()
+        with self._lock:
+            if self._dates is None and self.path.exists():
+                self._dates = pd.DatetimeIndex(
+                    pd.read_parquet(self.path)['trade_date']
+                )
+            if self._dates is None or self._dates[-1] < today:
+                try:
+                    self._dates = self._fetch()
+                except Exception as e:
+                    print(f'获取交易日历失败，按工作日估算: {str(e)}')
+                    if self._dates is None or self._dates[-1] < today:
+                        start = (
+                            self._dates[0]
+                            if self._dates is not None
+                            else today - pd.Timedelta(days=3650)
+                        )
+                        self._dates = pd.bdate_range(start, today)
+            return self._dates
+
+    def is_trading_day(self, day):
+        day = pd.Timestamp(day).normalize()
+        return day in self.trade_dates(day)
+
+    def last_settled_session(self, now=None):
+        """最近一个已经收盘且数据落地的交易日"""
+        now = now or market_now()
+        dates = self.trade_dates(now)
+        today = now.normalize()
+        if now.time() >= MARKET_SETTLE:
+            return dates[dates <= today][-1]
+        return dates[dates < today][-1]
+
+    def in_session(self, now=None):
+        """当前是否处于交易日的盘中（含收盘后尚未落地的时段）"""
+        now = now or market_now()
+        return (
+            self.is_trading_day(now)
+            and MARKET_OPEN <= now.time() < MARKET_SETTLE
+        )
+
+
+class HistoryCache:
+    """按股票代码和复权方式存储的日K线本地缓存（Parquet）
+
+    每次读取只向上游请求最后一根缓存K线之后的交易日，已收盘的K线
+    追加写入磁盘；非交易时段且缓存已覆盖最近交易日时不发起任何请求。
+    """
+
+    def __init__(self, cache_dir=None, calendar=None, fetch_func=None):
+        cache_dir = Path(cache_dir or settings.CACHE_DIR)
+        self.root = cache_dir / 'history'
+        self.calendar = calendar or TradeCalendar(cache_dir)
+        self.fetch_func = fetch_func or (
+            lambda **kwargs: load_akshare().stock_zh_a_hist(**kwargs)
+        )
+        self._locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+
+    def _path(self, symbol, adjust):
+        return self.root / (adjust or 'none') / f'{symbol}.parquet'
+
+    def _lock_for(self, symbol, adjust):
+        with self._locks_guard:
+            return self._locks[(symbol, adjust)]
+
+    def _fetch(self, symbol, start, end, adjust):
+        df = self.fetch_func(
+            symbol=symbol,
+            period='daily',
+            start_date=start.strftime('%Y%m%d'),
+            end_date=end.strftime('%Y%m%d'),
+            adjust=adjust,
+        )
+        if df is None or df.empty:
+            return pd.DataFrame()
+        return df.reset_index(drop=True)
+
+    def _load(self, path):
+        if not path.exists():
+            return None, None, None
+        df = pd.read_parquet(path)
+        covered_from = df.attrs.get('covered_from')
+        synced_to = df.attrs.get('synced_to')
+        return (
+            df,
+            pd.Timestamp(covered_from) if covered_from else None,
+            pd.Timestamp(synced_to) if synced_to else None,
+        )
+
+    def _save(self, path, df, covered_from, synced_to):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df = df.reset_index(drop=True)
+        # covered_from: 缓存覆盖的起始日期；synced_to: 最近一次与上游同步到的交易日
+        df.attrs['covered_from'] = covered_from.strftime('%Y-%m-%d')
+        df.attrs['synced_to'] = synced_to.strftime('%Y-%m-%d')
+        tmp_path = path.with_suffix('.tmp')
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def get_history(self, symbol, start_date, end_date=None, adjust='qfq'):
+        """返回 [start_date, end_date] 区间的日K线，格式与 ak.stock_zh_a_hist 一致"""
+        now = market_now()
+        start = pd.Timestamp(start_date).normalize()
+        end = pd.Timestamp(end_date).normalize() if end_date else now.normalize()
+        settled = self.calendar.last_settled_session(now)
+        # 请求在 end 之前结束时，缓存只同步到 end，之后更长的请求仍会补齐
+        synced_now = min(end, settled)
+        path = self._path(symbol, adjust)
+
+        with self._lock_for(symbol, adjust):
+            cached, covered_from, synced_to = self._load(path)
+            live = None
+            result = 'hit'
+
+            if cached is None or covered_from is None or covered_from > start:
+                result = 'miss'
+                fetched = self._fetch(symbol, start, end, adjust)
+                cached, live = self._split_settled(fetched, settled)
+                self._save(path, cached, start, synced_now)
+            elif synced_to < synced_now or (
+                end > settled and self.calendar.in_session(now)
+            ):
+                result = 'partial'
+                if cached.empty:
+                    last = synced_to
+                else:
+                    last = pd.Timestamp(cached['日期'].iloc[-1])
+                # 多取最后一根缓存K线，用于发现除权导致的前复权价格变化
+                fetched = self._fetch(symbol, last, end, adjust)
+                overlap = (
+                    fetched[pd.to_datetime(fetched['日期']) == last]
+                    if not fetched.empty and not cached.empty
+                    else fetched.iloc[0:0]
+                )
+                if not overlap.empty and abs(
+                    float(overlap['收盘'].iloc[0]) - float(cached['收盘'].iloc[-1])
+                ) > 1e-6:
+                    fetched = self._fetch(symbol, covered_from, end, adjust)
+                    cached, live = self._split_settled(fetched, settled)
+                elif not fetched.empty:
+                    new_bars = fetched[pd.to_datetime(fetched['日期']) > last]
+                    new_settled, live = self._split_settled(new_bars, settled)
+                    if not new_settled.empty:
+                        cached = pd.concat([cached, new_settled], ignore_index=True)
+                self._save(path, cached, covered_from, max(synced_to, synced_now))
+            metrics.inc('astock_cache_requests_total', cache='history', result=result)
+
+            if live is not None and not live.empty:
+                df = pd.concat([cached, live], ignore_index=True)
+            else:
+                df = cached
+            if df.empty:
+                return df
+
+        dates = pd.to_datetime(df['日期'])
+        return df[(dates >= start) & (dates <= end)].reset_index(drop=True)
+
+    @staticmethod
+    def _split_settled(df, settled):
+        """拆分出已收盘落地的K线和当天盘中尚未定型的K线"""
+        if df.empty:
+            return df, df
+        dates = pd.to_datetime(df['日期'])
+        return (
+            df[dates <= settled].reset_index(drop=True),
+            df[dates > settled].reset_index(drop=True),
+        )
@@ -0,0 +1,262 @@
+"""盘中分钟K线模式
+
+每只股票的1分钟K线保存在固定容量的环形缓冲区中，同时维护当日累计成交量
+和成交额。每次刷新只向数据源请求缓冲区最后一根K线之后的数据（最后一根
+可能尚未走完，会被覆盖），只有收到新K线的股票才重新计算短周期指标和
+日内评分，几分钟一次的盘中复筛只需处理增量。
+
+    python -m astock_assistant.intraday --interval 180 --top 20
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from astock_assistant.fetcher import AsyncFetcher
+from astock_assistant.metrics import log_event, metrics
+from astock_assistant.providers import create_provider
+
+# 环形缓冲区中每根K线保存的字段，与 MINUTE_COLUMNS 的数值列对应
+MINUTE_FIELDS = ('开盘', '最高', '最低', '收盘', '成交量', '成交额')
+OPEN, HIGH, LOW, CLOSE, VOLUME, AMOUNT = range(len(MINUTE_FIELDS))
+
+INDICATOR_COLUMNS = [
+    '最新价',
+    '均价',
+    '5分钟涨跌',
+    '15分钟涨跌',
+    '分钟MA5',
+    '分钟MA20',
+    '量能比',
+    '日内评分',
+]
+
+
+class MinuteRing:
+    """单只股票的分钟K线环形缓冲区，写满后覆盖最早的K线"""
+
+    def __init__(self, capacity=240):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype='datetime64[m]')
+        self.values = np.full((len(MINUTE_FIELDS), capacity), np.nan)
+        self.size = 0
+        self.end = 0  # 下一根K线写入的位置
+        # 当日累计量，用于均价和量能比，跨日时清零
+        self.session = None
+        self.session_bars = 0
+        self.cum_volume = 0.0
+        self.cum_amount = 0.0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def last_time(self):
+        if not self.size:
+            return None
+        return self.times[(self.end - 1) % self.capacity]
+
+    def _accumulate(self, times, values, sign=1):
+        """把一段K线计入当日累计量，这段K线属于同一个交易日"""
+        self.session_bars += sign * len(times)
+        self.cum_volume += sign * values[VOLUME].sum()
+        self.cum_amount += sign * values[AMOUNT].sum()
+
+    def update(self, times, values):
+        """写入按时间升序的K线，返回新增或更新的K线数
+
+        values 的形状为 (len(MINUTE_FIELDS), K线数)。早于最后一根的K线忽略，
+        与最后一根同一时刻的K线覆盖它。
+        """
+        times = np.asarray(times, dtype='datetime64[m]')
+        values = np.asarray(values, dtype=float)
+        changed = 0
+        last = self.last_time
+        if last is not None:
+            # 盘中最后一根K线还在变化，同一分钟的新数据覆盖旧值
+            same = np.flatnonzero(times == last)
+            if len(same):
+                pos = (self.end - 1) % self.capacity
+                old = self.values[:, pos : pos + 1].copy()
+                new = values[:, same[-1] : same[-1] + 1]
+                if not np.array_equal(old, new, equal_nan=True):
+                    # 最后一根属于当日，先减去旧值再计入新值
+                    self._accumulate(self.times[pos : pos + 1], old, sign=-1)
+                    self._accumulate(self.times[pos : pos + 1], new)
+                    self.values[:, pos] = new[:, 0]
+                    changed += 1
+            keep = times > last
+            times, values = times[keep], values[:, keep]
+        if not len(times):
+            return changed
+
+        # 多于容量时只保留最新的部分
+        times, values = times[-self.capacity :], values[:, -self.capacity :]
+        days = times.astype('datetime64[D]')
+        if days[-1] != self.session:
+            self.session = days[-1]
+            self.session_bars = 0
+            self.cum_volume = self.cum_amount = 0.0
+        today = days == self.session
+        self._accumulate(times[today], values[:, today])
+
+        positions = (self.end + np.arange(len(times))) % self.capacity
+        self.times[positions] = times
+        self.values[:, positions] = values
+        self.end = (self.end + len(times)) % self.capacity
+        self.size = min(self.size + len(times), self.capacity)
+        return changed + len(times)
+
+    def tail(self, n):
+        """最近 n 根K线，按时间先后排列，形状为 (len(MINUTE_FIELDS), n)"""
+        n = min(n, self.size)
+        positions = (self.end - n + np.arange(n)) % self.capacity
+        return self.values[:, positions]
+
+    @np.errstate(divide='ignore', invalid='ignore')
+    def indicators(self):
+        """短周期指标和日内评分，只读取最近 20 根K线和当日累计量"""
+        bars = self.tail(21)
+        close = bars[CLOSE]
+        volume = bars[VOLUME]
+        latest = close[-1]
+
+        def change(n):
+            return (latest / close[-n - 1] - 1) * 100 if len(close) > n else np.nan
+
+        def mean(values, n):
+            return values[-n:].mean() if len(values) >= n else np.nan
+
+        vwap = (
+            self.cum_amount / (self.cum_volume * 100) if self.cum_volume else np.nan
+        )
+        average_volume = (
+            self.cum_volume / self.session_bars if self.session_bars else np.nan
+        )
+        row = {
+            '最新价': latest,
+            '均价': round(vwap, 3),
+            '5分钟涨跌': round(change(5), 2),
+            '15分钟涨跌': round(change(15), 2),
+            '分钟MA5': round(mean(close, 5), 3),
+            '分钟MA20': round(mean(close, 20), 3),
+            '量能比': round(mean(volume, 5) / average_volume, 2),
+        }
+        row['日内评分'] = intraday_score(row)
+        return row
+
+
+def intraday_score(row):
+    """日内动量评分（0-100）：站上均价、短均线向上、放量上涨加分，跌破均价下跌扣分"""
+    score = 0
+    above_vwap = row['最新价'] > row['均价']
+    if above_vwap:
+        score += 25
+    if row['分钟MA5'] > row['分钟MA20']:
+        score += 20
+    if row['5分钟涨跌'] > 0:
+        score += 15
+        if row['量能比'] >= 1.5:
+            score += 30
+    if row['15分钟涨跌'] > 0:
+        score += 10
+    if not above_vwap and row['5分钟涨跌'] < 0:
+        score -= 20
+    return max(0, min(100, score))
+
+
+class IntradayMonitor:
+    """一组股票的分钟K线环形缓冲区，按增量刷新指标和评分"""
+
+    def __init__(self, provider=None, fetcher=None, capacity=240):
+        self.fetcher = fetcher or AsyncFetcher()
+        self.provider = provider or create_provider(fetcher=self.fetcher)
+        self.capacity = capacity
+        self.rings = {}
+        self.rows = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, symbol):
+        ring = self.rings.get(symbol)
+        start = None
+        if ring is not None and len(ring):
+            # 从最后一根K线开始取，它可能在上次刷新后仍有变化
+            start = pd.Timestamp(ring.last_time)
+        try:
+            return self.provider.get_minute_bars(symbol, start=start)
+        except Exception as e:
+            print(f'获取股票 {symbol} 分钟K线时出错: {str(e)}')
+            return None
+
+    def refresh(self, symbols):
+        """增量刷新并返回这些股票的指标表，按日内评分降序"""
+        symbols = list(symbols)
+        started = time.perf_counter()
+        frames = asyncio.run(self.fetcher.gather(self._fetch, symbols))
+
+        fetched = updated = 0
+        with self._lock:
+            for symbol, df in zip(symbols, frames):
+                if df is None or df.empty:
+                    continue
+                fetched += len(df)
+                ring = self.rings.get(symbol)
+                if ring is None:
+                    ring = self.rings[symbol] = MinuteRing(self.capacity)
+                changed = ring.update(
+                    pd.to_datetime(df['时间']).to_numpy(),
+                    df[list(MINUTE_FIELDS)].to_numpy(dtype=float).T,
+                )
+                if changed or symbol not in self.rows:
+                    self.rows[symbol] = ring.indicators()
+                    updated += 1
+
+        elapsed = time.perf_counter() - started
+        metrics.observe('astock_stage_seconds', elapsed, stage='intraday_refresh')
+        metrics.inc('astock_intraday_bars_total', fetched)
+        log_event(
+            'intraday_refresh',
+            symbols=len(symbols),
+            updated=updated,
+            bars=fetched,
+            seconds=round(elapsed, 4),
+        )
+        return self.table(symbols)
+
+    def table(self, symbols=None):
+        with self._lock:
+            if symbols is None:
+                symbols = list(self.rows)
+            rows = {s: self.rows[s] for s in symbols if s in self.rows}
+        df = pd.DataFrame.from_dict(rows, orient='index', columns=INDICATOR_COLUMNS)
+        df.index.name = '代码'
+        return df.sort_values('日内评分', ascending=False, kind='stable')
+
+
+def main(argv=None):
+    from astock_assistant.config.logging_config import setup_logging
+    from astock_assistant.stock_screener import StockScreener
+
+    parser = argparse.ArgumentParser(description='盘中分钟K线复筛')
+    parser.add_argument('--interval', type=int, default=180, help='刷新间隔（秒）')
+    parser.add_argument('--top', type=int, default=20, help='显示前几名')
+    parser.add_argument('--once', action='store_true', help='只刷新一次')
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    screener = StockScreener()
+    monitor = IntradayMonitor(screener.provider, screener.fetcher)
+    while True:
+        table = screener.intraday_screen(monitor)
+        print(f'\n== {screener.provider.now():%H:%M:%S} 日内评分前 {args.top} 名 ==')
+        print(table.head(args.top).to_string())
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
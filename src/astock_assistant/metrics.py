@@ -0,0 +1,222 @@
+"""运行指标：分阶段耗时、请求延迟分布、重试与错误次数、缓存命中率
+
+指标保存在进程内的 metrics 实例中，阶段耗时和选股汇总以 JSON 记录写入
+astock_assistant.metrics 日志；设置 METRICS_PORT 后在本地以 Prometheus
+文本格式提供 /metrics。
+"""
+
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from astock_assistant.config.settings import settings
+
+logger = logging.getLogger('astock_assistant.metrics')
+
+# 秒，覆盖从本地缓存读取到慢请求超时的范围
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+DESCRIPTIONS = {
+    'astock_stage_seconds': '各阶段耗时（秒）',
+    'astock_fetch_seconds': '单次上游请求耗时（秒），含失败的尝试',
+    'astock_fetch_retries_total': '上游请求重试次数',
+    'astock_fetch_errors_total': '重试用尽后失败的上游请求数',
+    'astock_job_errors_total': '并发任务失败数',
+    'astock_history_coalesced_total': '与进行中的相同请求合并、没有单独执行的K线请求数',
+    'astock_cache_requests_total': '缓存访问次数，按结果 hit/partial/miss 区分',
+    'astock_screens_total': '完成的选股次数',
+    'astock_screen_candidates': '最近一次选股的候选股票数',
+    'astock_screen_results': '最近一次选股的推荐股票数',
+    'astock_screen_candidates_per_second': '最近一次选股每秒分析的候选股票数',
+    'astock_stage_items_per_second': '最近一次选股各阶段每秒处理的股票数',
+    'astock_screen_skipped': '最近一次选股因超出时间预算未获取K线的股票数',
+    'astock_intraday_bars_total': '盘中刷新获取的分钟K线数',
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """线程安全的指标登记表：计数器、瞬时值和直方图"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def hit_ratio(self, cache):
+        """缓存命中率，partial（只增量获取）和 coalesced（等待同一次计算）按命中计"""
+        with self._lock:
+            counts = {
+                dict(key).get('result'): value
+                for (name, key), value in self._counters.items()
+                if name == 'astock_cache_requests_total'
+                and dict(key).get('cache') == cache
+            }
+        total = sum(counts.values())
+        if not total:
+            return None
+        hits = sum(counts.get(k, 0) for k in ('hit', 'partial', 'coalesced'))
+        return hits / total
+
+    @contextmanager
+    def timer(self, stage, **fields):
+        """记录一个阶段的耗时，结束时写一条 DEBUG 级别的结构化日志
+
+        产出的字典在阶段结束后带有 seconds，也可以用作函数装饰器。
+        """
+        span = {'stage': stage}
+        started = time.perf_counter()
+        try:
+            yield span
+        finally:
+            elapsed = span['seconds'] = time.perf_counter() - started
+            self.observe('astock_stage_seconds', elapsed, stage=stage)
+            if logger.isEnabledFor(logging.DEBUG):
+                log_event(
+                    'stage',
+                    level=logging.DEBUG,
+                    stage=stage,
+                    seconds=round(elapsed, 6),
+                    **fields,
+                )
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """Prometheus 文本格式"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {
+                key: (list(h.counts), h.sum, h.count)
+                for key, h in self._histograms.items()
+            }
+
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in DESCRIPTIONS:
+                    lines.append(f'# HELP {name} {DESCRIPTIONS[name]}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, key), value in sorted(counters.items()):
+            header(name, 'counter')
+            lines.append(f'{name}{_format_labels(key)} {value}')
+        for (name, key), value in sorted(gauges.items()):
+            header(name, 'gauge')
+            lines.append(f'{name}{_format_labels(key)} {value}')
+        for (name, key), (counts, total, count) in sorted(histograms.items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(
+                    f'{name}_bucket{_format_labels(key, [("le", bound)])} '
+                    f'{cumulative}'
+                )
+            inf_labels = _format_labels(key, [('le', '+Inf')])
+            lines.append(f'{name}_bucket{inf_labels} {count}')
+            lines.append(f'{name}_sum{_format_labels(key)} {total}')
+            lines.append(f'{name}_count{_format_labels(key)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def log_event(event, level=logging.INFO, **fields):
+    """以单行 JSON 写一条结构化日志"""
+    logger.log(
+        level,
+        json.dumps({'event': event, **fields}, ensure_ascii=False, default=str),
+    )
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port=None, host='127.0.0.1', registry=None):
+    """在后台线程中提供 /metrics，返回 server，port 为 0 时由系统分配端口"""
+    server = ThreadingHTTPServer(
+        (host, settings.METRICS_PORT if port is None else port), _MetricsHandler
+    )
+    server.metrics = registry or metrics
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# 全局指标实例
+metrics = Metrics()
@@ -0,0 +1,156 @@
+"""多进程批量评分
+
+K线已在本地缓存时，评分是纯 CPU 计算，线程受 GIL 限制无法并行。这里把
+OHLCV 面板复制到一块共享内存中，工作进程按名称挂载后各自计算一段股票，
+只返回推荐指数、信号分值和价格预测这些一维数组，不传输 DataFrame。
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from astock_assistant.config.settings import settings
+from astock_assistant.rules import PANEL_FIELDS
+from astock_assistant.scoring import OHLCVPanel, predict_panel, score_panel
+
+
+def evaluate_panel(panel, rules=None):
+    """计算推荐指数、信号分值和价格预测
+
+    返回 (scores, positive, negative, predictions)，默认规则下与逐只股票的
+    实现一致。
+    """
+    scores, positive, negative = score_panel(panel, with_signals=True, rules=rules)
+    return scores, positive, negative, predict_panel(panel)
+
+
+class SharedPanel:
+    """放在共享内存中的 OHLCV 面板，工作进程按名称挂载，不需要序列化数据"""
+
+    def __init__(self, panel):
+        # 面板靠右对齐，左侧全部为空的列不影响最后一天的评分，不复制
+        n_days = int(panel.lengths.max(initial=1))
+        self.shape = (len(PANEL_FIELDS), panel.shape[0], n_days)
+        self.lengths = panel.lengths
+        size = max(int(np.prod(self.shape)) * 8, 1)
+        self.shm = SharedMemory(create=True, size=size)
+        data = np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf)
+        for k, field in enumerate(PANEL_FIELDS):
+            data[k] = getattr(panel, field)[:, -n_days:]
+        del data
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach(name):
+    try:
+        # 3.13 起可以不登记到 resource_tracker，共享内存由创建方负责释放
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        return SharedMemory(name=name)
+
+
+def _score_rows(name, shape, start, stop, lengths, rules=None):
+    """工作进程：挂载共享面板，计算 [start, stop) 行的股票"""
+    shm = _attach(name)
+    try:
+        data = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        panel = OHLCVPanel(
+            *(data[k, start:stop] for k in range(shape[0])), lengths=lengths
+        )
+        # 规则文件中的信号分值可以是小数，保持原来的类型返回
+        scores, positive, negative, predictions = evaluate_panel(panel, rules)
+        del data, panel
+        return scores, positive, negative, predictions
+    finally:
+        shm.close()
+
+
+def _concat_dicts(dicts):
+    return {k: np.concatenate([d[k] for d in dicts]) for k in dicts[0]}
+
+
+class ScoringPool:
+    """常驻的评分进程池，结果与在当前进程内调用 evaluate_panel 完全相同"""
+
+    def __init__(self, workers=None, min_rows=64):
+        self.workers = workers or os.cpu_count() or 1
+        # 每个任务至少这么多只股票，股票太少时直接在当前进程计算
+        self.min_rows = min_rows
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # 调用方进程里有请求线程在运行，用 spawn 避免 fork 复制锁的状态
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._executor
+
+    def evaluate(self, panel, rules=None):
+        n_stocks = panel.shape[0]
+        if self.workers <= 1 or n_stocks < self.min_rows * 2:
+            return evaluate_panel(panel, rules)
+
+        chunk = max(self.min_rows, -(-n_stocks // self.workers))
+        pool = self._pool()
+        with SharedPanel(panel) as shared:
+            futures = [
+                pool.submit(
+                    _score_rows,
+                    shared.name,
+                    shared.shape,
+                    start,
+                    min(start + chunk, n_stocks),
+                    shared.lengths[start : start + chunk],
+                    rules,
+                )
+                for start in range(0, n_stocks, chunk)
+            ]
+            parts = [future.result() for future in futures]
+
+        return (
+            np.concatenate([part[0] for part in parts]),
+            _concat_dicts([part[1] for part in parts]),
+            _concat_dicts([part[2] for part in parts]),
+            _concat_dicts([part[3] for part in parts]),
+        )
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    """按 SCORING_WORKERS 创建的进程内唯一评分进程池，未启用时返回 None"""
+    global _shared_pool
+    if settings.SCORING_WORKERS <= 0:
+        return None
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ScoringPool(settings.SCORING_WORKERS)
+        return _shared_pool
@@ -0,0 +1,346 @@
+"""全市场日K线面板的内存映射存储
+
+ak.stock_zh_a_hist 按股票返回 DataFrame，这里换一种布局：全部股票的
+开高低收量按字段各存成一个二维数组（股票 × 交易日）的 .npy 文件，
+另存股票代码和交易日索引。读取时以只读方式内存映射，多个进程和会话共用
+操作系统的页缓存，内存占用不随读取方的数量增长；打开一份全市场面板只需
+读取索引，单只股票的K线是数组中的一段切片，不复制数据。
+
+每次构建写入一个新的版本目录，最后原子地替换 current.json 指向它，
+正在读取旧版本的进程不受影响。收盘后构建一次即可：
+
+    python -m astock_assistant.panel_store
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from astock_assistant.config.settings import settings
+from astock_assistant.metrics import log_event
+from astock_assistant.providers import HISTORY_DAYS, recent_history
+from astock_assistant.scoring import OHLCVPanel
+
+# K线列名: 数组文件名
+STORE_FIELDS = {
+    '开盘': 'open',
+    '最高': 'high',
+    '最低': 'low',
+    '收盘': 'close',
+    '成交量': 'volume',
+}
+# 价格存为 float32，约有 7 位有效数字，读出时按 3 位小数取整，原始数据
+# 不超过这个精度时可以还原出与 DataFrame 中完全相同的值；成交量（手）
+# 超过 float32 能精确表示的 2^24，与 spot 模块一样存为 float64
+PRICE_DECIMALS = 3
+STORE_DTYPES = {'成交量': np.float64}
+# 抽查几只股票的最后一根K线来判断面板是否过期
+PROBE_SYMBOLS = 3
+
+
+class MarketPanel:
+    """一个版本的全市场面板，数组为只读的内存映射"""
+
+    def __init__(self, root, meta):
+        self.root = Path(root)
+        self.version = meta['version']
+        self.provider = meta['provider']
+        self.as_of = pd.Timestamp(meta['as_of'])
+        self.symbols = meta['symbols']
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.dates = pd.DatetimeIndex(np.load(self.root / 'dates.npy'))
+        self.arrays = {
+            col: np.load(self.root / f'{name}.npy', mmap_mode='r')
+            for col, name in STORE_FIELDS.items()
+        }
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def _columns(self, start=None, end=None):
+        lo = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start))
+        hi = (
+            len(self.dates)
+            if end is None
+            else self.dates.searchsorted(pd.Timestamp(end), side='right')
+        )
+        return slice(lo, hi)
+
+    def rows(self, symbol, start=None, end=None):
+        """一只股票在 [start, end] 内各字段的数组，是内存映射的切片，不复制"""
+        i, columns = self.index[symbol], self._columns(start, end)
+        return {col: values[i, columns] for col, values in self.arrays.items()}
+
+    def history(self, symbol, start=None, end=None):
+        """一只股票的日K线，列与 ak.stock_zh_a_hist 的同名列一致，停牌日不出现"""
+        columns = self._columns(start, end)
+        rows = self.rows(symbol, start, end)
+        valid = ~np.isnan(rows['收盘'])
+        df = pd.DataFrame({'日期': self.dates[columns][valid].date})
+        for col in ('开盘', '收盘', '最高', '最低', '成交量'):
+            df[col] = _restore(col, rows[col][valid])
+        return df
+
+    def panel(self, symbols, start=None, end=None):
+        """若干股票的 OHLCVPanel，与 OHLCVPanel.from_frames 的布局相同
+
+        每行的K线去掉停牌日后靠右对齐；不在面板中的股票为空行。
+        """
+        rows = np.array([self.index.get(s, -1) for s in symbols], dtype=np.int64)
+        columns = self._columns(start, end)
+        known = rows >= 0
+        take = np.where(known, rows, 0)
+        valid = ~np.isnan(self.arrays['收盘'][take, columns]) & known[:, None]
+        lengths = valid.sum(axis=1)
+        n_days = int(lengths.max(initial=0))
+        order = None
+        if not valid.all():
+            # 稳定排序把有效K线按原顺序移到每行右侧
+            order = np.argsort(valid, axis=1, kind='stable')
+            order = order[:, valid.shape[1] - n_days :]
+            valid = np.take_along_axis(valid, order, axis=1)
+
+        arrays = {}
+        for col, values in self.arrays.items():
+            values = values[take, columns]
+            if order is not None:
+                values = np.take_along_axis(values, order, axis=1)
+            arrays[col] = np.where(valid, _restore(col, values), np.nan)
+        return OHLCVPanel(
+            arrays['开盘'],
+            arrays['最高'],
+            arrays['最低'],
+            arrays['收盘'],
+            arrays['成交量'],
+            lengths=lengths,
+            symbols=list(symbols),
+        )
+
+    def matches(self, provider, probes=PROBE_SYMBOLS):
+        """抽查几只股票，最后一根K线的日期、收盘价和成交量是否与数据源相同"""
+        picks = np.unique(np.linspace(0, len(self.symbols) - 1, probes).astype(int))
+        for i in picks:
+            symbol = self.symbols[int(i)]
+            df = recent_history(provider, symbol, days=10)
+            stored = self.history(symbol, *_window(provider, 10))
+            if df.empty or stored.empty:
+                if df.empty != stored.empty:
+                    return False
+                continue
+            latest, last = df.iloc[-1], stored.iloc[-1]
+            if str(latest['日期'])[:10] != str(last['日期']):
+                return False
+            if not np.allclose(
+                [float(latest['收盘']), float(latest['成交量'])],
+                [last['收盘'], last['成交量']],
+                rtol=1e-6,
+            ):
+                return False
+        return True
+
+
+def _window(provider, days):
+    """与 recent_history 相同的日期区间，两端都按整天计算"""
+    now = provider.now().normalize()
+    return now - pd.Timedelta(days=days), now
+
+
+def _restore(col, values):
+    """读出为 float64，按原始精度取整"""
+    values = values.astype(float)
+    if col == '成交量':
+        return np.round(values)
+    return np.round(values, PRICE_DECIMALS)
+
+
+class PanelStore:
+    """DATA_DIR/panel/<复权方式> 下按版本保存的全市场面板"""
+
+    def __init__(self, root=None, adjust='qfq', keep=2):
+        self.root = Path(root or settings.DATA_DIR) / 'panel' / (adjust or 'none')
+        self.adjust = adjust
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._panel = None
+        self._stamp = None
+        self._checked = {}
+
+    def open(self):
+        """当前版本的面板，没有构建过时返回 None；有新版本时自动切换"""
+        pointer = self.root / 'current.json'
+        try:
+            stamp = pointer.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if self._panel is None or stamp != self._stamp:
+                meta = json.loads(pointer.read_text(encoding='utf-8'))
+                self._panel = MarketPanel(self.root / meta['version'], meta)
+                self._stamp = stamp
+            return self._panel
+
+    def fresh_panel(self, provider):
+        """与数据源当前数据一致的面板，没有或已过期时返回 None
+
+        盘中最后一根K线不断变化，抽查结果不一致，选股和股票详情照常从
+        数据源获取；收盘后构建的面板一直有效到下一根K线出现。抽查结果
+        按行情时刻的分钟缓存。
+        """
+        market = self.open()
+        if market is None or market.provider != type(provider).__name__:
+            return None
+        key = (market.version, id(provider), provider.now().floor('min'))
+        with self._lock:
+            fresh = self._checked.get(key)
+        if fresh is None:
+            fresh = market.matches(provider)
+            with self._lock:
+                self._checked = {key: fresh}
+        return market if fresh else None
+
+    def recent_history(self, provider, symbol, days=HISTORY_DAYS):
+        """与 providers.recent_history 相同的K线，面板过期或没有这只股票时返回 None"""
+        market = self.fresh_panel(provider)
+        if market is None or symbol not in market:
+            return None
+        start, end = _window(provider, days)
+        return market.history(symbol, start=start, end=end)
+
+    def recent_panel(self, provider, symbols, days=HISTORY_DAYS):
+        """这些股票最近 days 个自然日的 OHLCVPanel，面板过期时返回 None"""
+        market = self.fresh_panel(provider)
+        if market is None:
+            return None
+        start, end = _window(provider, days)
+        return market.panel(symbols, start=start, end=end)
+
+    def write(self, symbols, frames, provider, as_of):
+        """把与 symbols 一一对应的K线 DataFrame 写成一个新版本，返回 MarketPanel"""
+        symbols = list(symbols)
+        frame_dates = [
+            None
+            if df is None or df.empty
+            else pd.to_datetime(df['日期']).to_numpy(dtype='datetime64[D]')
+            for df in frames
+        ]
+        dates = np.unique(
+            np.concatenate(
+                [d for d in frame_dates if d is not None]
+                or [np.array([], dtype='datetime64[D]')]
+            )
+        )
+
+        version = f'{pd.Timestamp.now():%Y%m%d-%H%M%S-%f}'
+        directory = self.root / version
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / 'dates.npy', dates)
+        shape = (len(symbols), len(dates))
+        for col, name in STORE_FIELDS.items():
+            dtype = STORE_DTYPES.get(col, np.float32)
+            values = np.lib.format.open_memmap(
+                directory / f'{name}.npy', mode='w+', dtype=dtype, shape=shape
+            )
+            values[:] = np.nan
+            for i, (df, row_dates) in enumerate(zip(frames, frame_dates)):
+                if row_dates is not None:
+                    values[i, np.searchsorted(dates, row_dates)] = pd.to_numeric(
+                        df[col], errors='coerce'
+                    ).to_numpy(dtype=dtype)
+            values.flush()
+            del values
+
+        meta = {
+            'version': version,
+            'provider': provider,
+            'adjust': self.adjust,
+            'as_of': pd.Timestamp(as_of).isoformat(),
+            'symbols': symbols,
+        }
+        pointer = self.root / 'current.json'
+        tmp_path = pointer.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, pointer)
+
+        # 只保留最近的若干个版本；已映射旧版本的进程在 Linux 上仍可继续读取
+        versions = sorted(p.name for p in self.root.iterdir() if p.is_dir())
+        for old in versions[: -self.keep]:
+            shutil.rmtree(self.root / old, ignore_errors=True)
+        return self.open()
+
+    def build(self, provider, fetcher=None, symbols=None, days=None):
+        """从数据源获取全部股票最近 days 个自然日的K线，写成一个新版本"""
+        from astock_assistant.fetcher import AsyncFetcher
+        from astock_assistant.spot import normalize_spot
+
+        started = time.perf_counter()
+        fetcher = fetcher or AsyncFetcher()
+        days = settings.PANEL_STORE_DAYS if days is None else days
+        as_of = provider.now()
+        if symbols is None:
+            symbols = normalize_spot(provider.get_spot())['代码'].tolist()
+
+        def fetch(symbol):
+            return recent_history(provider, symbol, days=days, adjust=self.adjust)
+
+        frames = asyncio.run(fetcher.gather(fetch, symbols))
+        market = self.write(symbols, frames, type(provider).__name__, as_of)
+        log_event(
+            'panel_store_build',
+            version=market.version,
+            symbols=len(market),
+            dates=len(market.dates),
+            seconds=round(time.perf_counter() - started, 3),
+        )
+        return market
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def shared_store():
+    """PANEL_STORE 开启时返回进程内唯一的 PanelStore，否则返回 None"""
+    global _shared_store
+    if not settings.PANEL_STORE:
+        return None
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = PanelStore()
+        return _shared_store
+
+
+def main(argv=None):
+    from astock_assistant.config.logging_config import setup_logging
+    from astock_assistant.fetcher import AsyncFetcher
+    from astock_assistant.providers import create_provider
+
+    parser = argparse.ArgumentParser(description='构建全市场日K线面板')
+    parser.add_argument(
+        '--days', type=int, default=None, help='保存最近多少个自然日，默认按配置'
+    )
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    # 全市场K线请求经过同一个请求层限流、超时和重试
+    fetcher = AsyncFetcher()
+    market = PanelStore().build(
+        create_provider(fetcher=fetcher), fetcher=fetcher, days=args.days
+    )
+    print(
+        f'面板版本 {market.version}: {len(market)} 支股票，'
+        f'{len(market.dates)} 个交易日'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""由日K线在本地重采样得到周线和月线
+
+周线按自然周（周一到周日）、月线按自然月汇总日K线：开盘取第一天，收盘
+取最后一天，最高、最低取极值，成交量、成交额和换手率求和，日期为周期内
+最后一个交易日，涨跌幅、涨跌额和振幅按上一周期的收盘价重新计算，列与
+ak.stock_zh_a_hist(period='weekly'/'monthly') 一致。
+
+重采样结果按股票缓存。日K线只是在末尾追加或更新了最后几根时（盘中或
+新交易日），只重算最后一个周期和之后新增的周期；前复权价格整体变化时
+重新计算全部周期。
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+PERIODS = ('daily', 'weekly', 'monthly')
+# 图表标题和界面中的周期名称
+PERIOD_TITLES = {'daily': '日', 'weekly': '周', 'monthly': '月'}
+PRICE_COLUMNS = ('开盘', '收盘', '最高', '最低')
+# 周期内求和的列
+SUM_COLUMNS = ('成交量', '成交额', '换手率')
+
+
+def check_period(period):
+    if period not in PERIODS:
+        raise ValueError(f'不支持的K线周期: {period}')
+
+
+def period_start(date, period):
+    """date 所在周期的第一天：周线为周一，月线为当月 1 日"""
+    date = pd.Timestamp(date).normalize()
+    if period == 'weekly':
+        return date - pd.Timedelta(days=date.weekday())
+    if period == 'monthly':
+        return date.replace(day=1)
+    return date
+
+
+def _period_ids(dates, period):
+    if period == 'weekly':
+        # 1970-01-01 是周四，加 3 天后整除 7 即按周一开始分周
+        return (dates.astype('datetime64[D]').astype(np.int64) + 3) // 7
+    return dates.astype('datetime64[M]').astype(np.int64)
+
+
+def _aggregate(daily, period):
+    """按周期汇总日K线的原始列，返回 (各列数组, 每个周期第一根日K线的位置)"""
+    dates = pd.to_datetime(daily['日期']).to_numpy(dtype='datetime64[D]')
+    ids = _period_ids(dates, period)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    ends = np.r_[starts[1:], len(ids)] - 1
+    values = {
+        col: pd.to_numeric(daily[col], errors='coerce').to_numpy(dtype=float)
+        for col in (*PRICE_COLUMNS, *SUM_COLUMNS)
+        if col in daily.columns
+    }
+    bars = {
+        '日期': dates[ends],
+        '开盘': values['开盘'][starts],
+        '收盘': values['收盘'][ends],
+        '最高': np.maximum.reduceat(values['最高'], starts),
+        '最低': np.minimum.reduceat(values['最低'], starts),
+    }
+    for col in SUM_COLUMNS:
+        if col in values:
+            bars[col] = np.add.reduceat(values[col], starts)
+    return bars, starts
+
+
+def _first_prev_close(daily):
+    """第一根日K线的前收盘价，即第一个周期的前收盘价"""
+    if '涨跌额' not in daily.columns:
+        return np.nan
+    first = daily.iloc[0]
+    return float(first['收盘']) - float(first['涨跌额'])
+
+
+def _to_frame(bars, prev_close, columns, symbol):
+    close = bars['收盘']
+    prev = np.r_[prev_close, close[:-1]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        derived = {
+            '振幅': np.round((bars['最高'] - bars['最低']) / prev * 100, 2),
+            '涨跌幅': np.round((close / prev - 1) * 100, 2),
+            '涨跌额': np.round(close - prev, 2),
+        }
+    data = {'日期': pd.DatetimeIndex(bars['日期']).date}
+    for col in columns:
+        if col == '股票代码':
+            data[col] = symbol
+        elif col in derived:
+            data[col] = derived[col]
+        elif col == '换手率':
+            data[col] = np.round(bars[col], 2)
+        elif col != '日期':
+            data[col] = bars[col]
+    return pd.DataFrame(data, columns=columns)
+
+
+def resample_bars(daily, period):
+    """把日K线汇总为周线或月线，period 为 'daily' 时原样返回"""
+    check_period(period)
+    if period == 'daily' or daily is None or daily.empty:
+        return daily
+    bars, _ = _aggregate(daily, period)
+    symbol = daily['股票代码'].iloc[0] if '股票代码' in daily.columns else None
+    return _to_frame(bars, _first_prev_close(daily), list(daily.columns), symbol)
+
+
+class PeriodBars:
+    """按股票缓存的重采样结果，日K线追加时只重算最后一个周期"""
+
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resample(self, key, daily, period):
+        """key 标识同一只股票、同一复权方式和同一起始日期的日K线"""
+        check_period(period)
+        if period == 'daily' or daily is None or daily.empty:
+            return daily
+        key = (*key, period)
+        with self._lock:
+            entry = self._entries.get(key)
+        closes = pd.to_numeric(daily['收盘'], errors='coerce').to_numpy(dtype=float)
+
+        if entry is not None and self._extends(entry, daily, closes):
+            # 只汇总最后一个周期开始以后的日K线，接在之前的周期后面
+            tail, starts = _aggregate(daily.iloc[entry['tail_start'] :], period)
+            bars = {
+                col: np.concatenate([values[:-1], tail[col]])
+                for col, values in entry['bars'].items()
+            }
+            starts = starts + entry['tail_start']
+        else:
+            bars, starts = _aggregate(daily, period)
+            entry = {'prev_close': _first_prev_close(daily)}
+
+        tail_start = int(starts[-1])
+        entry = {
+            'prev_close': entry['prev_close'],
+            'bars': bars,
+            'tail_start': tail_start,
+            # 之前各周期最后一根日K线已经定型，用它核对前复权价格是否变化
+            'check': (
+                (str(daily['日期'].iloc[tail_start - 1]), closes[tail_start - 1])
+                if tail_start
+                else None
+            ),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        symbol = daily['股票代码'].iloc[0] if '股票代码' in daily.columns else None
+        return _to_frame(bars, entry['prev_close'], list(daily.columns), symbol)
+
+    @staticmethod
+    def _extends(entry, daily, closes):
+        """新的日K线是否只在缓存时的最后一个周期及之后有变化"""
+        tail_start, check = entry['tail_start'], entry['check']
+        if check is None or len(daily) <= tail_start:
+            return False
+        date, close = check
+        return str(daily['日期'].iloc[tail_start - 1]) == date and (
+            closes[tail_start - 1] == close
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# 进程内共享，选股和股票详情共用
+period_bars = PeriodBars()
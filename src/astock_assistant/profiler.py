@@ -0,0 +1,214 @@
+"""按需开启的采样分析器
+
+后台线程每隔 interval 秒用 sys._current_frames() 采集一次各线程的调用栈，
+不需要安装或挂载外部工具，开销主要取决于采样间隔。结束后在 LOG_DIR 下
+写两个文件：
+
+    profile-<名称>-<时间>.speedscope.json  用 https://www.speedscope.app 打开的火焰图
+    profile-<名称>-<时间>.txt              按自身耗时和累计耗时排序的热点函数
+
+选股时K线在线程池里获取，所以默认采集除分析器本身以外的全部线程，
+每个线程的名称作为调用栈的根；阻塞在等待队列、锁或 select 上的空闲线程
+不计入。设置 PROFILE=true 或在应用侧边栏打开“性能分析”后启用。
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from astock_assistant.config.settings import settings
+from astock_assistant.metrics import log_event
+
+# 栈顶是这些函数的线程处于空闲等待，不计入采样：(函数名, 文件名)
+IDLE_FRAMES = {
+    ('wait', 'threading.py'),
+    ('_wait_for_tstate_lock', 'threading.py'),
+    ('_worker', 'thread.py'),
+    ('get', 'queue.py'),
+    ('select', 'selectors.py'),
+    ('accept', 'socket.py'),
+}
+
+
+class SamplingProfiler:
+    """采样分析器，可以用作上下文管理器"""
+
+    def __init__(self, interval=None, include_idle=False):
+        self.interval = settings.PROFILE_INTERVAL if interval is None else interval
+        self.include_idle = include_idle
+        # (线程名, (函数名, 文件, 起始行), ...) -> 累计秒数
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = self.elapsed = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='sampling-profiler', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = _stack(frame)
+                leaf = stack[-1]
+                if not self.include_idle and (
+                    (leaf[0], os.path.basename(leaf[1])) in IDLE_FRAMES
+                ):
+                    continue
+                self.stacks[(names.get(ident, str(ident)), *stack)] += weight
+            self.samples += 1
+
+    def hot_spots(self, limit=20):
+        """返回 (按自身耗时排序, 按累计耗时排序) 的 [(函数, 秒数)]"""
+        own, total = Counter(), Counter()
+        for stack, seconds in self.stacks.items():
+            frames = stack[1:]
+            own[frames[-1]] += seconds
+            # 递归调用的函数在一条栈里只计一次
+            for frame in set(frames):
+                total[frame] += seconds
+        return own.most_common(limit), total.most_common(limit)
+
+    def speedscope(self, name):
+        """speedscope 文件格式的 sampled 类型分析结果"""
+        frames, index = [], {}
+
+        def frame_id(frame):
+            if frame not in index:
+                index[frame] = len(frames)
+                if isinstance(frame, str):
+                    frames.append({'name': f'[{frame}]'})
+                else:
+                    func, file, line = frame
+                    frames.append({'name': func, 'file': file, 'line': line})
+            return index[frame]
+
+        samples, weights = [], []
+        for stack, seconds in self.stacks.items():
+            samples.append([frame_id(frame) for frame in stack])
+            weights.append(seconds)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'astock_assistant.profiler',
+            'shared': {'frames': frames},
+            'profiles': [
+                {
+                    'type': 'sampled',
+                    'name': name,
+                    'unit': 'seconds',
+                    'startValue': 0,
+                    'endValue': sum(weights),
+                    'samples': samples,
+                    'weights': weights,
+                }
+            ],
+        }
+
+    def summary(self, name, limit=20):
+        own, total = self.hot_spots(limit)
+        sampled = sum(self.stacks.values()) or 1.0
+        lines = [
+            f'采样分析: {name}',
+            f'时长 {self.elapsed:.3f}s，采样 {self.samples} 次，'
+            f'间隔 {self.interval * 1000:.1f}ms，'
+            f'各线程合计 {sum(self.stacks.values()):.3f}s',
+        ]
+        for title, rows in (('按自身耗时', own), ('按累计耗时', total)):
+            lines.append(f'\n{title}:')
+            for frame, seconds in rows:
+                lines.append(
+                    f'  {seconds / sampled:>6.1%} {seconds:>8.3f}s  '
+                    f'{_describe(frame)}'
+                )
+        return '\n'.join(lines) + '\n'
+
+    def save(self, name, directory=None):
+        """写出 speedscope 文件和热点摘要，返回两个文件的路径"""
+        directory = Path(directory or settings.LOG_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+        stem = f'profile-{name}-{stamp}-{int(now * 1000) % 1000:03d}'
+        flame_path = directory / f'{stem}.speedscope.json'
+        summary_path = directory / f'{stem}.txt'
+        flame_path.write_text(json.dumps(self.speedscope(name)), encoding='utf-8')
+        summary_path.write_text(self.summary(name), encoding='utf-8')
+
+        own, _ = self.hot_spots(5)
+        log_event(
+            'profile',
+            name=name,
+            seconds=round(self.elapsed, 3),
+            samples=self.samples,
+            speedscope=str(flame_path),
+            summary=str(summary_path),
+            top=[[_describe(frame), round(seconds, 4)] for frame, seconds in own],
+        )
+        return flame_path, summary_path
+
+
+def _stack(frame):
+    """从栈底到栈顶的 (函数名, 文件, 起始行)"""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _describe(frame):
+    func, file, line = frame
+    return f'{func} ({os.path.basename(file)}:{line})'
+
+
+@contextmanager
+def profile(name, enabled=None, directory=None):
+    """对 with 块采样并保存结果，enabled 默认按 PROFILE 配置，未启用时不做任何事
+
+    产出 SamplingProfiler，未启用时为 None。
+    """
+    enabled = settings.PROFILE if enabled is None else enabled
+    if not enabled:
+        yield None
+        return
+    profiler = SamplingProfiler()
+    try:
+        with profiler:
+            yield profiler
+    finally:
+        try:
+            profiler.save(name, directory)
+        except Exception as e:
+            print(f'保存采样分析结果时出错: {str(e)}')
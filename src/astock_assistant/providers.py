@@ -0,0 +1,672 @@
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from astock_assistant.config.settings import settings
+from astock_assistant.history_cache import (
+    HistoryCache,
+    TradeCalendar,
+    load_akshare,
+    market_now,
+)
+from astock_assistant.metrics import metrics
+from astock_assistant.periods import check_period, period_bars, period_start
+from astock_assistant.shared_cache import SingleFlight
+
+# 选股和股票详情使用的各周期K线窗口（自然日），周线和月线需要更长的窗口
+# 才有足够的K线计算 MACD 和 KDJ
+PERIOD_DAYS = {'daily': 120, 'weekly': 730, 'monthly': 1825}
+HISTORY_DAYS = PERIOD_DAYS['daily']
+
+SPOT_COLUMNS = [
+    '序号',
+    '代码',
+    '名称',
+    '最新价',
+    '涨跌幅',
+    '涨跌额',
+    '成交量',
+    '成交额',
+    '振幅',
+    '最高',
+    '最低',
+    '今开',
+    '昨收',
+    '量比',
+    '换手率',
+    '市盈率-动态',
+    '市净率',
+    '总市值',
+    '流通市值',
+    '涨速',
+    '5分钟涨跌',
+    '60日涨跌幅',
+    '年初至今涨跌幅',
+]
+
+HISTORY_COLUMNS = [
+    '日期',
+    '股票代码',
+    '开盘',
+    '收盘',
+    '最高',
+    '最低',
+    '成交量',
+    '成交额',
+    '振幅',
+    '涨跌幅',
+    '涨跌额',
+    '换手率',
+]
+
+MINUTE_COLUMNS = ['时间', '开盘', '收盘', '最高', '最低', '成交量', '成交额']
+
+
+def minute_times(day):
+    """一个交易日的 240 根1分钟K线时刻：09:31-11:30、13:01-15:00"""
+    day = pd.Timestamp(day).normalize()
+    morning = pd.date_range(day + pd.Timedelta('9h31min'), periods=120, freq='min')
+    afternoon = pd.date_range(day + pd.Timedelta('13h01min'), periods=120, freq='min')
+    return morning.append(afternoon)
+
+
+class MarketDataProvider:
+    """行情数据源接口，返回的数据格式与 akshare 对应接口一致"""
+
+    def now(self):
+        """数据源对应的行情时刻，选股的历史窗口以此为终点"""
+        raise NotImplementedError
+
+    def get_spot(self):
+        """全市场实时行情快照，对应 ak.stock_zh_a_spot_em"""
+        raise NotImplementedError
+
+    def get_history(
+        self,
+        symbol,
+        period='daily',
+        start_date='19700101',
+        end_date='20500101',
+        adjust='',
+    ):
+        """单只股票的历史K线，对应 ak.stock_zh_a_hist"""
+        raise NotImplementedError
+
+    def get_trade_dates(self):
+        """交易日列表，对应 ak.tool_trade_date_hist_sina 的 trade_date 列"""
+        raise NotImplementedError
+
+    def get_minute_bars(self, symbol, start=None, end=None):
+        """当日1分钟K线，对应 ak.stock_zh_a_hist_min_em(period='1')
+
+        只返回时刻在 [start, end] 内的K线，列为 MINUTE_COLUMNS；start 默认为
+        当日开盘，end 默认为数据源当前时刻。
+        """
+        raise NotImplementedError
+
+
+class AkshareProvider(MarketDataProvider):
+    """通过 akshare 获取实时行情，请求经过 AsyncFetcher 限流和重试"""
+
+    def __init__(self, fetcher=None):
+        self.fetcher = fetcher
+
+    def _call(self, func, *args, **kwargs):
+        if self.fetcher is None:
+            return func(*args, **kwargs)
+        return self.fetcher.call(func, *args, **kwargs)
+
+    def now(self):
+        return market_now()
+
+    def get_spot(self):
+        return self._call(load_akshare().stock_zh_a_spot_em)
+
+    def get_history(
+        self,
+        symbol,
+        period='daily',
+        start_date='19700101',
+        end_date='20500101',
+        adjust='',
+    ):
+        return self._call(
+            load_akshare().stock_zh_a_hist,
+            symbol=symbol,
+            period=period,
+            start_date=start_date,
+            end_date=end_date,
+            adjust=adjust,
+        )
+
+    def get_trade_dates(self):
+        return self._call(load_akshare().tool_trade_date_hist_sina)['trade_date']
+
+    def get_minute_bars(self, symbol, start=None, end=None):
+        now = self.now()
+        start = pd.Timestamp(start) if start is not None else now.normalize()
+        end = pd.Timestamp(end) if end is not None else now
+        df = self._call(
+            load_akshare().stock_zh_a_hist_min_em,
+            symbol=symbol,
+            start_date=start.strftime('%Y-%m-%d %H:%M:%S'),
+            end_date=end.strftime('%Y-%m-%d %H:%M:%S'),
+            period='1',
+            adjust='',
+        )
+        if df is None or df.empty:
+            return pd.DataFrame(columns=MINUTE_COLUMNS)
+        return df[MINUTE_COLUMNS]
+
+
+class CachedProvider(MarketDataProvider):
+    """为日K线加上本地增量缓存的数据源包装
+
+    同时进行的相同K线请求（代码、周期、日期区间和复权方式都相同）合并为
+    一次，例如多个会话同时查看同一只股票，或选股和股票详情同时请求同一
+    只股票时，只有一个请求访问缓存和上游，其余等待并共用它的结果。
+    """
+
+    def __init__(self, provider, cache_dir=None):
+        self.provider = provider
+        self.history_cache = HistoryCache(
+            cache_dir=cache_dir,
+            calendar=TradeCalendar(cache_dir, fetch_func=provider.get_trade_dates),
+            fetch_func=provider.get_history,
+        )
+        self._flight = SingleFlight()
+
+    def now(self):
+        return self.provider.now()
+
+    def get_spot(self):
+        return self.provider.get_spot()
+
+    def get_history(
+        self,
+        symbol,
+        period='daily',
+        start_date='19700101',
+        end_date='20500101',
+        adjust='',
+    ):
+        fetched = []
+
+        def fetch():
+            fetched.append(True)
+            return self._get_history(symbol, period, start_date, end_date, adjust)
+
+        df = self._flight.do((symbol, period, start_date, end_date, adjust), fetch)
+        if not fetched:
+            metrics.inc('astock_history_coalesced_total')
+        return df
+
+    def _get_history(self, symbol, period, start_date, end_date, adjust):
+        if period != 'daily':
+            return local_period_history(
+                self, symbol, period, start_date, end_date, adjust
+            )
+        return self.history_cache.get_history(
+            symbol, start_date=start_date, end_date=end_date, adjust=adjust
+        )
+
+    def get_trade_dates(self):
+        return pd.Series(self.history_cache.calendar.trade_dates().date)
+
+    def get_minute_bars(self, symbol, start=None, end=None):
+        # 分钟K线由 intraday 模块的环形缓冲区保存，这里不再缓存
+        return self.provider.get_minute_bars(symbol, start, end)
+
+
+def _slice_dates(df, start_date, end_date):
+    if df.empty:
+        return df
+    dates = pd.to_datetime(df['日期'])
+    mask = (dates >= pd.Timestamp(start_date)) & (dates <= pd.Timestamp(end_date))
+    return df[mask].reset_index(drop=True)
+
+
+def local_period_history(provider, symbol, period, start_date, end_date, adjust):
+    """由数据源的日K线在本地汇总出周线或月线，不请求对应周期的接口
+
+    日K线从 start_date 所在周期的第一天开始获取，第一个周期也是完整的；
+    只返回最后一个交易日不早于 start_date 的周期。
+    """
+    start = period_start(start_date, period)
+    daily = provider.get_history(
+        symbol,
+        period='daily',
+        start_date=start.strftime('%Y%m%d'),
+        end_date=end_date,
+        adjust=adjust,
+    )
+    if daily is None or daily.empty:
+        return daily
+    bars = period_bars.resample(
+        (id(provider), symbol, adjust, start), daily, period
+    )
+    return _slice_dates(bars, start_date, end_date)
+
+
+class ReplayProvider(MarketDataProvider):
+    """回放本地录制的行情数据，不访问网络
+
+    目录结构：
+        spot/<YYYYmmdd-HHMMSS>.parquet   实时行情快照，文件名即行情时刻
+        history/<adjust>/<symbol>.parquet 日K线
+        minute/<YYYYmmdd>/<symbol>.parquet 当日1分钟K线（可选）
+        trade_calendar.parquet           交易日历（可选）
+    """
+
+    def __init__(self, root=None, snapshot=None):
+        self.root = Path(root or settings.REPLAY_DIR)
+        snapshots = self.snapshots()
+        if not snapshots:
+            raise FileNotFoundError(f'{self.root / "spot"} 下没有录制的行情快照')
+        self.snapshot = snapshot or snapshots[-1]
+        self._histories = {}
+        self._minutes = {}
+        self._lock = threading.Lock()
+
+    def snapshots(self):
+        return sorted(p.stem for p in (self.root / 'spot').glob('*.parquet'))
+
+    def now(self):
+        return pd.Timestamp(pd.to_datetime(self.snapshot, format='%Y%m%d-%H%M%S'))
+
+    def get_spot(self):
+        return pd.read_parquet(self.root / 'spot' / f'{self.snapshot}.parquet')
+
+    def _history(self, symbol, adjust):
+        key = (symbol, adjust or 'none')
+        with self._lock:
+            if key not in self._histories:
+                path = self.root / 'history' / key[1] / f'{symbol}.parquet'
+                self._histories[key] = (
+                    pd.read_parquet(path) if path.exists() else pd.DataFrame()
+                )
+            return self._histories[key]
+
+    def get_history(
+        self,
+        symbol,
+        period='daily',
+        start_date='19700101',
+        end_date='20500101',
+        adjust='',
+    ):
+        if period != 'daily':
+            return local_period_history(
+                self, symbol, period, start_date, end_date, adjust
+            )
+        end_date = min(pd.Timestamp(end_date), self.now().normalize())
+        return _slice_dates(self._history(symbol, adjust), start_date, end_date)
+
+    def _minute_frame(self, symbol):
+        day = self.now().strftime('%Y%m%d')
+        with self._lock:
+            if symbol not in self._minutes:
+                path = self.root / 'minute' / day / f'{symbol}.parquet'
+                self._minutes[symbol] = (
+                    pd.read_parquet(path)
+                    if path.exists()
+                    else pd.DataFrame(columns=MINUTE_COLUMNS)
+                )
+            return self._minutes[symbol]
+
+    def get_minute_bars(self, symbol, start=None, end=None):
+        df = self._minute_frame(symbol)
+        if df.empty:
+            return df
+        now = self.now()
+        end = min(pd.Timestamp(end), now) if end is not None else now
+        times = pd.to_datetime(df['时间'])
+        mask = times <= end
+        if start is not None:
+            mask &= times >= pd.Timestamp(start)
+        return df[mask].reset_index(drop=True)
+
+    def get_trade_dates(self):
+        path = self.root / 'trade_calendar.parquet'
+        if path.exists():
+            return pd.read_parquet(path)['trade_date']
+        dates = set()
+        for file in (self.root / 'history').glob('*/*.parquet'):
+            df = pd.read_parquet(file, columns=['日期'])
+            dates.update(pd.to_datetime(df['日期']))
+        return pd.Series(sorted(dates)).dt.date
+
+
+class RecordingProvider(MarketDataProvider):
+    """把经过的行情数据录制到本地目录，供 ReplayProvider 回放"""
+
+    def __init__(self, provider, root=None):
+        self.provider = provider
+        self.root = Path(root or settings.REPLAY_DIR)
+        self._lock = threading.Lock()
+
+    def _write(self, df, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(path, index=False)
+
+    def now(self):
+        return self.provider.now()
+
+    def get_spot(self):
+        df = self.provider.get_spot()
+        name = self.provider.now().strftime('%Y%m%d-%H%M%S')
+        self._write(df, self.root / 'spot' / f'{name}.parquet')
+        return df
+
+    def get_history(
+        self,
+        symbol,
+        period='daily',
+        start_date='19700101',
+        end_date='20500101',
+        adjust='',
+    ):
+        # 周线和月线由日K线汇总，录制的日K线回放时同样可以汇总出周线和月线
+        if period != 'daily':
+            return local_period_history(
+                self, symbol, period, start_date, end_date, adjust
+            )
+        df = self.provider.get_history(symbol, period, start_date, end_date, adjust)
+        if not df.empty:
+            path = self.root / 'history' / (adjust or 'none') / f'{symbol}.parquet'
+            with self._lock:
+                if path.exists():
+                    merged = pd.concat([pd.read_parquet(path), df], ignore_index=True)
+                    merged['日期'] = pd.to_datetime(merged['日期']).dt.date
+                    df_to_write = merged.drop_duplicates('日期', keep='last')
+                    df_to_write = df_to_write.sort_values('日期')
+                else:
+                    df_to_write = df
+                self._write(df_to_write, path)
+        return df
+
+    def get_trade_dates(self):
+        dates = self.provider.get_trade_dates()
+        self._write(
+            pd.DataFrame({'trade_date': dates}),
+            self.root / 'trade_calendar.parquet',
+        )
+        return dates
+
+    def get_minute_bars(self, symbol, start=None, end=None):
+        df = self.provider.get_minute_bars(symbol, start, end)
+        if not df.empty:
+            day = self.provider.now().strftime('%Y%m%d')
+            path = self.root / 'minute' / day / f'{symbol}.parquet'
+            with self._lock:
+                if path.exists():
+                    merged = pd.concat([pd.read_parquet(path), df], ignore_index=True)
+                    merged['时间'] = pd.to_datetime(merged['时间'])
+                    df_to_write = merged.drop_duplicates('时间', keep='last')
+                    df_to_write = df_to_write.sort_values('时间')
+                else:
+                    df_to_write = df
+                self._write(df_to_write, path)
+        return df
+
+
+class SyntheticProvider(MarketDataProvider):
+    """按随机种子生成的合成行情，同样的参数总是得到同样的数据
+
+    行情数值只由种子和股票序号决定，日期默认以今天为最后一个交易日，
+    方便在没有网络的机器上稳定地测量和调优选股流程。
+    """
+
+    def __init__(self, n_symbols=5000, n_days=250, seed=0, end_date=None):
+        self.n_symbols = n_symbols
+        self.n_days = n_days
+        self.seed = seed
+        end = pd.Timestamp(end_date) if end_date else market_now()
+        self.dates = pd.bdate_range(end=end.normalize(), periods=n_days)
+        self._now = self.dates[-1] + pd.Timedelta(hours=15)
+        self.symbols = self._make_symbols()
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._panel = None
+        self._minutes = {}
+        self._lock = threading.Lock()
+
+    def _make_symbols(self):
+        prefixes = ['600', '000', '601', '002', '300', '688', '603', '001']
+        return [
+            f'{prefixes[i % len(prefixes)]}{i // len(prefixes):03d}'
+            for i in range(self.n_symbols)
+        ]
+
+    def _generate(self):
+        rng = np.random.default_rng(self.seed)
+        shape = (self.n_symbols, self.n_days)
+
+        base = rng.uniform(3, 120, self.n_symbols)[:, None]
+        drift = rng.normal(0.0005, 0.001, self.n_symbols)[:, None]
+        returns = rng.normal(0, 0.025, shape) + drift
+        close = np.round(base * np.exp(np.cumsum(returns, axis=1)), 2)
+        prev_close = np.concatenate([close[:, :1], close[:, :-1]], axis=1)
+        open_price = np.round(prev_close * (1 + rng.normal(0, 0.01, shape)), 2)
+        high = np.round(
+            np.maximum(open_price, close) * (1 + rng.exponential(0.01, shape)), 2
+        )
+        low = np.round(
+            np.minimum(open_price, close) * (1 - rng.exponential(0.01, shape)), 2
+        )
+        base_volume = rng.uniform(2e4, 5e5, self.n_symbols)[:, None]
+        volume = np.round(base_volume * rng.lognormal(0, 0.4, shape))
+        shares = rng.uniform(1e8, 5e9, self.n_symbols)
+
+        # 部分股票上市时间较短，左侧没有数据
+        listed = np.where(
+            rng.random(self.n_symbols) < 0.05,
+            rng.integers(5, self.n_days, self.n_symbols),
+            self.n_days,
+        )
+        return {
+            'open': open_price,
+            'high': high,
+            'low': low,
+            'close': close,
+            'volume': volume,
+            'prev_close': prev_close,
+            'shares': shares,
+            'listed': listed,
+        }
+
+    def _data(self):
+        with self._lock:
+            if self._panel is None:
+                self._panel = self._generate()
+            return self._panel
+
+    def now(self):
+        return self._now
+
+    def set_now(self, now):
+        """调整行情时刻，用于模拟盘中不同时刻的分钟K线"""
+        self._now = pd.Timestamp(now)
+
+    def get_spot(self):
+        data = self._data()
+        rng = np.random.default_rng([self.seed, 1])
+        n = self.n_symbols
+        close = data['close'][:, -1]
+        prev_close = data['prev_close'][:, -1]
+        volume = data['volume'][:, -1]
+        shares = data['shares']
+        avg_volume = data['volume'][:, -6:-1].mean(axis=1)
+        year_start = int(
+            np.searchsorted(self.dates, self.dates[-1].replace(month=1, day=1))
+        )
+        day_60 = max(0, self.n_days - 61)
+        names = [
+            f'{"ST" if flag else ""}合成{i:04d}'
+            for i, flag in enumerate(rng.random(n) < 0.04)
+        ]
+
+        df = pd.DataFrame(
+            {
+                '序号': np.arange(1, n + 1),
+                '代码': self.symbols,
+                '名称': names,
+                '最新价': close,
+                '涨跌幅': np.round((close / prev_close - 1) * 100, 2),
+                '涨跌额': np.round(close - prev_close, 2),
+                '成交量': volume,
+                '成交额': np.round(volume * 100 * close, 2),
+                '振幅': np.round(
+                    (data['high'][:, -1] - data['low'][:, -1]) / prev_close * 100, 2
+                ),
+                '最高': data['high'][:, -1],
+                '最低': data['low'][:, -1],
+                '今开': data['open'][:, -1],
+                '昨收': prev_close,
+                '量比': np.round(volume / avg_volume, 2),
+                '换手率': np.round(volume * 100 / shares * 100, 2),
+                '市盈率-动态': np.round(rng.uniform(-50, 200, n), 2),
+                '市净率': np.round(rng.uniform(0.5, 10, n), 2),
+                '总市值': np.round(close * shares * 1.2),
+                '流通市值': np.round(close * shares),
+                '涨速': np.round(rng.normal(0, 0.5, n), 2),
+                '5分钟涨跌': np.round(rng.normal(0, 0.8, n), 2),
+                '60日涨跌幅': np.round(
+                    (close / data['close'][:, day_60] - 1) * 100, 2
+                ),
+                '年初至今涨跌幅': np.round(
+                    (close / data['close'][:, year_start] - 1) * 100, 2
+                ),
+            }
+        )
+        return df[SPOT_COLUMNS]
+
+    def get_history(
+        self,
+        symbol,
+        period='daily',
+        start_date='19700101',
+        end_date='20500101',
+        adjust='',
+    ):
+        if period != 'daily':
+            return local_period_history(
+                self, symbol, period, start_date, end_date, adjust
+            )
+        if symbol not in self._index:
+            return pd.DataFrame()
+        data = self._data()
+        row = self._index[symbol]
+        first = self.n_days - data['listed'][row]
+        close = data['close'][row, first:]
+        prev_close = data['prev_close'][row, first:]
+        high = data['high'][row, first:]
+        low = data['low'][row, first:]
+        volume = data['volume'][row, first:]
+
+        df = pd.DataFrame(
+            {
+                '日期': self.dates[first:].date,
+                '股票代码': symbol,
+                '开盘': data['open'][row, first:],
+                '收盘': close,
+                '最高': high,
+                '最低': low,
+                '成交量': volume.astype(np.int64),
+                '成交额': np.round(volume * 100 * close, 2),
+                '振幅': np.round((high - low) / prev_close * 100, 2),
+                '涨跌幅': np.round((close / prev_close - 1) * 100, 2),
+                '涨跌额': np.round(close - prev_close, 2),
+                '换手率': np.round(volume * 100 / data['shares'][row] * 100, 2),
+            }
+        )
+        return _slice_dates(df[HISTORY_COLUMNS], start_date, end_date)
+
+    def get_trade_dates(self):
+        return pd.Series(self.dates.date)
+
+    def _minute_frame(self, row):
+        """最后一个交易日的 240 根分钟K线，从当日开盘价走到收盘价"""
+        with self._lock:
+            if row in self._minutes:
+                return self._minutes[row]
+        data = self._data()
+        rng = np.random.default_rng([self.seed, 2, row])
+        times = minute_times(self.dates[-1])
+        n = len(times)
+        day_open, day_close = data['open'][row, -1], data['close'][row, -1]
+
+        # 布朗桥：随机游走两端固定在开盘价和收盘价
+        walk = np.cumsum(rng.normal(0, 0.002, n))
+        position = np.arange(1, n + 1) / n
+        log_price = (
+            np.log(day_open)
+            + position * np.log(day_close / day_open)
+            + walk
+            - position * walk[-1]
+        )
+        close = np.round(np.exp(log_price), 2)
+        open_price = np.concatenate([[day_open], close[:-1]])
+        high = np.round(
+            np.maximum(open_price, close) * (1 + rng.exponential(0.0008, n)), 2
+        )
+        low = np.round(
+            np.minimum(open_price, close) * (1 - rng.exponential(0.0008, n)), 2
+        )
+        volume = np.round(data['volume'][row, -1] * rng.dirichlet(np.ones(n)))
+
+        df = pd.DataFrame(
+            {
+                '时间': times,
+                '开盘': open_price,
+                '收盘': close,
+                '最高': high,
+                '最低': low,
+                '成交量': volume,
+                '成交额': np.round(volume * 100 * close, 2),
+            }
+        )
+        with self._lock:
+            self._minutes[row] = df
+        return df
+
+    def get_minute_bars(self, symbol, start=None, end=None):
+        if symbol not in self._index:
+            return pd.DataFrame(columns=MINUTE_COLUMNS)
+        df = self._minute_frame(self._index[symbol])
+        end = min(pd.Timestamp(end), self._now) if end is not None else self._now
+        mask = df['时间'] <= end
+        if start is not None:
+            mask &= df['时间'] >= pd.Timestamp(start)
+        return df[mask].reset_index(drop=True)
+
+
+def recent_history(provider, symbol, days=None, period='daily', adjust='qfq'):
+    """获取截至数据源当前行情时刻、最近 days 个自然日的K线
+
+    days 默认按 PERIOD_DAYS 取对应周期的窗口。
+    """
+    check_period(period)
+    days = PERIOD_DAYS[period] if days is None else days
+    now = provider.now()
+    return provider.get_history(
+        symbol,
+        period=period,
+        start_date=(now - pd.Timedelta(days=days)).strftime('%Y%m%d'),
+        end_date=now.strftime('%Y%m%d'),
+        adjust=adjust,
+    )
+
+
+def create_provider(name=None, fetcher=None):
+    """按名称创建数据源：akshare（默认，带本地缓存）、replay、synthetic"""
+    name = name or settings.DATA_PROVIDER
+    if name == 'akshare':
+        return CachedProvider(AkshareProvider(fetcher))
+    if name == 'replay':
+        return ReplayProvider(settings.REPLAY_DIR)
+    if name == 'synthetic':
+        return SyntheticProvider(
+            n_symbols=settings.SYNTHETIC_SYMBOLS, seed=settings.SYNTHETIC_SEED
+        )
+    raise ValueError(f'未知的数据源: {name}')
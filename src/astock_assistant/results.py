@@ -0,0 +1,129 @@
+from functools import cached_property
+
+import pandas as pd
+from astock_assistant.export import results_digest
+
+# 选股结果各字段的显示名称，与 StockResult 的字段一一对应
+RESULT_TITLES = [
+    '股票代码',
+    '股票名称',
+    '推荐指数',
+    '当前价格',
+    '涨跌幅(%)',
+    '预测最高价',
+    '预测最低价',
+    '预测波动(%)',
+    '量比',
+    '今开',
+    '昨收',
+    '涨速',
+    '5分钟涨跌',
+    '60日涨跌幅',
+    '年初至今涨跌幅',
+    '换手率',
+    '总市值',
+    '流通市值',
+    '振幅',
+]
+
+
+class StockResult:
+    """一只推荐股票的选股结果
+
+    字段可以按属性名、显示名称（如 result['推荐指数']）或位置访问。
+    """
+
+    __slots__ = (
+        'code',
+        'name',
+        'score',
+        'price',
+        'change',
+        'pred_high',
+        'pred_low',
+        'pred_range',
+        'volume_ratio',
+        'open',
+        'prev_close',
+        'speed',
+        'change_5m',
+        'change_60d',
+        'change_ytd',
+        'turnover',
+        'total_mv',
+        'float_mv',
+        'amplitude',
+    )
+
+    def __init__(self, *values):
+        if len(values) != len(self.__slots__):
+            raise ValueError(
+                f'选股结果应有 {len(self.__slots__)} 个字段，实际为 {len(values)} 个'
+            )
+        for field, value in zip(self.__slots__, values):
+            setattr(self, field, value)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, _TITLE_FIELDS[key])
+        return getattr(self, self.__slots__[key])
+
+    def __iter__(self):
+        return (getattr(self, field) for field in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, StockResult):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f'StockResult({self.code!r}, {self.name!r}, score={self.score})'
+
+    def as_list(self):
+        return list(self)
+
+
+_TITLE_FIELDS = dict(zip(RESULT_TITLES, StockResult.__slots__))
+
+
+class ScreenResults:
+    """一次选股的全部结果，按股票代码建立索引
+
+    建立后只读，可以放进共享缓存在多个会话之间共用；显示用的 DataFrame
+    和导出文件的版本号只在第一次使用时生成一次。
+    """
+
+    def __init__(self, records=()):
+        self.records = tuple(records)
+        self._positions = {record.code: i for i, record in enumerate(self.records)}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """由按 RESULT_TITLES 顺序排列的行（如保存的 JSON）建立"""
+        return cls(StockResult(*row) for row in rows)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, i):
+        return self.records[i]
+
+    def get(self, code):
+        """按股票代码查找，不存在时返回 None"""
+        i = self._positions.get(code)
+        return None if i is None else self.records[i]
+
+    def to_rows(self):
+        return [record.as_list() for record in self.records]
+
+    @cached_property
+    def frame(self):
+        """列名为 RESULT_TITLES 的 DataFrame，多个会话共用，不要原地修改"""
+        return pd.DataFrame(self.to_rows(), columns=RESULT_TITLES)
+
+    @cached_property
+    def digest(self):
+        return results_digest(self.to_rows())
@@ -0,0 +1,525 @@
+"""选股规则：基础过滤条件、排序权重和技术信号分值
+
+规则是一个可以保存为 JSON 的字典，设置 SCREEN_RULES 指向规则文件即可换用
+其他策略，文件中没有写的部分沿用默认规则。条件和分值用 Python 语法的
+表达式书写：
+
+- 行情列名和变量名直接书写，不是合法标识符的列名用反引号括起来，
+  如 `市盈率-动态`、`5分钟涨跌`
+- and / or / not 和比较运算按元素计算，支持 5 <= 最新价 <= 100 这样的连写
+- K线表达式中 x[n] 表示 n 根K线之前的值，open/high/low/close/volume
+  为K线字段，variables 中定义的变量可以互相引用
+- 函数：abs、maximum、minimum、where；K线专用 sma(x, n)、
+  count(条件, 起, 止)（起止之间满足条件的K线数）、streak(条件, 起, 止)
+  （从起开始连续满足条件的K线数）；行情专用 startswith(列, 前缀, ...)、
+  contains(列, 文本)
+
+每条表达式在加载时编译一次，之后对整张行情快照或整个K线面板向量化计算。
+"""
+
+import ast
+import copy
+import hashlib
+import json
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+from astock_assistant.config.settings import settings
+
+DEFAULT_RULES = {
+    'name': 'default',
+    # 行情快照的基础过滤条件，全部满足的股票进入排序
+    'filters': [
+        "startswith(代码, '00', '60')",
+        "not contains(名称, 'ST')",
+        '5 <= 最新价 <= 100',
+        '换手率 >= 3',
+        '涨跌幅 > -5',
+        '量比 >= 1',
+        '0 < `市盈率-动态` < 100',
+        '振幅 >= 2',
+    ],
+    # 各列百分位排名的权重，加权和为排序得分
+    'rank': {
+        '换手率': 0.3,
+        '成交额': 0.2,
+        '量比': 0.2,
+        '涨速': 0.2,
+        '5分钟涨跌': 0.1,
+    },
+    # K线变量，信号条件和分值中可以直接引用
+    'variables': {
+        'ma5': 'sma(close, 5)',
+        'ma10': 'sma(close, 10)',
+        'vol_ma5': 'sma(volume, 5)',
+        'ma_bull': 'ma5 > ma10 and ma5[1] > ma10[1]',
+        'latest_price_change': '(close - close[1]) / close[1]',
+        'latest_vol_change': 'volume / vol_ma5',
+        'shrink': 'latest_vol_change < 0.8',
+        # 前4天（不含当天）末尾连续放量且价格不跌的天数
+        'consecutive_volume_up': (
+            'streak(latest_vol_change > 1.2 and latest_price_change >= -0.01, 1, 4)'
+        ),
+        'volume_up': 'consecutive_volume_up >= 2',
+        'falling': 'latest_price_change < 0',
+        'rising': 'close > open',
+        'body': 'abs(close - open)',
+        'upper_shadow': 'high - maximum(open, close)',
+        'lower_shadow': 'minimum(open, close) - low',
+        'shadow_threshold': '0.1 * body',
+    },
+    # 技术信号：条件 when 成立时计 points 分，没有 when 时直接计 points
+    'signals': [
+        {'name': '均线多头排列', 'side': 'positive', 'when': 'ma_bull', 'points': 15},
+        {
+            'name': '回调到支撑位',
+            'side': 'positive',
+            'when': 'ma_bull and close < ma5 and close > ma10',
+            'points': 10,
+        },
+        {'name': '当天缩量警示', 'side': 'negative', 'when': 'shrink', 'points': 15},
+        {
+            'name': '放量后缩量转折',
+            'side': 'negative',
+            'when': 'volume_up and shrink',
+            'points': 20,
+        },
+        {
+            'name': '持续放量上涨',
+            'side': 'positive',
+            'when': (
+                'volume_up and not shrink and latest_vol_change > 1.2'
+                ' and latest_price_change > 0'
+            ),
+            'points': '8 + consecutive_volume_up * 2',
+        },
+        {
+            'name': '下跌缩量',
+            'side': 'positive',
+            'when': 'falling and shrink',
+            'points': 5,
+        },
+        {
+            'name': '下跌放量',
+            'side': 'negative',
+            'when': 'falling and not shrink and latest_vol_change > 1.5',
+            'points': 10,
+        },
+        {
+            'name': '上涨承接好',
+            'side': 'positive',
+            'points': (
+                'count(rising and body > upper_shadow * 2'
+                ' and upper_shadow > shadow_threshold, 1, 4) * 7'
+            ),
+        },
+        {
+            'name': '资金承接',
+            'side': 'positive',
+            'points': (
+                'count(rising and lower_shadow > body'
+                ' and lower_shadow > shadow_threshold, 1, 4) * 5'
+            ),
+        },
+        {
+            'name': '下影线承接',
+            'side': 'positive',
+            'points': (
+                'count(not rising and lower_shadow > body * 1.5'
+                ' and lower_shadow > shadow_threshold, 1, 4) * 6'
+            ),
+        },
+        {
+            'name': '上方压力大',
+            'side': 'negative',
+            'points': (
+                'count(not rising and upper_shadow > body * 2'
+                ' and upper_shadow > shadow_threshold, 1, 4) * 5'
+            ),
+        },
+        {
+            'name': '连续大阴线',
+            'side': 'negative',
+            'when': 'count((close - open) / open < -0.02, 0, 2) == 3',
+            'points': 20,
+        },
+    ],
+    # 推荐指数：(正向分 - 负向分) × 加成 - 负向分 × 惩罚，截断到 [0, max_score]
+    'scoring': {
+        'min_bars': 20,
+        'boost_step': 0.1,
+        'boost_max': 1.5,
+        'penalty_step': 0.2,
+        'penalty_max': 2.0,
+        'max_score': 100,
+    },
+}
+
+# K线面板的字段
+PANEL_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+ELEMENTWISE_FUNCTIONS = {
+    'abs': np.abs,
+    'maximum': np.maximum,
+    'minimum': np.minimum,
+    'where': np.where,
+}
+
+SPOT_FUNCTIONS = {
+    'startswith': lambda column, *prefixes: column.str.startswith(prefixes),
+    'contains': lambda column, text: column.str.contains(text, regex=False),
+}
+
+# 需要在整段K线上计算的函数和按K线窗口计数的函数
+HISTORY_FUNCTIONS = ('sma',)
+WINDOW_FUNCTIONS = ('count', 'streak')
+
+_BACKTICK = re.compile(r'`([^`]+)`')
+_COMPARE_OPS = (ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)
+_BINARY_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.FloorDiv)
+
+
+class RuleError(ValueError):
+    """规则格式或表达式错误"""
+
+
+def _load(name):
+    return ast.Name(id=name, ctx=ast.Load())
+
+
+def _lag_node(offset):
+    lag = _load('lag')
+    if offset == 0:
+        return lag
+    return ast.BinOp(left=lag, op=ast.Add(), right=ast.Constant(offset))
+
+
+def _lambda(params, body):
+    return ast.Lambda(
+        args=ast.arguments(
+            posonlyargs=[],
+            args=[ast.arg(arg=name) for name in params],
+            kwonlyargs=[],
+            kw_defaults=[],
+            defaults=[],
+        ),
+        body=body,
+    )
+
+
+def _int_arg(node, source):
+    if not (
+        isinstance(node, ast.Constant)
+        and isinstance(node.value, int)
+        and not isinstance(node.value, bool)
+        and node.value >= 0
+    ):
+        raise RuleError(f'需要非负整数常量: {source}')
+    return node.value
+
+
+class _Compiler:
+    """把表达式的语法树改写为对数组逐元素计算的代码
+
+    panel 为 True 时编译K线表达式，名称按 (名称, 滞后K线数) 从上下文取值；
+    否则编译行情表达式，名称按列名取值。
+    """
+
+    def __init__(self, source, panel):
+        self.source = source
+        self.panel = panel
+        self.names = set()
+        self.columns = {}
+
+    def compile(self):
+        text = _BACKTICK.sub(self._quote, self.source)
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError as e:
+            raise RuleError(f'表达式语法错误: {self.source} ({e.msg})') from None
+        params = ['_ctx', 'lag'] if self.panel else ['_ctx']
+        body = _lambda(params, self.expr(tree.body, 0))
+        code = compile(
+            ast.fix_missing_locations(ast.Expression(body=body)), '<rule>', 'eval'
+        )
+        namespace = {'__builtins__': {}, **ELEMENTWISE_FUNCTIONS}
+        if not self.panel:
+            namespace.update(SPOT_FUNCTIONS)
+        return eval(code, namespace)
+
+    def _quote(self, match):
+        placeholder = f'_col{len(self.columns)}'
+        self.columns[placeholder] = match.group(1)
+        return placeholder
+
+    def expr(self, node, offset):
+        if isinstance(node, ast.BoolOp):
+            op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+            values = [self.expr(value, offset) for value in node.values]
+            result = values[0]
+            for value in values[1:]:
+                result = ast.BinOp(left=result, op=op, right=value)
+            return result
+        if isinstance(node, ast.UnaryOp):
+            operand = self.expr(node.operand, offset)
+            if isinstance(node.op, ast.Not):
+                return ast.UnaryOp(op=ast.Invert(), operand=operand)
+            if isinstance(node.op, (ast.USub, ast.UAdd)):
+                return ast.UnaryOp(op=node.op, operand=operand)
+        if isinstance(node, ast.BinOp) and isinstance(node.op, _BINARY_OPS):
+            return ast.BinOp(
+                left=self.expr(node.left, offset),
+                op=node.op,
+                right=self.expr(node.right, offset),
+            )
+        if isinstance(node, ast.Compare) and all(
+            isinstance(op, _COMPARE_OPS) for op in node.ops
+        ):
+            # a < b < c 改写为 (a < b) & (b < c)
+            operands = [self.expr(node.left, offset)] + [
+                self.expr(value, offset) for value in node.comparators
+            ]
+            result = None
+            for i, op in enumerate(node.ops):
+                pair = ast.Compare(
+                    left=operands[i], ops=[op], comparators=[operands[i + 1]]
+                )
+                result = (
+                    pair
+                    if result is None
+                    else ast.BinOp(left=result, op=ast.BitAnd(), right=pair)
+                )
+            return result
+        if isinstance(node, ast.Constant) and isinstance(
+            node.value, (int, float, str)
+        ):
+            return ast.Constant(node.value)
+        if isinstance(node, ast.Name):
+            return self.name(node.id, offset)
+        if isinstance(node, ast.Subscript) and self.panel:
+            # x[n]：n 根K线之前的值
+            return self.expr(node.value, offset + _int_arg(node.slice, self.source))
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and not node.keywords
+        ):
+            return self.call(node.func.id, node.args, offset)
+        raise RuleError(f'不支持的表达式: {ast.unparse(node)} ({self.source})')
+
+    def name(self, name, offset):
+        name = self.columns.get(name, name)
+        self.names.add(name)
+        args = [ast.Constant(name)]
+        if self.panel:
+            args.append(_lag_node(offset))
+        return ast.Call(
+            func=ast.Attribute(value=_load('_ctx'), attr='get', ctx=ast.Load()),
+            args=args,
+            keywords=[],
+        )
+
+    def call(self, func, args, offset):
+        if func in ELEMENTWISE_FUNCTIONS or (
+            not self.panel and func in SPOT_FUNCTIONS
+        ):
+            return ast.Call(
+                func=_load(func),
+                args=[self.expr(arg, offset) for arg in args],
+                keywords=[],
+            )
+        if self.panel and func in HISTORY_FUNCTIONS:
+            if len(args) != 2:
+                raise RuleError(f'{func} 需要两个参数: {self.source}')
+            period = _int_arg(args[1], self.source)
+            # 整段K线上的计算结果按参数表达式缓存，同一表达式只计算一次
+            key = f'{func}({ast.dump(args[0])}, {period})'
+            return self._ctx_call(
+                func,
+                [
+                    ast.Constant(key),
+                    _lambda(['_ctx', 'lag'], self.expr(args[0], 0)),
+                    ast.Constant(period),
+                    _lag_node(offset),
+                ],
+            )
+        if self.panel and func in WINDOW_FUNCTIONS:
+            if len(args) != 3:
+                raise RuleError(f'{func} 需要三个参数: {self.source}')
+            first = _int_arg(args[1], self.source)
+            last = _int_arg(args[2], self.source)
+            if last < first:
+                raise RuleError(f'{func} 的起止范围无效: {self.source}')
+            return self._ctx_call(
+                func,
+                [
+                    _lambda(['lag'], self.expr(args[0], 0)),
+                    _lag_node(offset),
+                    ast.Constant(first),
+                    ast.Constant(last),
+                ],
+            )
+        raise RuleError(f'未知函数 {func}: {self.source}')
+
+    def _ctx_call(self, func, args):
+        return ast.Call(
+            func=ast.Attribute(value=_load('_ctx'), attr=func, ctx=ast.Load()),
+            args=args,
+            keywords=[],
+        )
+
+
+def compile_expression(source, panel=False):
+    """编译一条表达式，返回 (函数, 引用到的名称)"""
+    compiler = _Compiler(str(source), panel)
+    return compiler.compile(), compiler.names
+
+
+class SpotContext:
+    """行情表达式的取值上下文，名称对应 DataFrame 的列"""
+
+    def __init__(self, df):
+        self.df = df
+
+    def get(self, name):
+        if name not in self.df.columns:
+            raise RuleError(f'行情中没有列: {name}')
+        return self.df[name]
+
+
+class RuleSet:
+    """编译好的一套选股规则"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.name = spec.get('name', 'custom')
+        self.digest = hashlib.sha1(
+            json.dumps(spec, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        ).hexdigest()[:12]
+
+        self.filters = [compile_expression(text)[0] for text in spec['filters']]
+        self.rank_weights = dict(spec['rank'])
+
+        self.variables = {}
+        dependencies = {}
+        for name, text in spec['variables'].items():
+            if name in PANEL_FIELDS:
+                raise RuleError(f'变量名与K线字段重名: {name}')
+            self.variables[name], dependencies[name] = compile_expression(
+                text, panel=True
+            )
+
+        self.signals = []
+        for signal in spec['signals']:
+            if signal.get('side') not in ('positive', 'negative'):
+                raise RuleError(
+                    f"信号 {signal.get('name')} 的 side 应为 positive 或 negative"
+                )
+            points, names = compile_expression(signal['points'], panel=True)
+            when = None
+            if signal.get('when') is not None:
+                when, when_names = compile_expression(signal['when'], panel=True)
+                names = names | when_names
+            dependencies[signal['name']] = names
+            self.signals.append((signal['name'], signal['side'], when, points))
+
+        self.scoring = dict(spec['scoring'])
+        self._check_names(dependencies)
+
+    def _check_names(self, dependencies):
+        known = set(PANEL_FIELDS) | set(self.variables)
+        for owner, names in dependencies.items():
+            unknown = names - known
+            if unknown:
+                unknown = ', '.join(sorted(unknown))
+                raise RuleError(f'{owner} 引用了未定义的变量: {unknown}')
+
+        # 变量之间不能循环引用
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == 'done' or name not in self.variables:
+                return
+            if state.get(name) == 'visiting':
+                raise RuleError(f"变量循环引用: {' -> '.join(path + [name])}")
+            state[name] = 'visiting'
+            for dependency in dependencies[name]:
+                visit(dependency, path + [name])
+            state[name] = 'done'
+
+        for name in self.variables:
+            visit(name, [])
+
+    def __reduce__(self):
+        # 编译出的函数不能序列化，传给评分进程时只传规则本身，在进程内重新编译
+        return compile_rules, (self.spec,)
+
+    def filter(self, df):
+        """满足全部过滤条件的行"""
+        if not self.filters:
+            return df.copy()
+        context = SpotContext(df)
+        mask = None
+        for condition in self.filters:
+            value = condition(context)
+            mask = value if mask is None else mask & value
+        return df[mask].copy()
+
+    def rank(self, df, limit=None):
+        """按各列百分位排名的加权和降序排列"""
+        context = SpotContext(df)
+        total = None
+        for col, weight in self.rank_weights.items():
+            df[f'{col}排名'] = context.get(col).rank(pct=True)
+            term = df[f'{col}排名'] * weight
+            total = term if total is None else total + term
+        df['排序得分'] = total if total is not None else 0.0
+        df = df.sort_values(by='排序得分', ascending=False)
+        return df if limit is None else df.head(limit)
+
+
+def merge_rules(overrides, base=None):
+    """规则文件只需写出与默认规则不同的部分，variables 和 scoring 按键合并"""
+    spec = copy.deepcopy(base or DEFAULT_RULES)
+    for key, value in overrides.items():
+        if key in ('variables', 'scoring'):
+            spec[key].update(value)
+        else:
+            spec[key] = copy.deepcopy(value)
+    return spec
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_rules(spec=None):
+    """编译规则，相同内容的规则在进程内只编译一次"""
+    spec = DEFAULT_RULES if spec is None else spec
+    key = json.dumps(spec, ensure_ascii=False, sort_keys=True)
+    with _compiled_lock:
+        rules = _compiled.get(key)
+    if rules is None:
+        rules = RuleSet(spec)
+        with _compiled_lock:
+            rules = _compiled.setdefault(key, rules)
+    return rules
+
+
+def load_rules(path):
+    """读取 JSON 规则文件，与默认规则合并后编译"""
+    with open(Path(path), encoding='utf-8') as f:
+        overrides = json.load(f)
+    spec = merge_rules(overrides)
+    if 'name' not in overrides:
+        spec['name'] = Path(path).stem
+    return compile_rules(spec)
+
+
+def active_rules():
+    """SCREEN_RULES 指定的规则，未设置时为默认规则"""
+    if settings.SCREEN_RULES:
+        return load_rules(settings.SCREEN_RULES)
+    return compile_rules()
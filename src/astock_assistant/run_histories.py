@@ -0,0 +1,64 @@
+import itertools
+import threading
+from collections import OrderedDict
+
+from astock_assistant.metrics import metrics
+
+
+class RunHistories:
+    """最近几次选股获取的K线，按选股批次保存
+
+    选股时已经为每只候选股票获取了K线，这里只保留有推荐结果的股票，
+    查看股票详情时直接使用，不再请求数据源。超过 max_runs 批时淘汰
+    最早的一批。同一只股票不同周期的K线分别保存。
+    """
+
+    def __init__(self, max_runs=4):
+        self.max_runs = max_runs
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def __len__(self):
+        return len(self._runs)
+
+    def begin(self, run=None):
+        """开始一批新的K线，run 为空时生成一个编号；同一编号重新选股时覆盖旧的一批"""
+        if run is None:
+            run = ('run', next(self._ids))
+        with self._lock:
+            self._runs.pop(run, None)
+            self._runs[run] = {}
+            while len(self._runs) > self.max_runs:
+                self._runs.popitem(last=False)
+        return run
+
+    def put(self, run, symbol, df, period='daily'):
+        with self._lock:
+            histories = self._runs.get(run)
+            if histories is not None:
+                histories[(symbol, period)] = df
+
+    def get(self, symbol, run=None, period='daily'):
+        """取出某只股票的K线，优先在指定批次中查找，否则从最近一批往前找"""
+        with self._lock:
+            if run in self._runs:
+                runs = [self._runs[run]]
+            else:
+                runs = list(reversed(self._runs.values()))
+            key = (symbol, period)
+            df = next((h[key] for h in runs if key in h), None)
+        metrics.inc(
+            'astock_cache_requests_total',
+            cache='run_history',
+            result='miss' if df is None else 'hit',
+        )
+        return df
+
+    def clear(self):
+        with self._lock:
+            self._runs.clear()
+
+
+# 进程内共享，选股和股票详情在各会话之间共用
+run_histories = RunHistories()
@@ -0,0 +1,203 @@
+"""后台预计算选股结果
+
+交易时段内每隔 AUTO_UPDATE_INTERVAL 运行一次选股，结果按版本写入
+DATA_DIR/screens，应用打开时直接展示最新一次的结果。可以作为独立进程运行：
+
+    python -m astock_assistant.scheduler
+"""
+
+import argparse
+import json
+import os
+import threading
+from datetime import time
+from pathlib import Path
+
+import pandas as pd
+from astock_assistant.config.logging_config import setup_logging
+from astock_assistant.config.settings import settings
+from astock_assistant.history_cache import TradeCalendar
+from astock_assistant.metrics import start_http_server
+from astock_assistant.shared_cache import SharedCache
+from astock_assistant.stock_screener import StockScreener
+
+MARKET_CLOSE = time(15, 0)
+
+
+class ResultStore:
+    """按版本保存的选股结果，每个版本一个 JSON 文件"""
+
+    def __init__(self, root=None, keep=100):
+        self.root = Path(root or settings.DATA_DIR) / 'screens'
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def versions(self):
+        if not self.root.exists():
+            return []
+        return sorted(path.stem for path in self.root.glob('*.json'))
+
+    def save(self, results, market_time):
+        created_at = pd.Timestamp.now()
+        record = {
+            'version': f'{created_at:%Y%m%d-%H%M%S}',
+            'created_at': created_at.isoformat(),
+            'market_time': pd.Timestamp(market_time).isoformat(),
+            # 按 RESULT_TITLES 顺序保存为行，读取后用 ScreenResults.from_rows 还原
+            'results': [list(row) for row in results],
+        }
+        path = self.root / f"{record['version']}.json"
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            tmp_path.write_text(
+                json.dumps(record, ensure_ascii=False, default=float),
+                encoding='utf-8',
+            )
+            os.replace(tmp_path, path)
+            # 只保留最近的若干个版本
+            for version in self.versions()[: -self.keep]:
+                (self.root / f'{version}.json').unlink(missing_ok=True)
+        return record
+
+    def load(self, version):
+        path = self.root / f'{version}.json'
+        return json.loads(path.read_text(encoding='utf-8'))
+
+    def latest(self):
+        """最新一个版本的结果，没有时返回 None"""
+        versions = self.versions()
+        if not versions:
+            return None
+        try:
+            return self.load(versions[-1])
+        except Exception as e:
+            print(f'读取选股结果 {versions[-1]} 失败: {str(e)}')
+            return None
+
+
+def is_fresh(record, calendar, now, max_age=None):
+    """结果是否仍然有效
+
+    盘中结果在 max_age 秒内有效；非交易时段行情不再变化，最近一次收盘后
+    生成的结果一直有效到下一次开盘。
+    """
+    if record is None:
+        return False
+    max_age = settings.AUTO_UPDATE_INTERVAL if max_age is None else max_age
+    market_time = pd.Timestamp(record['market_time'])
+    if now - market_time <= pd.Timedelta(seconds=max_age):
+        return True
+    if calendar.in_session(now):
+        return False
+    last_close = pd.Timestamp.combine(
+        calendar.last_settled_session(now).date(), MARKET_CLOSE
+    )
+    return market_time >= last_close
+
+
+def provider_calendar(provider):
+    """数据源对应的交易日历，带本地缓存的数据源直接复用它的日历"""
+    history_cache = getattr(provider, 'history_cache', None)
+    if history_cache is not None:
+        return history_cache.calendar
+    return TradeCalendar(
+        dates=provider.get_trade_dates(), fetch_func=provider.get_trade_dates
+    )
+
+
+class ScreenScheduler:
+    """在后台线程中定时选股，并预先获取下一轮可能用到的K线"""
+
+    def __init__(
+        self,
+        screener=None,
+        store=None,
+        calendar=None,
+        interval=None,
+        prefetch=100,
+    ):
+        self.interval = settings.AUTO_UPDATE_INTERVAL if interval is None else interval
+        # 选股和预取共用同一份行情快照
+        self.screener = screener or StockScreener(cache=SharedCache(ttl=self.interval))
+        self.provider = self.screener.provider
+        self.store = store or ResultStore()
+        self.calendar = calendar or provider_calendar(self.provider)
+        self.prefetch = prefetch
+        # 最近一次保存的结果版本和它的K线批次编号
+        self._last_run = (None, None)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def due(self, now=None):
+        """没有有效结果时需要重新选股"""
+        now = now or self.provider.now()
+        return not is_fresh(self.store.latest(), self.calendar, now, self.interval)
+
+    def run_once(self):
+        market_time = self.provider.now()
+        results = self.screener.screen_stocks()
+        record = self.store.save(results, market_time) if results else None
+        if record:
+            self._last_run = (record['version'], self.screener.run)
+        if self.prefetch:
+            self.screener.prefetch_histories(self.prefetch)
+        return record
+
+    def run_key(self, record):
+        """预计算结果在 run_histories 中的K线批次，不是本进程算出的结果时返回 None"""
+        version, run = self._last_run
+        return run if record and record['version'] == version else None
+
+    def _loop(self):
+        # 最多一分钟检查一次，开盘后能尽快产出第一份结果
+        check_every = max(min(self.interval, 60), 1)
+        while not self._stop.is_set():
+            try:
+                if self.due():
+                    record = self.run_once()
+                    if record:
+                        print(
+                            f"预计算选股完成: 版本 {record['version']}，"
+                            f"{len(record['results'])} 支股票"
+                        )
+            except Exception as e:
+                print(f'预计算选股时出错: {str(e)}')
+            self._stop.wait(check_every)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='后台预计算选股结果')
+    parser.add_argument('--once', action='store_true', help='只运行一次后退出')
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    if settings.METRICS_PORT:
+        start_http_server()
+    scheduler = ScreenScheduler()
+    if args.once:
+        record = scheduler.run_once()
+        print(f"选股结果版本: {record['version'] if record else '无'}")
+        return
+
+    scheduler.start()
+    try:
+        scheduler._thread.join()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+import numpy as np
+import pandas as pd
+from astock_assistant.rules import PANEL_FIELDS, active_rules
+
+OHLCV_COLUMNS = ['开盘', '最高', '最低', '收盘', '成交量']
+
+
+class OHLCVPanel:
+    """按 (股票 × 交易日) 对齐的 OHLCV 面板
+
+    每只股票的K线按自身交易日靠右对齐，最后一列是各自最新的一根K线，
+    左侧不足的部分用 NaN 填充，lengths 记录每只股票的有效K线数量。
+    这样每一行看到的数据与单只股票的 DataFrame 完全相同。
+    """
+
+    def __init__(self, open, high, low, close, volume, lengths=None, symbols=None):
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        n_stocks, n_days = close.shape
+        if lengths is None:
+            lengths = np.full(n_stocks, n_days)
+        self.lengths = np.asarray(lengths)
+        self.symbols = list(symbols) if symbols is not None else None
+
+    @property
+    def shape(self):
+        return self.close.shape
+
+    @classmethod
+    def from_frames(cls, frames, symbols=None):
+        """由 ak.stock_zh_a_hist 格式的 DataFrame 列表构建面板"""
+        frames = list(frames)
+        # 获取失败或超出时间预算的股票为 None，对应空行
+        n_days = max([len(df) for df in frames if df is not None], default=0)
+        arrays = {
+            col: np.full((len(frames), n_days), np.nan) for col in OHLCV_COLUMNS
+        }
+        lengths = np.zeros(len(frames), dtype=np.int64)
+
+        for row, df in enumerate(frames):
+            if df is None or df.empty:
+                continue
+            if not all(col in df.columns for col in OHLCV_COLUMNS):
+                continue
+            lengths[row] = len(df)
+            for col in OHLCV_COLUMNS:
+                arrays[col][row, n_days - len(df):] = _float_values(df[col])
+
+        return cls(
+            arrays['开盘'],
+            arrays['最高'],
+            arrays['最低'],
+            arrays['收盘'],
+            arrays['成交量'],
+            lengths=lengths,
+            symbols=symbols,
+        )
+
+
+def _float_values(column):
+    # 数值列直接转换，比 pd.to_numeric 快一个数量级；文本列才逐个解析
+    if pd.api.types.is_numeric_dtype(column):
+        return column.to_numpy(dtype=float)
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype=float)
+
+
+def sma(values, period):
+    """逐行计算简单移动平均，累加顺序与 talib.SMA 完全一致
+
+    talib 从每行第一个非 NaN 值开始维护滑动和（先加新值、再减旧值），
+    这里沿时间轴做同样的累加，对所有股票同时进行，结果逐位相同。
+    """
+    n_stocks, n_days = values.shape
+    out = np.full(values.shape, np.nan)
+    valid = ~np.isnan(values)
+    first = np.where(valid.any(axis=1), valid.argmax(axis=1), n_days)
+    total = np.zeros(n_stocks)
+
+    for t in range(n_days):
+        k = t - first
+        total = np.where(k >= 0, total + values[:, t], total)
+        ready = k >= period - 1
+        out[ready, t] = total[ready] / period
+        # 还不满一个窗口时 ready 全为 False，下标取 0 只是为了不越界
+        total = np.where(ready, total - values[:, max(t - period + 1, 0)], total)
+
+    return out
+
+
+def round_half_even(values, decimals):
+    """逐元素取整，结果与 Python 内置 round 完全一致
+
+    np.round 先乘以 10**decimals 再取整，乘法的舍入误差会让 x.xx5 附近的
+    值取错方向；这里用 Dekker 算法求出乘积的精确误差后再判断进位。
+    """
+    values = np.asarray(values, dtype=float)
+    scale = 10.0**decimals
+    scaled = values * scale
+
+    split = 134217729.0 * values
+    values_hi = split - (split - values)
+    values_lo = values - values_hi
+    error = (values_hi * scale - scaled) + values_lo * scale
+
+    rounded = np.rint(scaled)
+    frac = scaled - rounded
+    rounded = np.where((frac == 0.5) & (error > 0), rounded + 1, rounded)
+    rounded = np.where((frac == -0.5) & (error < 0), rounded - 1, rounded)
+    return np.where(np.isfinite(values), rounded / scale, values)
+
+
+def _as_of_index(panel, as_of):
+    n_days = panel.shape[1]
+    if as_of is None:
+        return np.array([n_days - 1])
+    return np.atleast_1d(np.asarray(as_of)) % n_days
+
+
+def _squeeze(values, as_of):
+    return values[:, 0] if as_of is None else values
+
+
+def _take(values, columns):
+    """按列下标取值，面板第一列之前的位置为 NaN
+
+    回测时评分日可以是面板最早的几列，滞后或窗口超出面板左端时下标为负，
+    不能让它按 numpy 的规则从面板末尾取到未来的K线。
+    """
+    if columns.min(initial=0) >= 0:
+        return values[:, columns]
+    return np.where(columns >= 0, values[:, np.maximum(columns, 0)], np.nan)
+
+
+class PanelContext:
+    """K线规则表达式的取值上下文
+
+    名称在评分日往前 lag 根K线处取值，得到 (股票数, 评分日数) 的数组，
+    同一名称、同一滞后只计算一次。sma 这类依赖整段K线的函数在全部列上
+    计算一次后再按评分日取值。
+    """
+
+    def __init__(self, panel, idx, rules):
+        self.panel = panel
+        self.idx = idx
+        self.rules = rules
+        self._values = {}
+
+    def get(self, name, lag):
+        key = (name, lag)
+        value = self._values.get(key)
+        if value is None:
+            if name in PANEL_FIELDS:
+                value = _take(getattr(self.panel, name), self.idx - lag)
+            else:
+                value = self.rules.variables[name](self, lag)
+            self._values[key] = value
+        return value
+
+    def sma(self, key, series, period, lag):
+        full = self._values.get(key)
+        if full is None:
+            columns = PanelContext(
+                self.panel, np.arange(self.panel.shape[1]), self.rules
+            )
+            full = self._values[key] = sma(series(columns, 0), period)
+        return _take(full, self.idx - lag)
+
+    def count(self, condition, lag, first, last):
+        total = 0
+        for k in range(last, first - 1, -1):
+            total = total + condition(lag + k)
+        return total
+
+    def streak(self, condition, lag, first, last):
+        # 依次检查第 first..last 根K线，遇到第一个不满足的为止
+        met = np.stack(
+            [condition(lag + k) for k in range(first, last + 1)], axis=-1
+        )
+        return np.where(met.all(axis=-1), last - first + 1, met.argmin(axis=-1))
+
+
+@np.errstate(divide='ignore', invalid='ignore')
+def score_panel(panel, as_of=None, with_signals=False, rules=None):
+    """批量计算推荐指数，默认规则与 StockScreener._calculate_score 的结果一致
+
+    as_of 为需要评分的列下标（默认最后一列），传入多个下标时返回
+    (股票数, 下标数) 的二维结果，可用于逐日回放历史信号。rules 为
+    rules.RuleSet，默认为 SCREEN_RULES 配置的规则。
+    """
+    rules = rules or active_rules()
+    scoring = rules.scoring
+    idx = _as_of_index(panel, as_of)
+    context = PanelContext(panel, idx, rules)
+
+    # 截至各评分日的有效K线数量，不足 min_bars 天不评分
+    n_bars = panel.lengths[:, None] - (panel.shape[1] - 1 - idx)[None, :]
+    enough = n_bars >= scoring['min_bars']
+
+    positive = {}
+    negative = {}
+    for name, side, when, points in rules.signals:
+        value = points(context, 0)
+        if when is not None:
+            value = np.where(when(context, 0), value, 0)
+        value = np.broadcast_to(value, enough.shape)
+        (positive if side == 'positive' else negative)[name] = value
+
+    # 计算最终得分
+    positive_sum = sum(positive.values())
+    negative_sum = sum(negative.values())
+    positive_count = sum((v > 0).astype(np.int64) for v in positive.values())
+    negative_count = sum((v > 0).astype(np.int64) for v in negative.values())
+
+    base_score = (positive_sum - negative_sum).astype(float)
+    boost_factor = np.minimum(
+        scoring['boost_max'], 1 + positive_count * scoring['boost_step']
+    )
+    penalty_factor = np.minimum(
+        scoring['penalty_max'], 1 + negative_count * scoring['penalty_step']
+    )
+    final_score = base_score * boost_factor - negative_sum * penalty_factor
+    scores = np.where(enough, np.clip(final_score, 0, scoring['max_score']), 0.0)
+
+    scores = _squeeze(scores, as_of)
+    if not with_signals:
+        return scores
+    positive = {k: _squeeze(np.where(enough, v, 0), as_of) for k, v in positive.items()}
+    negative = {k: _squeeze(np.where(enough, v, 0), as_of) for k, v in negative.items()}
+    return scores, positive, negative
+
+
+@np.errstate(divide='ignore', invalid='ignore')
+def predict_panel(panel, as_of=None):
+    """批量预测次日价格区间，与 StockScreener._predict_next_day_price 的结果一致"""
+    idx = _as_of_index(panel, as_of)
+    lags = np.arange(5)
+    window = idx[None, :] - lags[:, None]
+
+    # 左侧填充的 NaN 不参与支撑位/压力位计算
+    low = np.where(np.isnan(panel.low), np.inf, panel.low)
+    high = np.where(np.isnan(panel.high), -np.inf, panel.high)
+    valid_window = window >= 0
+    support_level = np.where(valid_window, low[:, window], np.inf).min(axis=1)
+    resistance_level = np.where(valid_window, high[:, window], -np.inf).max(axis=1)
+
+    latest_close = panel.close[:, idx]
+    latest_volume = panel.volume[:, idx]
+    volume_window = np.where(valid_window, panel.volume[:, window], np.nan)
+    # 按时间顺序累加，与 pandas rolling(5).mean() 对整数成交量的结果一致
+    avg_volume = (
+        volume_window[:, 4]
+        + volume_window[:, 3]
+        + volume_window[:, 2]
+        + volume_window[:, 1]
+        + volume_window[:, 0]
+    ) / 5
+
+    volume_strength = latest_volume / avg_volume
+    expanding = volume_strength > 1.2
+
+    # 原实现中支撑位/压力位来自 Series 迭代得到的 Python float，经内置 round
+    # 取整；收盘价相关的候选值是 numpy 标量，走 numpy 的 round，两者在
+    # 临界值上结果不同，这里按 min/max 实际选中的候选值分别取整
+    high_level = np.where(expanding, resistance_level * 1.05, resistance_level)
+    high_close = np.where(expanding, latest_close * 1.1, latest_close * 1.05)
+    high_from_close = high_close < high_level
+    high_pred = np.where(high_from_close, high_close, high_level)
+
+    low_level = np.where(expanding, support_level, support_level * 0.98)
+    low_close = np.where(expanding, latest_close * 0.97, latest_close * 0.95)
+    low_from_close = low_close > low_level
+    low_pred = np.where(low_from_close, low_close, low_level)
+
+    pred_range = (high_pred - low_pred) / latest_close * 100
+
+    return {
+        '预测最高价': _squeeze(
+            np.where(
+                high_from_close, np.round(high_pred, 2), round_half_even(high_pred, 2)
+            ),
+            as_of,
+        ),
+        '预测最低价': _squeeze(
+            np.where(
+                low_from_close, np.round(low_pred, 2), round_half_even(low_pred, 2)
+            ),
+            as_of,
+        ),
+        '预测幅度': _squeeze(np.round(pred_range, 2), as_of),
+        '成交量比': _squeeze(np.round(volume_strength, 2), as_of),
+    }
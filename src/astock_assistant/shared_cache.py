@@ -0,0 +1,153 @@
+import threading
+import time
+
+from astock_assistant.config.settings import settings
+from astock_assistant.metrics import metrics
+
+
+class _Call:
+    """一次正在进行的计算，等待者通过 event 取得同一个结果"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """同一个键同时只执行一次计算，并发的调用者等待并共用这次的结果
+
+    计算失败时，异常同样传给所有等待者；下一次调用会重新计算。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+def _is_empty(value):
+    # DataFrame 不能直接判断真假，按长度判断
+    return value is None or (hasattr(value, '__len__') and len(value) == 0)
+
+
+class SharedCache:
+    """进程内共享的结果缓存，过期时间默认为 AUTO_UPDATE_INTERVAL
+
+    Streamlit 的每个浏览器会话都在同一个进程里运行，行情快照和选股结果
+    放在这里后，相同参数、相同行情时间窗口的请求只计算一次。计算失败、
+    返回 None 或空结果时不写入缓存，下一次请求重新计算。
+    """
+
+    def __init__(self, ttl=None, max_entries=64, name='shared'):
+        self.name = name
+        self.ttl = settings.AUTO_UPDATE_INTERVAL if ttl is None else ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._flight = SingleFlight()
+
+    def get(self, key):
+        """返回未过期的缓存值，没有时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            now = time.monotonic()
+            self._entries = {
+                k: v for k, v in self._entries.items() if v[0] > now
+            }
+            # 条目过多时丢弃最早写入的
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (now + self.ttl, value)
+
+    def get_or_compute(self, key, func, *args, **kwargs):
+        """缓存命中直接返回，否则计算并写入缓存，并发请求共用一次计算"""
+        value = self.get(key)
+        if value is not None:
+            self._count('hit')
+            return value
+
+        computed = []
+
+        def compute():
+            computed.append(True)
+            return self._compute(key, func, *args, **kwargs)
+
+        value = self._flight.do(key, compute)
+        if not computed:
+            self._count('coalesced')
+        return value
+
+    def _compute(self, key, func, *args, **kwargs):
+        # 上一次计算可能刚刚完成并写入了结果
+        value = self.get(key)
+        if value is not None:
+            self._count('hit')
+            return value
+        self._count('miss')
+        value = func(*args, **kwargs)
+        if not _is_empty(value):
+            self.set(key, value)
+        return value
+
+    def _count(self, result):
+        metrics.inc('astock_cache_requests_total', cache=self.name, result=result)
+
+    def discard(self, key):
+        """删除一个缓存值，例如只完成了一部分的结果"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def in_flight(self, key):
+        """该键是否正在计算中"""
+        return self._flight.in_flight(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def market_key(self, provider, *params):
+        """由参数和行情时间组成缓存键
+
+        行情时间按过期时间取整，同一时间窗口内的请求落到同一个键上；
+        回放数据的行情时间来自快照，不同快照不会混用结果。
+        """
+        window = max(int(self.ttl), 1)
+        return (*params, provider.now().floor(f'{window}s'))
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+TEXT_COLUMNS = ['代码', '名称']
+# 金额、成交量、市值数值大，float32 的精度不够，保留 float64
+FLOAT64_COLUMNS = ['成交量', '成交额', '总市值', '流通市值']
+# 行情源的行号，每次请求都会变化，不参与分析
+DROP_COLUMNS = ['序号']
+
+RESULT_COLUMNS = [
+    '今开',
+    '昨收',
+    '涨速',
+    '5分钟涨跌',
+    '60日涨跌幅',
+    '年初至今涨跌幅',
+    '换手率',
+    '总市值',
+    '流通市值',
+    '振幅',
+]
+
+
+def normalize_spot(df):
+    """把 stock_zh_a_spot_em 的行情快照一次性转换为紧凑的列式数据
+
+    价格、涨跌幅、比率类字段只有两位小数，统一转为 float32；无法解析的
+    值（如停牌股票的 '-'）转为 NaN。后续过滤、排名和结果生成都直接读取
+    这些列，不再重复做类型转换。
+    """
+    columns = {}
+    for col in df.columns:
+        if col in DROP_COLUMNS:
+            continue
+        if col in TEXT_COLUMNS:
+            columns[col] = df[col].astype(str).to_numpy()
+            continue
+        dtype = np.float64 if col in FLOAT64_COLUMNS else np.float32
+        columns[col] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype)
+    return pd.DataFrame(columns)
+
+
+def column_values(df, col):
+    """取出一列转为 Python 列表，float32 列还原为原始的两位小数"""
+    values = df[col].to_numpy()
+    if values.dtype == np.float32:
+        values = np.round(values.astype(np.float64), 2)
+    return values.tolist()
@@ -1,8 +1,18 @@
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
 import talib
-from plotly.subplots import make_subplots
+from astock_assistant.config.settings import settings
+from astock_assistant.metrics import metrics
+from astock_assistant.panel_store import shared_store
+from astock_assistant.periods import PERIOD_TITLES, check_period
+from astock_assistant.providers import create_provider, recent_history
+from astock_assistant.run_histories import run_histories
+
+# 超过这个数量的K线默认合并后用 WebGL 绘制
+MAX_RENDER_BARS = 400
 
 
 def calculate_kdj(df, n=9, m1=3, m2=3):
@@ -20,13 +30,148 @@ def calculate_kdj(df, n=9, m1=3, m2=3):
     return df
 
 
-def create_stock_charts(df):
+class FigureCache:
+    """已生成图表的 LRU 缓存，键包含股票代码和最后一根K线
+
+    图表对象按序列化后的 JSON 长度估算大小，总大小超过上限时淘汰
+    最久未使用的图表。缓存的图表只读，多个会话共用同一个对象。
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = (
+            settings.FIGURE_CACHE_MB * 2**20 if max_bytes is None else max_bytes
+        )
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.inc(
+            'astock_cache_requests_total',
+            cache='figure',
+            result='miss' if entry is None else 'hit',
+        )
+        return None if entry is None else entry[0]
+
+    def put(self, key, fig):
+        size = len(fig.to_json())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._entries[key] = (fig, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+# 进程内共享的图表缓存
+figure_cache = FigureCache()
+
+
+def figure_key(symbol, df, fast, period='daily'):
+    """图表缓存键：盘中最后一根K线会变化，所以同时包含它的价格和成交量"""
+    last = df.iloc[-1]
+    return (
+        symbol,
+        period,
+        str(last['日期']),
+        float(last['收盘']),
+        float(last['成交量']),
+        len(df),
+        fast,
+    )
+
+
+def downsample_bars(df, max_bars):
+    """把连续的K线合并为不超过 max_bars 根，最后一组以最新K线结尾"""
+    size = -(-len(df) // max_bars)
+    if size <= 1:
+        return df, None
+    # 从最后一根往前分组，保证最新的K线单独落在最后一组的末尾
+    from_end = (len(df) - 1 - np.arange(len(df))) // size
+    groups = from_end.max() - from_end
+    grouped = df.groupby(groups, sort=True)
+    bars = grouped.agg(
+        {
+            '开盘': 'first',
+            '最高': 'max',
+            '最低': 'min',
+            '收盘': 'last',
+            '成交量': 'sum',
+        }
+    )
+    last_rows = grouped.indices
+    ends = np.array([last_rows[g][-1] for g in bars.index])
+    bars.index = df.index[ends]
+    return bars, ends
+
+
+@metrics.timer('create_stock_charts')
+def create_stock_charts(
+    df=None, symbol=None, provider=None, fast=None, run=None, period='daily'
+):
+    """生成K线、成交量、MACD 和 KDJ 四联图
+
+    传入 symbol 时按股票代码和最后一根K线缓存生成的图表。fast 为 True 时
+    把K线合并到不超过 MAX_RENDER_BARS 根并用 WebGL 绘制折线，默认在K线
+    数量超过该值时启用。未传入 df 时先使用选股批次 run 中保存的K线，
+    其次是全市场面板，最后才请求数据源。period 为 weekly 或 monthly 时
+    画周线或月线，由日K线在本地汇总，不请求对应周期的接口。
+    """
+    check_period(period)
+    if df is None:
+        df = run_histories.get(symbol, run, period)
+    if df is None:
+        provider = provider or create_provider()
+        # 面板只保存日K线
+        store = shared_store() if period == 'daily' else None
+        if store is not None:
+            df = store.recent_history(provider, symbol)
+        if df is None:
+            df = recent_history(provider, symbol, period=period)
+    if df is None or df.empty:
+        return None
+    if fast is None:
+        fast = len(df) > MAX_RENDER_BARS
+
+    key = None
+    if symbol is not None:
+        key = figure_key(symbol, df, fast, period)
+        fig = figure_cache.get(key)
+        if fig is not None:
+            return fig
+
+    fig = _build_figure(df, fast, period)
+    if key is not None and fig is not None:
+        figure_cache.put(key, fig)
+    return fig
+
+
+def _build_figure(df, fast, period='daily'):
+    # plotly 只在真正绘图时加载，命令行选股等不画图的场景不需要它
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    df = df.copy()
     # 确保数据类型正确
-    df['收盘'] = pd.to_numeric(df['收盘'])
-    df['开盘'] = pd.to_numeric(df['开盘'])
-    df['最高'] = pd.to_numeric(df['最高'])
-    df['最低'] = pd.to_numeric(df['最低'])
-    df['成交量'] = pd.to_numeric(df['成交量'])
+    for col in ['开盘', '最高', '最低', '收盘', '成交量']:
+        df[col] = pd.to_numeric(df[col])
 
     # 设置时间索引
     df.index = pd.to_datetime(df['日期'])
@@ -42,17 +187,29 @@ def create_stock_charts(df):
     df = calculate_kdj(df)
 
     # 找到MACD和KDJ都开始有效的位置
-    macd_valid_index = np.where(~np.isnan(macd))[0][0]
-    kdj_valid_index = df.index[df['K'].notna()][0]  # 找到第一个非空的KDJ值
+    macd_valid = np.flatnonzero(~np.isnan(macd))
+    kdj_valid = np.flatnonzero(df['K'].notna().values)
+    if not len(macd_valid) or not len(kdj_valid):
+        return None
 
     # 使用最晚的起始位置，确保所有指标都有效
-    valid_index = max(macd_valid_index, df.index.get_loc(kdj_valid_index))
+    valid_index = max(macd_valid[0], kdj_valid[0])
 
     # 所有数据都从这个位置开始展示
     df = df.iloc[valid_index:]
     macd = macd[valid_index:]
     signal = signal[valid_index:]
     hist = hist[valid_index:]
+    k, d, j = df['K'].values, df['D'].values, df['J'].values
+
+    # 指标在完整K线上计算，合并K线后取每组最后一根对应的指标值
+    bars = df
+    if fast:
+        bars, ends = downsample_bars(df, MAX_RENDER_BARS)
+        if ends is not None:
+            macd, signal, hist = macd[ends], signal[ends], hist[ends]
+            k, d, j = k[ends], d[ends], j[ends]
+    line = go.Scattergl if fast else go.Scatter
 
     # 创建子图，修改行数和高度比例
     fig = make_subplots(
@@ -72,11 +229,11 @@ def create_stock_charts(df):
     # 添加K线图（在第一行）
     fig.add_trace(
         go.Candlestick(
-            x=df.index,
-            open=df['开盘'],
-            high=df['最高'],
-            low=df['最低'],
-            close=df['收盘'],
+            x=bars.index,
+            open=bars['开盘'],
+            high=bars['最高'],
+            low=bars['最低'],
+            close=bars['收盘'],
             name='K线',
             increasing_line_color='red',
             decreasing_line_color='green',
@@ -86,12 +243,14 @@ def create_stock_charts(df):
     )
 
     # 添加成交量图（在第二行）
-    colors = [
-        'red' if row['收盘'] >= row['开盘'] else 'green' for _, row in df.iterrows()
-    ]
+    colors = np.where(bars['收盘'].values >= bars['开盘'].values, 'red', 'green')
     fig.add_trace(
         go.Bar(
-            x=df.index, y=df['成交量'], name='成交量', marker_color=colors, opacity=0.3
+            x=bars.index,
+            y=bars['成交量'],
+            name='成交量',
+            marker_color=colors,
+            opacity=0.3,
         ),
         row=2,
         col=1,
@@ -99,21 +258,21 @@ def create_stock_charts(df):
 
     # MACD图（在第三行）
     fig.add_trace(
-        go.Scatter(x=df.index, y=macd, name='MACD', line=dict(color='blue')),
+        line(x=bars.index, y=macd, name='MACD', line=dict(color='blue')),
         row=3,
         col=1,
     )
     fig.add_trace(
-        go.Scatter(x=df.index, y=signal, name='Signal', line=dict(color='orange')),
+        line(x=bars.index, y=signal, name='Signal', line=dict(color='orange')),
         row=3,
         col=1,
     )
     fig.add_trace(
         go.Bar(
-            x=df.index,
+            x=bars.index,
             y=hist,
             name='MACD Hist',
-            marker_color=['red' if val >= 0 else 'green' for val in hist],
+            marker_color=np.where(hist >= 0, 'red', 'green'),
         ),
         row=3,
         col=1,
@@ -121,17 +280,17 @@ def create_stock_charts(df):
 
     # KDJ图（在第四行）
     fig.add_trace(
-        go.Scatter(x=df.index, y=df['K'], name='K', line=dict(color='blue')),
+        line(x=bars.index, y=k, name='K', line=dict(color='blue')),
         row=4,
         col=1,
     )
     fig.add_trace(
-        go.Scatter(x=df.index, y=df['D'], name='D', line=dict(color='orange')),
+        line(x=bars.index, y=d, name='D', line=dict(color='orange')),
         row=4,
         col=1,
     )
     fig.add_trace(
-        go.Scatter(x=df.index, y=df['J'], name='J', line=dict(color='purple')),
+        line(x=bars.index, y=j, name='J', line=dict(color='purple')),
         row=4,
         col=1,
     )
@@ -139,7 +298,7 @@ def create_stock_charts(df):
     # 更新布局
     fig.update_layout(
         height=1000,
-        title_text='日K线图表',
+        title_text=f'{PERIOD_TITLES[period]}K线图表',
         showlegend=True,
         xaxis4_rangeslider_visible=True,
     )
@@ -1,109 +1,444 @@
-import concurrent.futures
+import asyncio
+import queue
 import threading
-from concurrent.futures import ThreadPoolExecutor
+import time
+from contextlib import contextmanager
+from operator import attrgetter
 
-import akshare as ak
+import numpy as np
 import pandas as pd
 import talib
+from astock_assistant.config.settings import settings
+from astock_assistant.fetcher import AsyncFetcher
+from astock_assistant.metrics import log_event, metrics
+from astock_assistant.panel_pool import evaluate_panel, shared_pool
+from astock_assistant.panel_store import shared_store
+from astock_assistant.periods import check_period
+from astock_assistant.profiler import profile
+from astock_assistant.providers import create_provider, recent_history
+from astock_assistant.results import ScreenResults, StockResult
+from astock_assistant.rules import active_rules
+from astock_assistant.run_histories import run_histories
+from astock_assistant.scoring import OHLCVPanel
+from astock_assistant.spot import RESULT_COLUMNS, column_values, normalize_spot
 
 
 class StockScreener:
-    def __init__(self):
+    def __init__(
+        self,
+        provider=None,
+        fetcher=None,
+        cache=None,
+        scoring_pool=None,
+        history_store=None,
+        rules=None,
+        candidate_limit=None,
+        time_budget=None,
+        panel_store=None,
+        period='daily',
+    ):
         self.stock_data = None
         self.thread_lock = threading.Lock()
+        self.fetcher = fetcher or AsyncFetcher()
+        self.provider = provider or create_provider(fetcher=self.fetcher)
+        # 进程内共享的 SharedCache，行情快照和选股结果在多个会话之间复用
+        self.cache = cache
+        # 多进程评分，默认按 SCORING_WORKERS 配置，未启用时在当前进程内计算
+        self.scoring_pool = scoring_pool or shared_pool()
+        # 进入深度分析（获取K线、评分）的候选股票数量，0 表示全市场
+        self.candidate_limit = (
+            settings.CANDIDATE_LIMIT if candidate_limit is None else candidate_limit
+        )
+        # 获取K线的时间预算（秒），0 表示不限
+        self.time_budget = (
+            settings.SCREEN_TIME_BUDGET if time_budget is None else time_budget
+        )
+        # 最近一次选股各阶段的耗时（秒）和处理的股票数
+        self.stage_times = {}
+        self.stage_items = {}
+        # 最近一次选股因超出时间预算而未获取K线的股票数
+        self.skipped = 0
+        # 最近一次 screen_stocks 失败时的异常，成功时为 None
+        self.error = None
+        # 有推荐结果的股票的K线按选股批次保存，股票详情直接使用
+        self.history_store = run_histories if history_store is None else history_store
+        self.run = None
+        # 过滤条件、排序权重和信号分值，默认按 SCREEN_RULES 配置
+        self.rules = rules or active_rules()
+        # 内存映射的全市场面板，默认按 PANEL_STORE 配置，未启用时为 None
+        self.panel_store = panel_store if panel_store is not None else shared_store()
+        # 评分使用的K线周期，周线和月线由日K线在本地汇总
+        check_period(period)
+        self.period = period
 
     def screen_stocks(self, progress_callback=None):
+        # PROFILE 开启时对整次选股采样，火焰图和热点摘要写入 LOG_DIR
+        self.error = None
+        with profile('screen_stocks'):
+            try:
+                if self.cache is None:
+                    return self._run_screen(progress_callback)
+                key = self.results_key()
+                results = self.cache.get_or_compute(
+                    key, self._run_screen, progress_callback
+                )
+                # 超出时间预算的结果只包含一部分股票，不在有效期内提供给其他会话
+                if self.skipped:
+                    self.cache.discard(key)
+                return results
+
+            except Exception as e:
+                print(f'获取股票数据时出错: {str(e)}')
+                self.error = e
+                return ScreenResults()
+
+    def results_key(self):
+        """选股结果在共享缓存中的键"""
+        return self.cache.market_key(
+            self.provider,
+            'screen',
+            type(self.provider).__name__,
+            self.candidate_limit,
+            self.rules.digest,
+            self.period,
+        )
+
+    def run_key(self):
+        """本次选股K线的批次编号，有共享缓存时与选股结果的键相同"""
+        return self.results_key() if self.cache is not None else None
+
+    def _run_screen(self, progress_callback=None):
+        started = self._begin_screen()
+        candidates = self._select_candidates(progress_callback)
+        panel = self._stored_panel(candidates)
+        if panel is None:
+            histories = self._fetch_histories(candidates, progress_callback, started)
+
+        if progress_callback:
+            progress_callback(90, 100, '正在批量计算推荐指数...')
+
+        if panel is None:
+            results = self._score_histories(candidates, histories)
+        else:
+            results = self._score_panel(candidates, panel)
+        with self._stage('sort_results'):
+            results = self._sort_results(results)
+        self._record_screen(len(candidates), len(results), started)
+        return ScreenResults(results)
+
+    def _begin_screen(self):
+        self.stage_times = {}
+        self.stage_items = {}
+        self.skipped = 0
+        self.run = self.history_store.begin(self.run_key())
+        return time.perf_counter()
+
+    @contextmanager
+    def _stage(self, name, items=0):
+        # 同一阶段在一次选股中多次执行时（如分批评分）累加耗时和股票数
+        with metrics.timer(name) as span:
+            yield
+        self.stage_times[name] = self.stage_times.get(name, 0.0) + span['seconds']
+        self.stage_items[name] = self.stage_items.get(name, 0) + items
+
+    def throughput(self):
+        """最近一次选股各阶段每秒处理的股票数"""
+        return {
+            name: self.stage_items[name] / seconds
+            for name, seconds in self.stage_times.items()
+            if self.stage_items.get(name) and seconds > 0
+        }
+
+    def _record_screen(self, n_candidates, n_results, started):
+        """记录一次选股的汇总指标，并写一条结构化日志"""
+        elapsed = time.perf_counter() - started
+        self.stage_times['screen'] = elapsed
+        self.stage_items['screen'] = n_candidates
+        metrics.observe('astock_stage_seconds', elapsed, stage='screen')
+        metrics.inc('astock_screens_total')
+        metrics.set('astock_screen_candidates', n_candidates)
+        metrics.set('astock_screen_results', n_results)
+        metrics.set('astock_screen_skipped', self.skipped)
+        per_second = n_candidates / elapsed if elapsed > 0 else 0.0
+        metrics.set('astock_screen_candidates_per_second', per_second)
+        throughput = self.throughput()
+        for stage, value in throughput.items():
+            metrics.set('astock_stage_items_per_second', value, stage=stage)
+        log_event(
+            'screen',
+            provider=type(self.provider).__name__,
+            candidates=n_candidates,
+            results=n_results,
+            seconds=round(elapsed, 3),
+            candidates_per_second=round(per_second, 1),
+            skipped=self.skipped,
+            stages={k: round(v, 4) for k, v in self.stage_times.items()},
+            throughput={k: round(v, 1) for k, v in throughput.items()},
+            history_cache_hit_ratio=metrics.hit_ratio('history'),
+        )
+
+    def iter_screen_stocks(self, progress_callback=None, top_n=20):
+        """逐步产出选股结果的 screen_stocks
+
+        每批K线到达后立即评分，依次产出 (StockResult, 当前前 top_n 名)，
+        前 top_n 名按推荐指数降序排列。得分为 0 的股票不产出。
+        """
+        started = self._begin_screen()
         try:
+            candidates = self._select_candidates(progress_callback)
+        except Exception as e:
+            print(f'获取股票数据时出错: {str(e)}')
+            return
+
+        total_stocks = len(candidates)
+        found = 0
+        top_results = []
+
+        # 全市场面板有效时不需要等待K线，整体评分后依次产出
+        panel = self._stored_panel(candidates)
+        if panel is not None:
+            for result in self._sort_results(self._score_panel(candidates, panel)):
+                found += 1
+                top_results = (top_results + [result])[:top_n]
+                yield result, list(top_results)
+            self._record_screen(total_stocks, found, started)
+            return
+
+        arrived = queue.Queue()
+
+        def fetch_all():
+            try:
+                asyncio.run(
+                    self.fetcher.gather(
+                        self._budgeted_fetch(started),
+                        candidates['代码'].tolist(),
+                        on_result=lambda done, i, hist_data: arrived.put(
+                            (i, hist_data)
+                        ),
+                    )
+                )
+            finally:
+                arrived.put(None)
+
+        threading.Thread(target=fetch_all, daemon=True).start()
+
+        done = 0
+        finished = False
+        while not finished:
+            # 取出当前已经到达的全部K线，作为一批评分
+            batch = [arrived.get()]
+            while True:
+                try:
+                    batch.append(arrived.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                finished = True
+                batch.pop()
+            if not batch:
+                continue
+
+            done += len(batch)
             if progress_callback:
-                progress_callback(0, 100, '正在获取市场数据...')
-
-            # 获取活跃股票数据
-            active_stocks = ak.stock_zh_a_spot_em()
+                progress_callback(
+                    20 + int(done * 80 / total_stocks),
+                    100,
+                    f'已分析 {done}/{total_stocks} 支股票...',
+                )
 
-            if progress_callback:
-                progress_callback(10, 100, '正在筛选活跃股票...')
-
-            # 基础过滤条件
-            active_stocks = active_stocks[
-                (active_stocks['代码'].str.startswith(('00', '60')))
-                & (~active_stocks['名称'].str.contains('ST'))
-                & (active_stocks['最新价'].astype(float) >= 5)
-                & (active_stocks['最新价'].astype(float) <= 100)
-                & (active_stocks['换手率'].astype(float) >= 3)
-                & (active_stocks['涨跌幅'].astype(float) > -5)
-                & (active_stocks['量比'].astype(float) >= 1)
-                & (active_stocks['市盈率-动态'].astype(float) > 0)
-                & (active_stocks['市盈率-动态'].astype(float) < 100)
-                & (active_stocks['振幅'].astype(float) >= 2)
-            ]
+            try:
+                results = self._score_histories(
+                    candidates.iloc[[i for i, _ in batch]],
+                    [hist_data for _, hist_data in batch],
+                )
+            except Exception as e:
+                print(f'计算得分时出错: {str(e)}')
+                continue
+
+            for result in results:
+                found += 1
+                top_results.append(result)
+                top_results = self._sort_results(top_results)[:top_n]
+                yield result, list(top_results)
+
+        self._record_screen(total_stocks, found, started)
+
+    def intraday_screen(self, monitor, progress_callback=None):
+        """盘中复筛：候选股票的分钟K线按增量刷新，返回按日内评分排序的表
+
+        monitor 为 intraday.IntradayMonitor，在多次复筛之间保留分钟K线，
+        每次只获取和计算新到的K线。
+        """
+        candidates = self._select_candidates(progress_callback)
+        table = monitor.refresh(candidates['代码'].tolist())
+        names = candidates.set_index('代码')['名称']
+        table.insert(0, '名称', names.reindex(table.index))
+        return table
+
+    def _select_candidates(self, progress_callback=None):
+        if progress_callback:
+            progress_callback(0, 100, '正在获取市场数据...')
+
+        # 获取活跃股票数据，并一次性转换为列式的数值类型
+        with self._stage('get_spot'):
+            active_stocks = self._get_spot()
+
+        if progress_callback:
+            progress_callback(10, 100, '正在筛选活跃股票...')
+
+        with self._stage('filter_spot', items=len(active_stocks)):
+            active_stocks = self._filter_stocks(active_stocks)
+
+        if progress_callback:
+            progress_callback(20, 100, '正在排序股票...')
+
+        # 按得分降序排序并选取前 candidate_limit 只股票
+        with self._stage('rank_spot', items=len(active_stocks)):
+            active_stocks = self._rank_stocks(
+                active_stocks, limit=self.candidate_limit or None
+            )
+        return active_stocks.reset_index(drop=True)
 
-            if progress_callback:
-                progress_callback(20, 100, '正在排序股票...')
+    def prefetch_histories(self, count):
+        """预先获取排名紧随候选股票之后的 count 支股票的K线
 
-            # 将所有需要的指标转换为百分位数排名
-            active_stocks['换手率排名'] = (
-                active_stocks['换手率'].astype(float).rank(pct=True)
-            )
-            active_stocks['成交额排名'] = (
-                active_stocks['成交额'].astype(float).rank(pct=True)
-            )
-            active_stocks['量比排名'] = (
-                active_stocks['量比'].astype(float).rank(pct=True)
-            )
-            active_stocks['涨速排名'] = (
-                active_stocks['涨速'].astype(float).rank(pct=True)
-            )
-            active_stocks['五分钟涨跌排名'] = (
-                active_stocks['5分钟涨跌'].astype(float).rank(pct=True)
+        本轮候选股票的K线在选股时已经获取；排名变化后进入下一轮候选的
+        股票通常来自紧随其后的这一段，提前获取后下一轮选股可以直接命中
+        本地缓存。返回成功获取的数量；分析全部股票时没有需要预取的股票。
+        """
+        if not self.candidate_limit:
+            return 0
+        ranked = self._rank_stocks(self._filter_stocks(self._get_spot()))
+        codes = ranked['代码'].iloc[
+            self.candidate_limit : self.candidate_limit + count
+        ].tolist()
+        histories = asyncio.run(self.fetcher.gather(self._fetch_history, codes))
+        return sum(hist_data is not None for hist_data in histories)
+
+    def _get_spot(self):
+        if self.cache is None:
+            return normalize_spot(self.provider.get_spot())
+        key = self.cache.market_key(
+            self.provider, 'spot', type(self.provider).__name__
+        )
+        return self.cache.get_or_compute(
+            key, lambda: normalize_spot(self.provider.get_spot())
+        )
+
+    def _stored_panel(self, candidates):
+        """全市场面板与数据源一致时，直接从中取出候选股票的面板，否则返回 None"""
+        # 面板只保存日K线
+        if self.panel_store is None or self.period != 'daily':
+            return None
+        with self._stage('load_panel', items=len(candidates)):
+            return self.panel_store.recent_panel(
+                self.provider, candidates['代码'].tolist()
             )
 
-            # 计算综合得分（加权）
-            active_stocks['排序得分'] = (
-                active_stocks['换手率排名'] * 0.3  # 降低换手率权重
-                + active_stocks['成交额排名'] * 0.2  # 降低成交额权重
-                + active_stocks['量比排名'] * 0.2  # 加入量比指标
-                + active_stocks['涨速排名'] * 0.2  # 加入涨速指标
-                + active_stocks['五分钟涨跌排名'] * 0.1  # 加入短期趋势指标
+    def _score_histories(self, candidates, histories):
+        # 所有候选股票组成面板，整体计算得分和价格预测
+        with self._stage('build_panel', items=len(histories)):
+            panel = OHLCVPanel.from_frames(histories)
+        return self._score_panel(candidates, panel, histories)
+
+    def _score_panel(self, candidates, panel, histories=None):
+        with self._stage('score_panel', items=len(candidates)):
+            if self.scoring_pool is not None:
+                evaluated = self.scoring_pool.evaluate(panel, self.rules)
+            else:
+                evaluated = evaluate_panel(panel, self.rules)
+        scores, positive, negative, predictions = evaluated
+        with self._stage('collect_results', items=len(candidates)):
+            # 从全市场面板评分时，股票详情同样从面板读取K线，不需要保存
+            if histories is not None:
+                codes = candidates['代码'].tolist()
+                for i in np.flatnonzero(scores > 0):
+                    self.history_store.put(
+                        self.run, codes[i], histories[i], self.period
+                    )
+            return self._collect_results(
+                candidates, scores, predictions, positive, negative
             )
 
-            # 按得分降序排序并选取前300只股票
-            active_stocks = active_stocks.sort_values(
-                by='排序得分', ascending=False
-            ).head(300)
-
-            results = []
-            total_stocks = len(active_stocks)
-
-            # 使用线程池处理股票分析
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                futures = {
-                    executor.submit(self._process_single_stock, stock): i
-                    for i, (_, stock) in enumerate(active_stocks.iterrows())
-                }
-
-                for future in concurrent.futures.as_completed(futures):
-                    if progress_callback:
-                        current = futures[future] + 1
-                        progress = 20 + int(current * 80 / total_stocks)
-                        progress_callback(
-                            progress,
-                            100,
-                            f'正在分析第 {current}/{total_stocks} 支股票...',
-                        )
+    def _filter_stocks(self, active_stocks):
+        # 基础过滤条件，数值列已经由 normalize_spot 转换好类型
+        return self.rules.filter(active_stocks)
 
-                    result = future.result()
-                    if result:
-                        results.append(result)
+    def _rank_stocks(self, active_stocks, limit=None):
+        # 各指标百分位排名的加权和为排序得分
+        return self.rules.rank(active_stocks, limit)
 
-            # 过滤并排序结果
-            valid_results = [r for r in results if r is not None]
-            valid_results.sort(key=lambda x: x[2], reverse=True)  # 按推荐指数排序
+    def _budgeted_fetch(self, started):
+        """超出时间预算后不再获取K线的 _fetch_history
 
-            return valid_results
+        候选股票按排名顺序提交，超时后跳过的是排名靠后的股票，
+        已经获取的K线照常评分。
+        """
+        if not self.time_budget:
+            return self._fetch_history
+        deadline = started + self.time_budget
 
-        except Exception as e:
-            print(f'获取股票数据时出错: {str(e)}')
-            return []
+        def fetch(stock_code):
+            if time.perf_counter() > deadline:
+                with self.thread_lock:
+                    self.skipped += 1
+                return None
+            return self._fetch_history(stock_code)
+
+        return fetch
+
+    def _fetch_histories(self, candidates, progress_callback=None, started=None):
+        total_stocks = len(candidates)
+
+        def on_history(done, i, hist_data):
+            if progress_callback:
+                progress = 20 + int(done * 70 / total_stocks)
+                progress_callback(
+                    progress,
+                    100,
+                    f'正在获取第 {done}/{total_stocks} 支股票的K线...',
+                )
+
+        # 并发获取K线数据，上游请求统一经过限流、超时和重试
+        if started is None:
+            started = time.perf_counter()
+        with self._stage('fetch_histories', items=total_stocks):
+            histories = asyncio.run(
+                self.fetcher.gather(
+                    self._budgeted_fetch(started),
+                    candidates['代码'].tolist(),
+                    on_result=on_history,
+                )
+            )
+        if self.skipped:
+            print(f'超出时间预算，{self.skipped} 支股票未获取K线')
+        return histories
+
+    def _collect_results(
+        self, candidates, scores, predictions, positive=None, negative=None
+    ):
+        # 按列取出候选股票的行情，逐行只做字典查找
+        columns = ['代码', '名称', '最新价', '涨跌幅', *RESULT_COLUMNS]
+        values = {col: column_values(candidates, col) for col in columns}
+        results = []
+        for i in np.flatnonzero(scores > 0):
+            stock = {col: values[col][i] for col in columns}
+            if scores[i] >= 60 and positive is not None:
+                self._print_signals(
+                    stock['代码'],
+                    stock['名称'],
+                    scores[i],
+                    {k: v[i] for k, v in positive.items() if v[i] > 0},
+                    {k: v[i] for k, v in negative.items() if v[i] > 0},
+                )
+            price_prediction = {k: float(v[i]) for k, v in predictions.items()}
+            results.append(
+                self._build_result(stock, float(scores[i]), price_prediction)
+            )
+        return results
+
+    def _sort_results(self, results):
+        return sorted(results, key=attrgetter('score'), reverse=True)  # 按推荐指数排序
 
     def _calculate_score(
         self, df, stock_code=None, stock_name=None, price_prediction=None
@@ -257,11 +592,8 @@ class StockScreener:
 
             # 打印详细信息
             if score >= 60:
-                p_str = '+'.join([f'{k}({v})' for k, v in positive_signals.items()])
-                n_str = '+'.join([f'{k}({v})' for k, v in negative_signals.items()])
-                print(
-                    f'股票 {stock_code} ({stock_name}) 得分: {score:.2f} '
-                    f'正向信号: {p_str} 负向信号: {n_str}'
+                self._print_signals(
+                    stock_code, stock_name, score, positive_signals, negative_signals
                 )
 
             return score
@@ -317,25 +649,59 @@ class StockScreener:
             print(f'预测价格时出错: {str(e)}')
             return None
 
+    def _print_signals(
+        self, stock_code, stock_name, score, positive_signals, negative_signals
+    ):
+        p_str = '+'.join([f'{k}({v})' for k, v in positive_signals.items()])
+        n_str = '+'.join([f'{k}({v})' for k, v in negative_signals.items()])
+        print(
+            f'股票 {stock_code} ({stock_name}) 得分: {score:.2f} '
+            f'正向信号: {p_str} 负向信号: {n_str}'
+        )
+
+    def _fetch_history(self, stock_code):
+        try:
+            # 获取K线数据，实时数据源会优先读取本地缓存，周线和月线由日K线汇总
+            hist_data = recent_history(self.provider, stock_code, period=self.period)
+            return None if hist_data.empty else hist_data
+
+        except Exception as e:
+            print(f'获取股票 {stock_code} K线数据时出错: {str(e)}')
+            return None
+
+    def _build_result(self, stock, score, price_prediction):
+        # 字段顺序与 RESULT_TITLES 一致
+        result = [
+            stock['代码'],
+            stock['名称'],
+            score,
+            float(stock['最新价']),
+            float(stock['涨跌幅']),
+        ]
+
+        if price_prediction:
+            result.extend(
+                [
+                    price_prediction['预测最高价'],
+                    price_prediction['预测最低价'],
+                    price_prediction['预测幅度'],
+                    price_prediction['成交量比'],
+                ]
+            )
+        else:
+            result.extend([0, 0, 0, 0])
+
+        result.extend(stock[col] for col in RESULT_COLUMNS)
+        return StockResult(*result)
+
     def _process_single_stock(self, stock):
+        """逐只股票获取K线并评分，选股流程使用 scoring 模块批量计算"""
         try:
             stock_code = stock['代码']
             stock_name = stock['名称']
-            current_price = float(stock['最新价'])
-            change_pct = float(stock['涨跌幅'])
-
-            # 修改为获取日K线数据
-            hist_data = ak.stock_zh_a_hist(
-                symbol=stock_code,
-                period='daily',  # 改为日级别
-                start_date=(pd.Timestamp.now() - pd.Timedelta(days=120)).strftime(
-                    '%Y%m%d'
-                ),  # 获取更长时间的历史数据
-                end_date=pd.Timestamp.now().strftime('%Y%m%d'),
-                adjust='qfq',
-            )
 
-            if hist_data.empty:
+            hist_data = self._fetch_history(stock_code)
+            if hist_data is None:
                 return None
 
             # 先进行价格预测
@@ -347,32 +713,7 @@ class StockScreener:
             )
 
             if score > 0:
-                # 把 stock 放在最前面
-                result = [stock_code, stock_name, score, current_price, change_pct]
-
-                if price_prediction:
-                    result.extend(
-                        [
-                            price_prediction['预测最高价'],
-                            price_prediction['预测最低价'],
-                            price_prediction['预测幅度'],
-                            price_prediction['成交量比'],
-                        ]
-                    )
-                else:
-                    result.extend([0, 0, 0, 0])
-
-                result.append(stock['今开'])
-                result.append(stock['昨收'])
-                result.append(stock['涨速'])
-                result.append(stock['5分钟涨跌'])
-                result.append(stock['60日涨跌幅'])
-                result.append(stock['年初至今涨跌幅'])
-                result.append(stock['换手率'])
-                result.append(stock['总市值'])
-                result.append(stock['流通市值'])
-                result.append(stock['振幅'])
-                return result
+                return self._build_result(stock, score, price_prediction)
             return None
 
         except Exception as e:
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from astock_assistant.backtest import load_panel, run_backtest
+from astock_assistant.providers import SyntheticProvider
+from astock_assistant.scoring import OHLCVPanel, score_panel
+
+
+def synthetic_panel():
+    provider = SyntheticProvider(
+        n_symbols=120, n_days=200, seed=3, end_date='2024-12-31'
+    )
+    return load_panel(provider, provider.symbols, '20000101', '20241231')
+
+
+def test_full_series_scores_match_truncated_history():
+    """测试整段序列上的逐日评分与截断到当天后的评分相同"""
+    panel = synthetic_panel()
+    n_days = panel.shape[1]
+    as_of = np.arange(n_days)
+    scores = score_panel(panel, as_of)
+
+    for t in (30, 100, n_days - 2):
+        truncated = OHLCVPanel(
+            panel.open[:, : t + 1],
+            panel.high[:, : t + 1],
+            panel.low[:, : t + 1],
+            panel.close[:, : t + 1],
+            panel.volume[:, : t + 1],
+            lengths=np.maximum(panel.lengths - (n_days - 1 - t), 0),
+        )
+        np.testing.assert_allclose(scores[:, t], score_panel(truncated), atol=1e-9)
+
+
+def test_sharded_report_matches_single_process():
+    """测试分片并行的报表与单进程结果一致"""
+    panel = synthetic_panel()
+    single = run_backtest(panel, workers=1)
+    sharded = run_backtest(panel, workers=2, shard_size=25)
+    for name in ('buckets', 'signals', 'coverage'):
+        pd.testing.assert_frame_equal(single[name], sharded[name])
+    assert single['buckets'].loc['全部', '样本数'] > 0
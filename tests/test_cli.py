@@ -0,0 +1,50 @@
+import json
+import subprocess
+import sys
+
+import pandas as pd
+from astock_assistant.cli import main
+from astock_assistant.config.settings import settings
+from astock_assistant.providers import SyntheticProvider
+from astock_assistant.results import RESULT_TITLES
+
+
+def test_cli_writes_parquet(tmp_path, monkeypatch):
+    """测试命令行选股把结果写为 Parquet"""
+    monkeypatch.setattr(settings, 'SYNTHETIC_SYMBOLS', 300)
+    output = tmp_path / 'results.parquet'
+    argv = ['--provider', 'synthetic', '--format', 'parquet', '-o', str(output)]
+    assert main(argv) == 0
+
+    df = pd.read_parquet(output)
+    assert list(df.columns) == RESULT_TITLES
+    assert len(df) and df['推荐指数'].is_monotonic_decreasing
+
+
+def test_cli_fails_without_candidates_or_on_error(tmp_path, monkeypatch):
+    """测试没有候选股票或选股出错时以非零状态退出，不写结果"""
+    monkeypatch.setattr(settings, 'SYNTHETIC_SYMBOLS', 300)
+    output = tmp_path / 'results.json'
+    rules = tmp_path / 'none.json'
+    rules.write_text(json.dumps({'filters': ['最新价 < 0']}), encoding='utf-8')
+    argv = ['--provider', 'synthetic', '-o', str(output)]
+    assert main([*argv, '--rules', str(rules)]) == 1
+
+    def fail(self):
+        raise ConnectionError('行情接口不可用')
+
+    monkeypatch.setattr(SyntheticProvider, 'get_spot', fail)
+    assert main(argv) == 1
+    assert not output.exists()
+
+
+def test_screening_does_not_import_heavy_modules():
+    """测试选股路径不加载 akshare、plotly、openpyxl 和 streamlit"""
+    code = (
+        'import sys, astock_assistant.cli, astock_assistant.stock_screener, '
+        'astock_assistant.stock_detail\n'
+        "print([m for m in ('akshare', 'plotly', 'openpyxl', 'streamlit') "
+        'if m in sys.modules])'
+    )
+    output = subprocess.check_output([sys.executable, '-c', code], text=True)
+    assert output.strip() == '[]'
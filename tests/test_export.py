@@ -0,0 +1,50 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from astock_assistant.export import (
+    EXPORT_FORMATS,
+    export_results,
+    results_digest,
+)
+
+
+def _results():
+    return pd.DataFrame(
+        {
+            '股票代码': ['600000', '000001'],
+            '股票名称': ['浦发银行', '平安银行'],
+            '推荐指数': [85.0, 62.5],
+            '总市值': [2.1e11, np.nan],
+        }
+    )
+
+
+def test_excel_export_streams_rows_and_sizes_columns():
+    """测试 Excel 导出的内容、空值和列宽"""
+    df = _results()
+    workbook = load_workbook(io.BytesIO(export_results(df, 'Excel')))
+    worksheet = workbook['选股结果']
+    rows = list(worksheet.values)
+    assert rows[0] == tuple(df.columns)
+    assert rows[1] == ('600000', '浦发银行', 85, 2.1e11)
+    assert rows[2][3] is None
+    assert worksheet.column_dimensions['B'].width == 6
+    assert worksheet.column_dimensions['D'].width == len(str(2.1e11)) + 2
+
+
+def test_all_formats_round_trip():
+    """测试各导出格式都能读回相同的数据"""
+    df = _results()
+    data = {fmt: export_results(df, fmt) for fmt in EXPORT_FORMATS}
+    csv = pd.read_csv(io.BytesIO(data['CSV']), dtype={'股票代码': str})
+    parquet = pd.read_parquet(io.BytesIO(data['Parquet']))
+    records = json.loads(data['JSON'])
+    pd.testing.assert_frame_equal(csv, df)
+    pd.testing.assert_frame_equal(parquet, df)
+    assert records[0]['股票名称'] == '浦发银行'
+
+    assert results_digest([['600000', 85.0]]) == results_digest([['600000', 85.0]])
+    assert results_digest([['600000', 85.0]]) != results_digest([['600000', 86.0]])
@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+import pytest
+from astock_assistant.fetcher import AsyncFetcher, TokenBucket
+
+
+@pytest.fixture
+def fetcher():
+    fetcher = AsyncFetcher(
+        concurrency=4, rate_limit=0, timeout=0.2, max_retries=2, backoff=0.01
+    )
+    yield fetcher
+    fetcher.close()
+
+
+class Flaky:
+    """前几次调用失败的假接口"""
+
+    def __init__(self, failures, delay=0.0):
+        self.failures = failures
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, value):
+        self.calls += 1
+        if self.calls <= self.failures:
+            time.sleep(self.delay)
+            if not self.delay:
+                raise ConnectionError('upstream error')
+        return value * 2
+
+
+def test_call_retries_until_success(fetcher):
+    """测试失败后退避重试"""
+    func = Flaky(failures=2)
+    assert fetcher.call(func, 21) == 42
+    assert func.calls == 3
+
+
+def test_call_raises_after_max_retries(fetcher):
+    """测试超过重试次数后抛出原始异常"""
+    with pytest.raises(ConnectionError):
+        fetcher.call(Flaky(failures=5), 1)
+
+
+def test_fetch_times_out_slow_request(fetcher):
+    """测试慢请求超时后重试"""
+    func = Flaky(failures=1, delay=0.5)
+    assert asyncio.run(fetcher.fetch(func, 1)) == 2
+    assert func.calls == 2
+
+
+def test_gather_keeps_order(fetcher):
+    """测试并发结果与输入一一对应，失败位置为 None"""
+
+    def job(value):
+        if value == 3:
+            raise ValueError('bad symbol')
+        return value * 10
+
+    assert asyncio.run(fetcher.gather(job, [1, 2, 3, 4])) == [10, 20, None, 40]
+
+
+def test_token_bucket_limits_rate():
+    """测试令牌用完后需要等待"""
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
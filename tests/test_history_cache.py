@@ -0,0 +1,102 @@
+import pandas as pd
+import pytest
+from astock_assistant import history_cache
+from astock_assistant.history_cache import HistoryCache, TradeCalendar
+
+TRADE_DATES = pd.bdate_range('2024-11-01', '2024-12-31')
+
+
+def make_bars(dates, close=10.0):
+    return pd.DataFrame(
+        {
+            '日期': [d.date() for d in dates],
+            '开盘': close,
+            '收盘': close,
+            '最高': close,
+            '最低': close,
+            '成交量': 1000,
+        }
+    )
+
+
+class FakeUpstream:
+    """记录调用次数的假行情接口"""
+
+    def __init__(self):
+        self.calls = []
+        self.close = 10.0
+
+    def __call__(self, symbol, period, start_date, end_date, adjust):
+        self.calls.append((start_date, end_date))
+        dates = TRADE_DATES[
+            (TRADE_DATES >= pd.Timestamp(start_date))
+            & (TRADE_DATES <= pd.Timestamp(end_date))
+        ]
+        return make_bars(dates, self.close)
+
+
+@pytest.fixture
+def upstream():
+    return FakeUpstream()
+
+
+@pytest.fixture
+def cache(tmp_path, upstream):
+    return HistoryCache(
+        cache_dir=tmp_path,
+        calendar=TradeCalendar(tmp_path, dates=TRADE_DATES),
+        fetch_func=upstream,
+    )
+
+
+def set_now(monkeypatch, value):
+    monkeypatch.setattr(history_cache, 'market_now', lambda: pd.Timestamp(value))
+
+
+def test_history_cache_fetches_only_new_bars(cache, upstream, monkeypatch):
+    """测试第二天只增量请求新增的交易日"""
+    set_now(monkeypatch, '2024-12-02 20:00')
+    df = cache.get_history('600000', '2024-11-01', '2024-12-02')
+    assert len(df) == 22
+    assert len(upstream.calls) == 1
+
+    set_now(monkeypatch, '2024-12-03 20:00')
+    df = cache.get_history('600000', '2024-11-01', '2024-12-03')
+    assert len(df) == 23
+    assert upstream.calls[-1] == ('20241202', '20241203')
+
+
+def test_history_cache_skips_fetch_on_weekend(cache, upstream, monkeypatch):
+    """测试收盘后和周末不再请求上游"""
+    set_now(monkeypatch, '2024-12-06 20:00')
+    cache.get_history('600000', '2024-11-01', '2024-12-06')
+    set_now(monkeypatch, '2024-12-07 10:00')
+    df = cache.get_history('600000', '2024-11-01', '2024-12-07')
+    assert len(upstream.calls) == 1
+    assert pd.Timestamp(df['日期'].iloc[-1]) == pd.Timestamp('2024-12-06')
+
+
+def test_history_cache_refetches_after_adjustment(cache, upstream, monkeypatch):
+    """测试前复权价格变化时整段重新获取"""
+    set_now(monkeypatch, '2024-12-02 20:00')
+    cache.get_history('600000', '2024-11-01', '2024-12-02')
+    upstream.close = 9.5
+    set_now(monkeypatch, '2024-12-03 20:00')
+    df = cache.get_history('600000', '2024-11-01', '2024-12-03')
+    assert (df['收盘'] == 9.5).all()
+    assert len(upstream.calls) == 3
+
+
+def test_history_cache_extends_after_early_end(cache, upstream, monkeypatch):
+    """测试提前结束的请求不会截断之后更长区间的请求"""
+    set_now(monkeypatch, '2024-12-20 20:00')
+    df = cache.get_history('600000', '2024-11-01', '2024-11-15')
+    assert pd.Timestamp(df['日期'].iloc[-1]) == pd.Timestamp('2024-11-15')
+
+    df = cache.get_history('600000', '2024-11-01', '2024-12-20')
+    assert pd.Timestamp(df['日期'].iloc[-1]) == pd.Timestamp('2024-12-20')
+    assert upstream.calls[-1] == ('20241115', '20241220')
+
+    # 已同步到 12-20 后，较短的请求不再访问上游
+    cache.get_history('600000', '2024-11-01', '2024-11-15')
+    assert len(upstream.calls) == 2
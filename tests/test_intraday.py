@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from astock_assistant.intraday import IntradayMonitor, MinuteRing
+from astock_assistant.providers import SyntheticProvider
+
+
+def test_ring_overwrites_oldest_and_updates_last_bar():
+    """测试环形缓冲区写满后覆盖最早的K线，同一分钟的新数据覆盖最后一根"""
+    ring = MinuteRing(capacity=4)
+    times = pd.date_range('2024-12-31 09:31', periods=6, freq='min').to_numpy()
+    values = np.tile(np.arange(1.0, 7.0), (6, 1))
+    assert ring.update(times[:3], values[:, :3]) == 3
+    assert ring.update(times[2:], values[:, 2:]) == 3
+    assert len(ring) == 4
+    np.testing.assert_array_equal(ring.tail(4)[3], [3.0, 4.0, 5.0, 6.0])
+    assert ring.cum_volume == 21.0
+
+    updated = values[:, -1:] * 2
+    assert ring.update(times[-1:], updated) == 1
+    assert ring.tail(1)[3, 0] == 12.0
+    assert ring.cum_volume == 27.0
+    assert ring.update(times[-1:], updated) == 0
+
+
+class CountingProvider(SyntheticProvider):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bars = 0
+
+    def get_minute_bars(self, symbol, start=None, end=None):
+        df = super().get_minute_bars(symbol, start, end)
+        self.bars += len(df)
+        return df
+
+
+def test_refresh_only_fetches_new_bars():
+    """测试增量刷新只获取新K线，结果与一次性读取全部K线相同"""
+    provider = CountingProvider(n_symbols=20, seed=6, end_date='2024-12-31')
+    symbols = provider.symbols
+    provider.set_now('2024-12-31 10:30')
+    monitor = IntradayMonitor(provider)
+    monitor.refresh(symbols)
+    assert provider.bars == 60 * len(symbols)
+
+    provider.bars = 0
+    provider.set_now('2024-12-31 13:05')
+    incremental = monitor.refresh(symbols)
+    # 每只股票重新取一次上次的最后一根，加上新到的 60 + 5 根
+    assert provider.bars == 66 * len(symbols)
+
+    full = IntradayMonitor(provider).refresh(symbols)
+    pd.testing.assert_frame_equal(incremental, full)
+    assert incremental['日内评分'].between(0, 100).all()
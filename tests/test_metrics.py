@@ -0,0 +1,100 @@
+import time
+import urllib.request
+
+from astock_assistant.fetcher import AsyncFetcher
+from astock_assistant.metrics import Metrics, metrics, start_http_server
+from astock_assistant.providers import SyntheticProvider
+from astock_assistant.rules import compile_rules, merge_rules
+from astock_assistant.shared_cache import SharedCache
+from astock_assistant.stock_screener import StockScreener
+
+
+def test_render_prometheus_text():
+    """测试计数器和直方图按 Prometheus 文本格式输出"""
+    registry = Metrics(buckets=(0.1, 1.0))
+    registry.inc('astock_fetch_retries_total', func='stock_zh_a_hist')
+    registry.observe('astock_fetch_seconds', 0.5, func='stock_zh_a_hist')
+    registry.observe('astock_fetch_seconds', 2.0, func='stock_zh_a_hist')
+
+    text = registry.render()
+    assert '# TYPE astock_fetch_retries_total counter' in text
+    assert 'astock_fetch_retries_total{func="stock_zh_a_hist"} 1' in text
+    assert 'astock_fetch_seconds_bucket{func="stock_zh_a_hist",le="0.1"} 0' in text
+    assert 'astock_fetch_seconds_bucket{func="stock_zh_a_hist",le="1.0"} 1' in text
+    assert 'astock_fetch_seconds_bucket{func="stock_zh_a_hist",le="+Inf"} 2' in text
+    assert 'astock_fetch_seconds_count{func="stock_zh_a_hist"} 2' in text
+
+    server = start_http_server(port=0, registry=registry)
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+        with urllib.request.urlopen(url) as response:
+            assert response.read().decode('utf-8') == registry.render()
+    finally:
+        server.shutdown()
+
+
+def test_screen_records_stage_times():
+    """测试选股记录各阶段耗时和汇总指标"""
+    provider = SyntheticProvider(n_symbols=300, seed=7, end_date='2024-12-31')
+    screener = StockScreener(provider=provider)
+    screens = metrics.counter('astock_screens_total')
+
+    results = screener.screen_stocks()
+
+    assert metrics.counter('astock_screens_total') == screens + 1
+    for stage in ('get_spot', 'fetch_histories', 'score_panel', 'screen'):
+        assert screener.stage_times[stage] >= 0
+    assert 'astock_screen_results ' + str(len(results)) in metrics.render()
+
+
+def test_full_universe_screen_and_time_budget():
+    """测试不限候选数量时分析过滤后的全部股票，超出时间预算时跳过剩余股票"""
+    provider = SyntheticProvider(n_symbols=400, seed=7, end_date='2024-12-31')
+    screener = StockScreener(provider=provider, candidate_limit=0)
+    screener.screen_stocks()
+
+    n_filtered = len(screener._filter_stocks(screener._get_spot()))
+    assert n_filtered > 3
+    assert screener.stage_items['score_panel'] == n_filtered
+    capped = StockScreener(provider=provider, candidate_limit=3)
+    capped.screen_stocks()
+    assert capped.stage_items['score_panel'] == 3
+    assert set(screener.throughput()) >= {'fetch_histories', 'score_panel', 'screen'}
+
+
+class SlowProvider(SyntheticProvider):
+    """每次K线请求都较慢并记录请求了哪些股票的数据源"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.fetched = []
+
+    def get_history(self, symbol, *args, **kwargs):
+        self.fetched.append(symbol)
+        time.sleep(0.02)
+        return super().get_history(symbol, *args, **kwargs)
+
+
+def test_time_budget_scores_histories_fetched_before_cutoff():
+    """测试时间预算用完后，之前已获取K线的股票照常评分和产出"""
+    rules = compile_rules(merge_rules({'filters': []}))
+    provider = SlowProvider(n_symbols=200, seed=7, end_date='2024-12-31')
+    full = StockScreener(provider=provider, rules=rules).screen_stocks()
+
+    provider.fetched.clear()
+    limited = StockScreener(
+        provider=provider,
+        fetcher=AsyncFetcher(concurrency=1),
+        cache=SharedCache(ttl=60),
+        rules=rules,
+        time_budget=1.0,
+    )
+    results = limited.screen_stocks()
+    # 只有一部分股票的结果不写入共享缓存
+    assert limited.cache.get(limited.results_key()) is None
+
+    fetched = set(provider.fetched)
+    assert 0 < limited.skipped < 200
+    assert len(fetched) + limited.skipped == 200
+    expected = [r for r in full if r.code in fetched]
+    assert expected and list(results) == expected
@@ -0,0 +1,49 @@
+import numpy as np
+from astock_assistant.backtest import load_panel
+from astock_assistant.panel_pool import ScoringPool, evaluate_panel
+from astock_assistant.providers import SyntheticProvider
+from astock_assistant.rules import compile_rules, merge_rules
+
+
+def test_pool_matches_in_process_scoring():
+    """测试多进程评分与当前进程内评分的结果逐位相同"""
+    provider = SyntheticProvider(
+        n_symbols=200, n_days=120, seed=5, end_date='2024-12-31'
+    )
+    panel = load_panel(provider, provider.symbols, '20000101', '20241231')
+    # 规则文件中的信号分值可以是小数
+    fractional = compile_rules(
+        merge_rules(
+            {
+                'signals': [
+                    {
+                        'name': '收阳',
+                        'side': 'positive',
+                        'when': 'close > open',
+                        'points': 2.5,
+                    },
+                    {
+                        'name': '放量',
+                        'side': 'negative',
+                        'points': 'latest_vol_change * 1.5',
+                    },
+                ]
+            }
+        )
+    )
+
+    pool = ScoringPool(workers=2, min_rows=30)
+    try:
+        for rules in (None, fractional):
+            expected = evaluate_panel(panel, rules)
+            scores, positive, negative, predictions = pool.evaluate(panel, rules)
+
+            np.testing.assert_array_equal(scores, expected[0])
+            for actual, reference in zip(
+                (positive, negative, predictions), expected[1:]
+            ):
+                assert actual.keys() == reference.keys()
+                for key in reference:
+                    np.testing.assert_array_equal(actual[key], reference[key])
+    finally:
+        pool.close()
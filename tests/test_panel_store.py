@@ -0,0 +1,58 @@
+import numpy as np
+from astock_assistant.panel_store import PanelStore
+from astock_assistant.providers import SyntheticProvider, recent_history
+from astock_assistant.run_histories import RunHistories
+from astock_assistant.scoring import OHLCVPanel
+from astock_assistant.stock_screener import StockScreener
+
+
+def test_panel_store_matches_fetched_histories(tmp_path):
+    """测试面板切片与逐只获取的K线相同，选股结果不变"""
+    provider = SyntheticProvider(n_symbols=200, seed=3, end_date='2024-12-31')
+    store = PanelStore(tmp_path)
+    market = store.build(provider)
+    assert len(market) == 200 and store.fresh_panel(provider) is market
+
+    symbols = market.symbols[:50]
+    frames = [recent_history(provider, s) for s in symbols]
+    # 模拟停牌：去掉中间几根K线
+    frames[1] = frames[1].drop(index=range(30, 35)).reset_index(drop=True)
+    # 成交量超过 float32 能精确表示的范围
+    frames[2] = frames[2].assign(成交量=frames[2]['成交量'] + 2**24 + 1)
+    market = store.write(symbols, frames, 'SyntheticProvider', provider.now())
+    expected = OHLCVPanel.from_frames(frames)
+    panel = store.recent_panel(provider, symbols)
+    assert (panel.lengths == expected.lengths).all()
+    for field in ('open', 'high', 'low', 'close', 'volume'):
+        assert np.array_equal(
+            getattr(panel, field), getattr(expected, field), equal_nan=True
+        )
+
+    history = store.recent_history(provider, symbols[1])
+    columns = ['开盘', '收盘', '最高', '最低', '成交量']
+    assert np.array_equal(history[columns].to_numpy(), frames[1][columns].to_numpy())
+    close = market.arrays['收盘']
+    assert np.shares_memory(market.rows(symbols[1])['收盘'], close)
+
+    store.build(provider)
+    fetched = StockScreener(provider=provider, history_store=RunHistories())
+    stored = StockScreener(
+        provider=provider, panel_store=store, history_store=RunHistories()
+    )
+    assert fetched.screen_stocks().to_rows() == stored.screen_stocks().to_rows()
+    assert 'load_panel' in stored.stage_times
+    assert 'fetch_histories' not in stored.stage_times
+
+
+def test_stale_panel_falls_back_to_provider(tmp_path):
+    """测试面板缺少最新K线时不使用，选股照常从数据源获取"""
+    provider = SyntheticProvider(n_symbols=100, seed=3, end_date='2024-12-31')
+    store = PanelStore(tmp_path)
+    symbols = provider.symbols
+    frames = [recent_history(provider, s).iloc[:-1] for s in symbols]
+    store.write(symbols, frames, 'SyntheticProvider', provider.now())
+
+    assert store.open() is not None and store.fresh_panel(provider) is None
+    screener = StockScreener(provider=provider, panel_store=store)
+    screener.screen_stocks()
+    assert 'fetch_histories' in screener.stage_times
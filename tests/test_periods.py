@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from astock_assistant import history_cache
+from astock_assistant.periods import PeriodBars, resample_bars
+from astock_assistant.providers import (
+    CachedProvider,
+    SyntheticProvider,
+    recent_history,
+)
+from astock_assistant.rules import compile_rules, merge_rules
+from astock_assistant.run_histories import RunHistories
+from astock_assistant.stock_detail import create_stock_charts, figure_cache
+from astock_assistant.stock_screener import StockScreener
+
+
+def test_weekly_bars_match_calendar_weeks():
+    """测试周线按自然周汇总，增量重算与整体重算结果相同"""
+    provider = SyntheticProvider(n_symbols=5, seed=1, end_date='2024-12-31')
+    daily = provider.get_history(provider.symbols[0], adjust='qfq')
+    weeks = pd.to_datetime(daily['日期']).dt.to_period('W-SUN')
+    expected = daily.groupby(weeks).agg(
+        {'开盘': 'first', '收盘': 'last', '最高': 'max', '最低': 'min', '成交量': 'sum'}
+    )
+    weekly = resample_bars(daily, 'weekly')
+    for col in expected.columns:
+        assert np.allclose(weekly[col], expected[col])
+    assert np.allclose(
+        weekly['涨跌幅'].iloc[1:],
+        np.round(expected['收盘'].pct_change().iloc[1:] * 100, 2),
+    )
+
+    # 日K线逐根追加，只重算最后一周
+    bars = PeriodBars()
+    for n in range(len(daily) - 20, len(daily) + 1):
+        pd.testing.assert_frame_equal(
+            bars.resample(('test',), daily.iloc[:n], 'weekly'),
+            resample_bars(daily.iloc[:n], 'weekly'),
+        )
+    # 前复权价格整体变化后全部重算
+    adjusted = daily.assign(收盘=daily['收盘'] * 0.9)
+    pd.testing.assert_frame_equal(
+        bars.resample(('test',), adjusted, 'weekly'),
+        resample_bars(adjusted, 'weekly'),
+    )
+
+
+def test_weekly_screen_and_charts_use_daily_bars(monkeypatch, tmp_path):
+    """测试周线选股和图表只向上游请求日K线"""
+    monkeypatch.setattr(
+        history_cache, 'market_now', lambda: pd.Timestamp('2024-12-31 16:00')
+    )
+    upstream = SyntheticProvider(n_symbols=300, seed=3, end_date='2024-12-31')
+    get_history = upstream.get_history
+    periods = []
+
+    def record_period(symbol, period='daily', *args, **kwargs):
+        periods.append(period)
+        return get_history(symbol, period, *args, **kwargs)
+
+    monkeypatch.setattr(upstream, 'get_history', record_period)
+    provider = CachedProvider(upstream, cache_dir=tmp_path)
+    store = RunHistories(max_runs=1)
+    screener = StockScreener(
+        provider=provider,
+        history_store=store,
+        rules=compile_rules(merge_rules({'filters': []})),
+        period='weekly',
+    )
+    results = screener.screen_stocks()
+    assert results
+    assert set(periods) == {'daily'}
+
+    monkeypatch.setattr('astock_assistant.stock_detail.run_histories', store)
+    figure_cache.clear()
+    symbol = results[0].code
+    df = store.get(symbol, screener.run, 'weekly')
+    assert df.equals(recent_history(provider, symbol, period='weekly'))
+    assert store.get(symbol, screener.run) is None
+    fig = create_stock_charts(
+        symbol=symbol, provider=provider, run=screener.run, period='weekly'
+    )
+    assert fig.layout.title.text == '周K线图表'
@@ -0,0 +1,38 @@
+import json
+import time
+
+from astock_assistant.profiler import profile
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+
+def test_profile_writes_speedscope_and_summary(tmp_path):
+    """测试开启采样后写出 speedscope 文件和热点摘要"""
+    with profile('busy', enabled=True, directory=tmp_path) as profiler:
+        busy_loop(0.3)
+
+    assert profiler.samples > 10
+    own, _ = profiler.hot_spots(limit=3)
+    assert own[0][0][0] == 'busy_loop'
+
+    flame_path = next(tmp_path.glob('profile-busy-*.speedscope.json'))
+    data = json.loads(flame_path.read_text(encoding='utf-8'))
+    frames = data['shared']['frames']
+    sampled = data['profiles'][0]
+    assert sampled['type'] == 'sampled'
+    assert len(sampled['samples']) == len(sampled['weights'])
+    assert all(0 <= i < len(frames) for stack in sampled['samples'] for i in stack)
+    summary = next(tmp_path.glob('profile-busy-*.txt')).read_text(encoding='utf-8')
+    assert 'busy_loop (test_profiler.py' in summary
+
+
+def test_profile_disabled_does_nothing(tmp_path):
+    with profile('idle', enabled=False, directory=tmp_path) as profiler:
+        pass
+    assert profiler is None and not list(tmp_path.iterdir())
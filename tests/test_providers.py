@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+from astock_assistant import history_cache
+from astock_assistant.providers import (
+    CachedProvider,
+    RecordingProvider,
+    ReplayProvider,
+    SyntheticProvider,
+    recent_history,
+)
+from astock_assistant.stock_screener import StockScreener
+
+
+@pytest.fixture
+def synthetic():
+    return SyntheticProvider(n_symbols=300, seed=7, end_date='2024-12-31')
+
+
+def test_synthetic_provider_is_deterministic(synthetic):
+    """测试同样的种子生成同样的行情"""
+    other = SyntheticProvider(n_symbols=300, seed=7, end_date='2024-12-31')
+    pd.testing.assert_frame_equal(synthetic.get_spot(), other.get_spot())
+    symbol = synthetic.symbols[0]
+    pd.testing.assert_frame_equal(
+        recent_history(synthetic, symbol), recent_history(other, symbol)
+    )
+
+
+def test_replay_provider_serves_recording(synthetic, tmp_path):
+    """测试录制后的数据可以原样回放"""
+    recorder = RecordingProvider(synthetic, tmp_path)
+    spot = recorder.get_spot()
+    histories = {s: recent_history(recorder, s) for s in synthetic.symbols[:5]}
+    minutes = recorder.get_minute_bars(synthetic.symbols[0])
+
+    replay = ReplayProvider(tmp_path)
+    assert replay.now() == synthetic.now()
+    pd.testing.assert_frame_equal(replay.get_spot(), spot)
+    for symbol, df in histories.items():
+        pd.testing.assert_frame_equal(recent_history(replay, symbol), df)
+
+    # 日内监控在回放数据上同样可以获取分钟K线
+    symbol = synthetic.symbols[0]
+    pd.testing.assert_frame_equal(replay.get_minute_bars(symbol), minutes)
+    start = minutes['时间'].iloc[-10]
+    pd.testing.assert_frame_equal(
+        replay.get_minute_bars(symbol, start=start),
+        synthetic.get_minute_bars(symbol, start=start),
+    )
+
+
+def test_screener_runs_offline(synthetic):
+    """测试选股流程可以在合成数据上离线运行"""
+    results = StockScreener(provider=synthetic).screen_stocks()
+    assert results
+    scores = [r.score for r in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_screen_skips_failed_and_empty_histories(synthetic, monkeypatch):
+    """测试个别股票K线获取失败或为空时，其余股票照常评分"""
+    expected = StockScreener(provider=synthetic).screen_stocks()
+    codes = [r.code for r in expected]
+    failing, empty = codes[0], codes[1]
+    get_history = synthetic.get_history
+
+    def flaky(symbol, *args, **kwargs):
+        if symbol == failing:
+            raise ConnectionError('上游超时')
+        if symbol == empty:
+            return pd.DataFrame()
+        return get_history(symbol, *args, **kwargs)
+
+    monkeypatch.setattr(synthetic, 'get_history', flaky)
+    screener = StockScreener(provider=synthetic)
+    assert [r.code for r in screener.screen_stocks()] == codes[2:]
+    streamed = [result.code for result, _ in screener.iter_screen_stocks()]
+    assert sorted(streamed) == sorted(codes[2:])
+
+
+class SlowProvider(SyntheticProvider):
+    """每次K线请求都较慢并记录次数的数据源"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.history_calls = 0
+
+    def get_history(self, *args, **kwargs):
+        self.history_calls += 1
+        time.sleep(0.2)
+        return super().get_history(*args, **kwargs)
+
+
+def test_concurrent_history_requests_are_coalesced(tmp_path, monkeypatch):
+    """测试盘中多个线程同时请求同一只股票的K线时只请求上游一次"""
+    monkeypatch.setattr(
+        history_cache, 'market_now', lambda: pd.Timestamp('2024-12-31 10:00')
+    )
+    upstream = SlowProvider(n_symbols=10, seed=7, end_date='2024-12-31')
+    provider = CachedProvider(upstream, cache_dir=tmp_path)
+    symbol = upstream.symbols[0]
+    frames = [None] * 8
+
+    def fetch(i):
+        frames[i] = provider.get_history(symbol, start_date='20241001')
+
+    threads = [threading.Thread(target=fetch, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert upstream.history_calls == 1
+    assert all(df is frames[0] for df in frames) and not frames[0].empty
@@ -0,0 +1,32 @@
+import pickle
+
+import pytest
+from astock_assistant.results import RESULT_TITLES, ScreenResults, StockResult
+
+
+def _row(code, score):
+    return [code, '测试', score, 10.0, 1.5, 10.5, 9.8, 7.0, 1.2] + [1.0] * 10
+
+
+def test_results_are_indexed_by_code():
+    """测试按股票代码、显示名称和位置访问选股结果"""
+    results = ScreenResults.from_rows([_row('600000', 80.0), _row('000001', 65.0)])
+    record = results.get('000001')
+    assert record.score == 65.0
+    assert record['推荐指数'] == record[2] == 65.0
+    assert results.get('300750') is None
+
+    df = results.frame
+    assert list(df.columns) == RESULT_TITLES
+    assert df['股票代码'].tolist() == ['600000', '000001']
+    assert results.frame is df
+
+    # 保存为 JSON 行后可以原样还原
+    assert ScreenResults.from_rows(results.to_rows()).records == results.records
+    assert pickle.loads(pickle.dumps(record)) == record
+    assert not ScreenResults()
+
+
+def test_result_requires_all_fields():
+    with pytest.raises(ValueError):
+        StockResult('600000', '测试', 80.0)
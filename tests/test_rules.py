@@ -0,0 +1,126 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from astock_assistant.providers import SyntheticProvider, recent_history
+from astock_assistant.rules import RuleError, compile_rules, load_rules, merge_rules
+from astock_assistant.scoring import OHLCVPanel, score_panel
+
+
+def test_spot_filters_and_rank_weights():
+    """测试行情过滤表达式和排序权重"""
+    spot = pd.DataFrame(
+        {
+            '代码': ['600000', '300750', '000001', '600001'],
+            '名称': ['浦发银行', '宁德时代', '*ST平安', '测试'],
+            '最新价': [10.0, 200.0, 12.0, 50.0],
+            '市盈率-动态': [5.0, 30.0, 8.0, -1.0],
+            '换手率': [4.0, 5.0, 6.0, 3.0],
+        }
+    )
+    rules = compile_rules(
+        merge_rules(
+            {
+                'filters': [
+                    "startswith(代码, '00', '60') and not contains(名称, 'ST')",
+                    '5 <= 最新价 <= 100 or `市盈率-动态` < 0',
+                ],
+                'rank': {'换手率': 1.0},
+            }
+        )
+    )
+    filtered = rules.filter(spot)
+    assert filtered['代码'].tolist() == ['600000', '600001']
+    assert rules.rank(filtered)['代码'].tolist() == ['600000', '600001']
+
+
+def test_rule_file_adds_strategy_variant(tmp_path):
+    """测试规则文件只覆盖部分设置，新增信号不需要改代码"""
+    path = tmp_path / 'breakout.json'
+    path.write_text(
+        json.dumps(
+            {
+                'variables': {'prev_high': 'maximum(high[1], high[2])'},
+                'signals': [
+                    {
+                        'name': '突破',
+                        'side': 'positive',
+                        'when': 'close > prev_high',
+                        'points': 30,
+                    }
+                ],
+            },
+            ensure_ascii=False,
+        ),
+        encoding='utf-8',
+    )
+    rules = load_rules(path)
+    assert rules.name == 'breakout'
+    assert rules.filters and rules.rank_weights == compile_rules().rank_weights
+
+    provider = SyntheticProvider(n_symbols=50, seed=5, end_date='2024-12-31')
+    frames = [recent_history(provider, s) for s in provider.symbols]
+    panel = OHLCVPanel.from_frames(frames)
+    scores, positive, _ = score_panel(panel, with_signals=True, rules=rules)
+
+    breakout = np.array(
+        [df['收盘'].iloc[-1] > df['最高'].iloc[-3:-1].max() for df in frames]
+    )
+    assert (positive['突破'] > 0).tolist() == breakout.tolist()
+    assert set(np.unique(scores)) <= {0.0, 30.0 * 1.1}
+
+
+@pytest.mark.parametrize(
+    'when',
+    [
+        'close > close[5]',  # 滞后超出面板左端
+        'close > sma(close, 3)[4]',  # 窗口函数的滞后超出面板左端
+    ],
+)
+def test_lags_before_first_bar_do_not_look_ahead(when):
+    """测试回测中评分日靠前时，超出面板左端的取值为空，不会取到未来的K线"""
+    rules = compile_rules(
+        merge_rules(
+            {
+                'scoring': {'min_bars': 1},
+                'signals': [
+                    {'name': '测试', 'side': 'positive', 'when': when, 'points': 30}
+                ],
+            }
+        )
+    )
+    provider = SyntheticProvider(n_symbols=30, seed=5, end_date='2024-12-31')
+    panel = OHLCVPanel.from_frames(
+        [recent_history(provider, s) for s in provider.symbols]
+    )
+    n_days = panel.shape[1]
+    as_of = np.arange(8)
+    scores = score_panel(panel, as_of, rules=rules)
+
+    # 逐个评分日截断面板后评分，结果应当相同
+    for k in as_of:
+        fields = (panel.open, panel.high, panel.low, panel.close, panel.volume)
+        truncated = OHLCVPanel(
+            *(values[:, : k + 1] for values in fields),
+            lengths=np.maximum(panel.lengths - (n_days - 1 - k), 0),
+        )
+        assert np.array_equal(
+            scores[:, k], score_panel(truncated, rules=rules), equal_nan=True
+        )
+
+
+@pytest.mark.parametrize(
+    'overrides, message',
+    [
+        ({'filters': ['最新价 >']}, '语法错误'),
+        ({'filters': ['最新价.real > 0']}, '不支持的表达式'),
+        ({'filters': ["__import__('os')"]}, '未知函数'),
+        ({'variables': {'a': 'b + 1', 'b': 'a[1]'}}, '循环引用'),
+        ({'variables': {'a': 'missing * 2'}}, '未定义'),
+        ({'variables': {'a': 'count(close > open, 3, 1)'}}, '起止范围'),
+    ],
+)
+def test_invalid_rules_are_rejected(overrides, message):
+    with pytest.raises(RuleError, match=message):
+        compile_rules(merge_rules(overrides))
@@ -0,0 +1,32 @@
+import pandas as pd
+from astock_assistant.history_cache import TradeCalendar
+from astock_assistant.providers import SyntheticProvider
+from astock_assistant.scheduler import ResultStore, ScreenScheduler
+from astock_assistant.shared_cache import SharedCache
+from astock_assistant.stock_screener import StockScreener
+
+
+def test_run_once_stores_fresh_version(tmp_path):
+    """测试预计算结果按版本保存，有效期内不再重复选股"""
+    provider = SyntheticProvider(n_symbols=300, seed=7, end_date='2024-12-31')
+    screener = StockScreener(provider=provider, cache=SharedCache(ttl=60))
+    scheduler = ScreenScheduler(
+        screener=screener,
+        store=ResultStore(tmp_path),
+        calendar=TradeCalendar(dates=pd.bdate_range('2024-12-02', '2025-01-31')),
+        interval=60,
+        prefetch=10,
+    )
+    assert scheduler.due()
+
+    record = scheduler.run_once()
+    assert record['results']
+    latest = scheduler.store.latest()
+    assert latest['results'] == record['results']
+    assert pd.Timestamp(latest['market_time']) == provider.now()
+    # 股票详情可以按批次取到这次预计算获取的K线
+    assert scheduler.run_key(latest) == screener.run
+    assert not scheduler.due()
+    # 收盘后生成的结果在下一次开盘前一直有效
+    assert not scheduler.due(pd.Timestamp('2025-01-01 09:00'))
+    assert scheduler.due(pd.Timestamp('2025-01-01 10:00'))
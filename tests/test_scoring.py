@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from astock_assistant.scoring import OHLCVPanel, predict_panel, score_panel, sma
+from astock_assistant.stock_screener import StockScreener
+
+
+def random_history(rng, n_days):
+    """生成价格保留两位小数、成交量为整数手的随机日K线"""
+    close = np.round(20 * np.exp(np.cumsum(rng.normal(0, 0.03, n_days))), 2)
+    open_price = np.round(close * (1 + rng.normal(0, 0.02, n_days)), 2)
+    high = np.round(np.maximum(open_price, close) * (1 + rng.random(n_days) * 0.03), 2)
+    low = np.round(np.minimum(open_price, close) * (1 - rng.random(n_days) * 0.03), 2)
+    volume = rng.integers(10_000, 200_000, n_days) * rng.choice([1, 2, 3], n_days)
+    return pd.DataFrame(
+        {
+            '日期': pd.bdate_range('2024-01-01', periods=n_days).date,
+            '开盘': open_price,
+            '收盘': close,
+            '最高': high,
+            '最低': low,
+            '成交量': volume,
+        }
+    )
+
+
+@pytest.fixture
+def histories():
+    rng = np.random.default_rng(42)
+    return [random_history(rng, int(rng.integers(15, 90))) for _ in range(400)]
+
+
+def test_sma_matches_talib(histories):
+    """测试批量均线与 talib.SMA 逐位一致"""
+    import talib
+
+    panel = OHLCVPanel.from_frames(histories)
+    ma10 = sma(panel.close, 10)
+    for row, df in enumerate(histories):
+        expected = talib.SMA(df['收盘'].values.astype(float), timeperiod=10)
+        np.testing.assert_array_equal(ma10[row, -len(df):], expected)
+
+
+def test_score_panel_matches_per_stock(histories):
+    """测试批量评分与逐只股票评分结果完全一致"""
+    screener = StockScreener()
+    scores = score_panel(OHLCVPanel.from_frames(histories))
+    expected = [screener._calculate_score(df) for df in histories]
+    assert scores.tolist() == expected
+    assert (scores > 0).sum() > 10
+
+
+def test_predict_panel_matches_per_stock(histories):
+    """测试批量价格预测与逐只股票预测结果完全一致"""
+    screener = StockScreener()
+    predictions = predict_panel(OHLCVPanel.from_frames(histories))
+    for row, df in enumerate(histories):
+        expected = screener._predict_next_day_price(df)
+        for key, value in expected.items():
+            assert predictions[key][row] == value
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+from astock_assistant.providers import SyntheticProvider
+from astock_assistant.shared_cache import SharedCache, SingleFlight
+from astock_assistant.stock_screener import StockScreener
+
+
+def test_concurrent_calls_share_one_computation():
+    """测试同一个键的并发请求只计算一次"""
+    cache = SharedCache(ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'result'
+
+    values = []
+    threads = [
+        threading.Thread(
+            target=lambda: values.append(cache.get_or_compute('key', compute))
+        )
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert values == ['result'] * 8
+    assert len(calls) == 1
+
+
+def test_entries_expire_after_ttl():
+    """测试过期后重新计算"""
+    cache = SharedCache(ttl=0.05)
+    assert cache.get_or_compute('key', lambda: 1) == 1
+    assert cache.get_or_compute('key', lambda: 2) == 1
+    time.sleep(0.06)
+    assert cache.get_or_compute('key', lambda: 3) == 3
+
+
+def test_failures_are_not_cached():
+    """测试计算失败时异常传给调用者，且不写入缓存"""
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do('key', lambda: int('x'))
+    assert not flight.in_flight('key')
+
+    cache = SharedCache(ttl=60)
+    assert cache.get_or_compute('key', lambda: None) is None
+    assert cache.get_or_compute('key', lambda: 5) == 5
+    # 空结果同样不缓存
+    assert cache.get_or_compute('empty', lambda: []) == []
+    assert cache.get_or_compute('empty', lambda: [1]) == [1]
+
+
+def test_empty_screen_is_not_shared(monkeypatch):
+    """测试没有推荐结果的选股不提供给其他会话，下一次请求重新选股"""
+    provider = SyntheticProvider(n_symbols=300, seed=7, end_date='2024-12-31')
+    cache = SharedCache(ttl=60)
+    get_history = provider.get_history
+
+    def too_short(*args, **kwargs):
+        # K线数量不足 min_bars，全部股票不评分
+        return get_history(*args, **kwargs).tail(5)
+
+    monkeypatch.setattr(provider, 'get_history', too_short)
+    assert not StockScreener(provider=provider, cache=cache).screen_stocks()
+
+    monkeypatch.setattr(provider, 'get_history', get_history)
+    assert StockScreener(provider=provider, cache=cache).screen_stocks()
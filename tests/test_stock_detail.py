@@ -0,0 +1,78 @@
+import numpy as np
+from astock_assistant.providers import SyntheticProvider, recent_history
+from astock_assistant.run_histories import RunHistories
+from astock_assistant.stock_screener import StockScreener
+from astock_assistant.stock_detail import (
+    FigureCache,
+    create_stock_charts,
+    downsample_bars,
+    figure_cache,
+)
+
+
+def test_charts_are_cached_by_symbol_and_last_bar():
+    """测试同一只股票、同一根最新K线的图表直接复用"""
+    provider = SyntheticProvider(n_symbols=20, seed=1, end_date='2024-12-31')
+    symbol = provider.symbols[0]
+    df = recent_history(provider, symbol)
+    figure_cache.clear()
+
+    fig = create_stock_charts(df, symbol=symbol)
+    assert create_stock_charts(df, symbol=symbol) is fig
+
+    # 盘中最新K线变化后重新生成
+    updated = df.copy()
+    updated.loc[updated.index[-1], '收盘'] += 0.01
+    assert create_stock_charts(updated, symbol=symbol) is not fig
+
+
+def test_figure_cache_evicts_least_recently_used():
+    """测试超过内存上限时淘汰最久未使用的图表"""
+    provider = SyntheticProvider(n_symbols=20, seed=1, end_date='2024-12-31')
+    figures = [
+        create_stock_charts(recent_history(provider, symbol))
+        for symbol in provider.symbols[:3]
+    ]
+    size = max(len(fig.to_json()) for fig in figures)
+    cache = FigureCache(max_bytes=size * 2)
+    cache.put('a', figures[0])
+    cache.put('b', figures[1])
+    assert cache.get('a') is figures[0]
+    cache.put('c', figures[2])
+
+    assert cache.get('b') is None
+    assert cache.get('a') is figures[0]
+    assert cache.total_bytes <= size * 2
+
+
+def test_downsample_keeps_latest_bar():
+    """测试合并K线后最后一组以最新K线结尾，成交量总和不变"""
+    provider = SyntheticProvider(n_symbols=5, n_days=1000, seed=2)
+    df = recent_history(provider, provider.symbols[0], days=2000)
+    bars, ends = downsample_bars(df, 100)
+    assert len(bars) <= 100
+    assert ends[-1] == len(df) - 1
+    assert bars['收盘'].iloc[-1] == df['收盘'].iloc[-1]
+    assert np.isclose(bars['成交量'].sum(), df['成交量'].sum())
+
+
+def test_detail_charts_reuse_screened_histories(monkeypatch):
+    """测试选股后查看推荐股票的图表不再请求数据源"""
+    provider = SyntheticProvider(n_symbols=300, seed=3, end_date='2024-12-31')
+    store = RunHistories(max_runs=1)
+    screener = StockScreener(provider=provider, history_store=store)
+    results = screener.screen_stocks()
+    assert results
+
+    def fail(*args, **kwargs):
+        raise AssertionError('不应再获取K线')
+
+    monkeypatch.setattr(provider, 'get_history', fail)
+    monkeypatch.setattr('astock_assistant.stock_detail.run_histories', store)
+    figure_cache.clear()
+    symbol = results[0].code
+    assert create_stock_charts(symbol=symbol, provider=provider, run=screener.run)
+
+    # 新一批选股开始后，最早的一批被淘汰
+    store.begin()
+    assert store.get(symbol, screener.run) is None